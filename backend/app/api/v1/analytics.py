@@ -1,11 +1,16 @@
 """Analytics endpoints with segment filtering support."""
 
+import json
 from fastapi import APIRouter, HTTPException, Query, Body
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict
 from datetime import datetime
 from app.services.analytics_service import AnalyticsService
 from app.services.genai_service import GenAIService
+from app.services.retention_service import RetentionService
+from app.core.config import settings
+from app.utils.profiling import QueryProfiler
 
 router = APIRouter()
 analytics_service = AnalyticsService()
@@ -20,6 +25,7 @@ class StageMetrics(BaseModel):
     users: int
     conversion_rate: float
     drop_off_rate: float
+    time_to_convert: Optional[dict] = None
 
 
 class FunnelAnalyticsResponse(BaseModel):
@@ -36,6 +42,49 @@ class FunnelAnalyticsResponse(BaseModel):
     segment_by: Optional[str] = None
     segments: Optional[dict] = None
     total: Optional[dict] = None
+    # Period-over-period comparison (optional)
+    comparison: Optional[dict] = None
+    # Conversion unit: "user" or "session"
+    unit: Optional[str] = None
+
+
+class BatchFunnelItem(BaseModel):
+    """One funnel (with its own filters) in a batch analytics request."""
+
+    funnel_id: str
+    segment_filters: Dict[str, List[str]] = {}
+    segment_by: Optional[str] = None
+
+
+class BatchFunnelRequest(BaseModel):
+    """Batch analytics request: several funnels over one date range."""
+
+    start_date: str
+    end_date: str
+    org_id: str = "poc-org"
+    funnels: List[BatchFunnelItem]
+    # Include phase timings and the DuckDB operator breakdown (EXPLAIN ANALYZE)
+    profile: bool = False
+
+
+def _validate_date_range(start_date: str, end_date: str):
+    """Validate an analytics date range (raises HTTPException 400)."""
+    try:
+        start = datetime.fromisoformat(start_date)
+        end = datetime.fromisoformat(end_date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if end < start:
+        raise HTTPException(status_code=400, detail="end_date must be after start_date")
+    if (end - start).days > settings.ANALYTICS_MAX_RANGE_DAYS:
+        raise HTTPException(
+            status_code=400, detail=f"Date range cannot exceed {settings.ANALYTICS_MAX_RANGE_DAYS} days"
+        )
+
+
+def _parse_list(value: Optional[str]) -> Optional[List[str]]:
+    """Parse a comma-separated query parameter into a list."""
+    return [s.strip() for s in value.split(",")] if value else None
 
 
 @router.post("/funnel/{funnel_id}/recommendations")
@@ -89,6 +138,59 @@ async def get_funnel_recommendations(
         raise HTTPException(status_code=500, detail=f"Failed to generate recommendations: {str(e)}")
 
 
+@router.post("/funnel/{funnel_id}/insights")
+async def get_funnel_insights(
+    funnel_id: str,
+    request_data: Dict = Body(...)
+):
+    """Get rule-based insights immediately and start the AI narrative in the background.
+
+    ``narrative`` is "pending" when the AI recommendations are being
+    generated (fetch them from /recommendations) or "disabled" without an
+    API key.
+    """
+    org_id = request_data.get("org_id", "poc-org")
+    start_date = request_data.get("start_date")
+    end_date = request_data.get("end_date")
+    segment_filters = request_data.get("segment_filters", {})
+    segment_by = request_data.get("segment_by")
+    audience = request_data.get("audience", "data_scientist")
+
+    if not start_date or not end_date:
+        raise HTTPException(status_code=400, detail="start_date and end_date are required")
+
+    analytics_data = await analytics_service.calculate_funnel_metrics(
+        funnel_id=funnel_id,
+        org_id=org_id,
+        start_date=start_date,
+        end_date=end_date,
+        user_intent=segment_filters.get("user_intent"),
+        content_category=segment_filters.get("content_category"),
+        surface=segment_filters.get("surface"),
+        user_tenure=segment_filters.get("user_tenure"),
+        segment_by=segment_by
+    )
+    if not analytics_data:
+        raise HTTPException(status_code=404, detail="Funnel not found or no data available")
+
+    insights = genai_service.generate_local_insights(analytics_data)
+    narrative = genai_service.prefetch_recommendations(
+        funnel_id=funnel_id,
+        analytics_data=analytics_data,
+        start_date=start_date,
+        end_date=end_date,
+        filters=segment_filters,
+        audience=audience
+    )
+    return {**insights, "funnel_id": funnel_id, "narrative": narrative}
+
+
+@router.get("/genai/usage")
+async def get_genai_usage():
+    """Get token counts and latency of recent GenAI calls in this process."""
+    return genai_service.usage_summary()
+
+
 @router.get("/funnel/{funnel_id}")
 async def get_funnel_analytics(
     funnel_id: str,
@@ -101,6 +203,14 @@ async def get_funnel_analytics(
     user_tenure: Optional[str] = Query(None, description="Filter by user tenure (comma-separated: New,Retained)"),
     # Segment breakdown
     segment_by: Optional[str] = Query(None, description="Break down by segment: user_intent, surface, user_tenure, content_category"),
+    # Period-over-period comparison
+    compare_to: Optional[str] = Query(None, description="Compare with: previous_period, previous_year"),
+    # Time-to-convert distributions
+    time_to_convert: bool = Query(False, description="Include per-stage time-to-convert p50/p90/p99 and histogram"),
+    # Conversion unit
+    unit: str = Query("user", description="Count conversions per user, or per session (all stages in one session)"),
+    # Query profiling
+    profile: bool = Query(False, description="Include phase timings and the DuckDB operator breakdown (EXPLAIN ANALYZE)"),
 ):
     """Get funnel analytics for a date range with segment filtering support (POC: no auth required)."""
     service = AnalyticsService()
@@ -112,9 +222,9 @@ async def get_funnel_analytics(
             raise HTTPException(
                 status_code=400, detail="end_date must be after start_date"
             )
-        if (end - start).days > 90:
+        if (end - start).days > settings.ANALYTICS_MAX_RANGE_DAYS:
             raise HTTPException(
-                status_code=400, detail="Date range cannot exceed 90 days"
+                status_code=400, detail=f"Date range cannot exceed {settings.ANALYTICS_MAX_RANGE_DAYS} days"
             )
         
         # Parse segment filters (comma-separated strings to lists)
@@ -129,6 +239,18 @@ async def get_funnel_analytics(
                 status_code=400, 
                 detail="segment_by must be one of: user_intent, surface, user_tenure, content_category"
             )
+        if compare_to and compare_to not in ["previous_period", "previous_year"]:
+            raise HTTPException(
+                status_code=400,
+                detail="compare_to must be one of: previous_period, previous_year"
+            )
+        if compare_to and time_to_convert:
+            raise HTTPException(
+                status_code=400,
+                detail="compare_to and time_to_convert cannot be combined"
+            )
+        if unit not in ["user", "session"]:
+            raise HTTPException(status_code=400, detail="unit must be one of: user, session")
 
         analytics = await service.calculate_funnel_metrics(
             funnel_id=funnel_id,
@@ -140,6 +262,10 @@ async def get_funnel_analytics(
             surface=surface_list,
             user_tenure=user_tenure_list,
             segment_by=segment_by,
+            compare_to=compare_to,
+            time_to_convert=time_to_convert,
+            unit=unit,
+            profile=profile,
         )
         if not analytics:
             raise HTTPException(status_code=404, detail="Funnel not found")
@@ -148,6 +274,201 @@ async def get_funnel_analytics(
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@router.get("/funnel/{funnel_id}/trend")
+async def get_funnel_trend(
+    funnel_id: str,
+    start_date: str = Query(..., description="Start date (YYYY-MM-DD)"),
+    end_date: str = Query(..., description="End date (YYYY-MM-DD)"),
+    granularity: str = Query("day", description="Cohort bucket: day, week"),
+    user_intent: Optional[str] = Query(None, description="Filter by user intent (comma-separated)"),
+    content_category: Optional[str] = Query(None, description="Filter by content category (comma-separated)"),
+    surface: Optional[str] = Query(None, description="Filter by surface (comma-separated)"),
+    user_tenure: Optional[str] = Query(None, description="Filter by user tenure (comma-separated)"),
+    profile: bool = Query(False, description="Include phase timings and the DuckDB operator breakdown (EXPLAIN ANALYZE)"),
+):
+    """Get per-cohort conversion trend (cohort = bucket of each user's first stage-1 event)."""
+    _validate_date_range(start_date, end_date)
+    if granularity not in ["day", "week"]:
+        raise HTTPException(status_code=400, detail="granularity must be one of: day, week")
+
+    service = AnalyticsService()
+    trend = await service.calculate_funnel_trend(
+        funnel_id=funnel_id,
+        org_id="poc-org",
+        start_date=start_date,
+        end_date=end_date,
+        granularity=granularity,
+        user_intent=_parse_list(user_intent),
+        content_category=_parse_list(content_category),
+        surface=_parse_list(surface),
+        user_tenure=_parse_list(user_tenure),
+        profile=profile,
+    )
+    if not trend:
+        raise HTTPException(status_code=404, detail="Funnel not found")
+    return trend
+
+
+@router.get("/funnel/{funnel_id}/experiment/{experiment_id}")
+async def get_funnel_experiment(
+    funnel_id: str,
+    experiment_id: str,
+    start_date: str = Query(..., description="Start date (YYYY-MM-DD)"),
+    end_date: str = Query(..., description="End date (YYYY-MM-DD)"),
+    control: str = Query("control", description="Variant the others are compared against"),
+    confidence: float = Query(0.95, gt=0.5, lt=1, description="Confidence level for tests and intervals"),
+    user_intent: Optional[str] = Query(None, description="Filter by user intent (comma-separated)"),
+    content_category: Optional[str] = Query(None, description="Filter by content category (comma-separated)"),
+    surface: Optional[str] = Query(None, description="Filter by surface (comma-separated)"),
+    user_tenure: Optional[str] = Query(None, description="Filter by user tenure (comma-separated)"),
+    profile: bool = Query(False, description="Include phase timings and the DuckDB operator breakdown (EXPLAIN ANALYZE)"),
+):
+    """Get the funnel per experiment variant with z-tests and sequential-testing-safe bounds."""
+    _validate_date_range(start_date, end_date)
+    service = AnalyticsService()
+    try:
+        experiment = await service.calculate_experiment_metrics(
+            funnel_id=funnel_id,
+            org_id="poc-org",
+            experiment_id=experiment_id,
+            start_date=start_date,
+            end_date=end_date,
+            control=control,
+            confidence=confidence,
+            user_intent=_parse_list(user_intent),
+            content_category=_parse_list(content_category),
+            surface=_parse_list(surface),
+            user_tenure=_parse_list(user_tenure),
+            profile=profile,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not experiment:
+        raise HTTPException(status_code=404, detail="Funnel not found")
+    return experiment
+
+
+@router.get("/funnel/{funnel_id}/paths")
+async def get_funnel_paths(
+    funnel_id: str,
+    stage: int = Query(..., description="Order of the stage to explore from"),
+    start_date: str = Query(..., description="Start date (YYYY-MM-DD)"),
+    end_date: str = Query(..., description="End date (YYYY-MM-DD)"),
+    steps: int = Query(3, ge=1, le=10, description="Events to follow after the stage"),
+    top_k: int = Query(20, ge=1, le=500, description="Number of paths to return"),
+    user_intent: Optional[str] = Query(None, description="Filter by user intent (comma-separated)"),
+    content_category: Optional[str] = Query(None, description="Filter by content category (comma-separated)"),
+    surface: Optional[str] = Query(None, description="Filter by surface (comma-separated)"),
+    user_tenure: Optional[str] = Query(None, description="Filter by user tenure (comma-separated)"),
+    profile: bool = Query(False, description="Include phase timings and the DuckDB operator breakdown (EXPLAIN ANALYZE)"),
+):
+    """Get the top-k event paths users take after a funnel stage, in Sankey-ready form."""
+    _validate_date_range(start_date, end_date)
+    service = AnalyticsService()
+    try:
+        paths = await service.calculate_funnel_paths(
+            funnel_id=funnel_id,
+            org_id="poc-org",
+            stage_order=stage,
+            start_date=start_date,
+            end_date=end_date,
+            steps=steps,
+            top_k=top_k,
+            user_intent=_parse_list(user_intent),
+            content_category=_parse_list(content_category),
+            surface=_parse_list(surface),
+            user_tenure=_parse_list(user_tenure),
+            profile=profile,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not paths:
+        raise HTTPException(status_code=404, detail="Funnel not found")
+    return paths
+
+
+@router.get("/retention")
+async def get_retention(
+    project_id: str = Query(..., description="Project ID"),
+    cohort_event: str = Query(..., description="Event that puts a user into a cohort"),
+    return_event: str = Query(..., description="Event that counts as a return"),
+    start_date: str = Query(..., description="Start date (YYYY-MM-DD)"),
+    end_date: str = Query(..., description="End date (YYYY-MM-DD)"),
+    granularity: str = Query("week", description="Cohort and period size: day, week, month"),
+    periods: int = Query(12, ge=1, le=62, description="Number of periods after the cohort period"),
+    user_intent: Optional[str] = Query(None, description="Filter by user intent (comma-separated)"),
+    content_category: Optional[str] = Query(None, description="Filter by content category (comma-separated)"),
+    surface: Optional[str] = Query(None, description="Filter by surface (comma-separated)"),
+    user_tenure: Optional[str] = Query(None, description="Filter by user tenure (comma-separated)"),
+    profile: bool = Query(False, description="Include phase timings and the DuckDB operator breakdown (EXPLAIN ANALYZE)"),
+):
+    """Get the cohort x period retention matrix (cohort = period of each user's first cohort event)."""
+    _validate_date_range(start_date, end_date)
+    if granularity not in ["day", "week", "month"]:
+        raise HTTPException(status_code=400, detail="granularity must be one of: day, week, month")
+
+    service = RetentionService()
+    retention = await service.calculate_retention(
+        project_id=project_id,
+        org_id="poc-org",
+        cohort_event=cohort_event,
+        return_event=return_event,
+        start_date=start_date,
+        end_date=end_date,
+        granularity=granularity,
+        periods=periods,
+        user_intent=_parse_list(user_intent),
+        content_category=_parse_list(content_category),
+        surface=_parse_list(surface),
+        user_tenure=_parse_list(user_tenure),
+        profile=profile,
+    )
+    if not retention:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return retention
+
+
+@router.post("/funnels:batch")
+async def get_batch_funnel_analytics(request: BatchFunnelRequest):
+    """Get analytics for several funnels from one shared scan per project (POC: no auth required)."""
+    _validate_date_range(request.start_date, request.end_date)
+    if not request.funnels:
+        raise HTTPException(status_code=400, detail="At least one funnel is required")
+
+    items = []
+    for item in request.funnels:
+        if item.segment_by and item.segment_by not in ["user_intent", "surface", "user_tenure", "content_category"]:
+            raise HTTPException(
+                status_code=400,
+                detail="segment_by must be one of: user_intent, surface, user_tenure, content_category"
+            )
+        items.append({
+            "funnel_id": item.funnel_id,
+            "user_intent": item.segment_filters.get("user_intent"),
+            "content_category": item.segment_filters.get("content_category"),
+            "surface": item.segment_filters.get("surface"),
+            "user_tenure": item.segment_filters.get("user_tenure"),
+            "segment_by": item.segment_by,
+        })
+
+    service = AnalyticsService()
+    profiler = QueryProfiler() if request.profile else None
+    results = await service.calculate_batch_funnel_metrics(
+        org_id=request.org_id,
+        start_date=request.start_date,
+        end_date=request.end_date,
+        items=items,
+        profiler=profiler,
+    )
+    response = {
+        "date_range": {"start": request.start_date, "end": request.end_date},
+        "results": results,
+    }
+    if profiler:
+        response["profile"] = profiler.to_dict()
+    return response
+
+
 @router.post("/funnel/{funnel_id}/report")
 async def generate_ai_report(
     funnel_id: str,
@@ -212,3 +533,60 @@ async def generate_ai_report(
         error_trace = traceback.format_exc()
         print(f"Error in report endpoint: {error_trace}")
         raise HTTPException(status_code=500, detail=f"Failed to generate report: {str(e)}")
+
+
+@router.post("/funnel/{funnel_id}/report/stream")
+async def stream_ai_report(
+    funnel_id: str,
+    request_data: Dict = Body(...)
+):
+    """Stream an AI-powered report as server-sent events (token, section, done / error)."""
+    org_id = request_data.get("org_id", "poc-org")
+    start_date = request_data.get("start_date")
+    end_date = request_data.get("end_date")
+    segment_filters = request_data.get("segment_filters", {})
+    segment_by = request_data.get("segment_by")
+    audience = request_data.get("audience", "data_scientist")
+    format_type = request_data.get("format", "html")
+
+    if not start_date or not end_date:
+        raise HTTPException(status_code=400, detail="start_date and end_date are required")
+
+    if format_type not in ["html", "markdown", "text"]:
+        raise HTTPException(status_code=400, detail="format must be one of: html, markdown, text")
+
+    if audience not in ["data_scientist", "executive", "product_manager"]:
+        raise HTTPException(status_code=400, detail="audience must be one of: data_scientist, executive, product_manager")
+
+    # Analytics are computed before streaming starts so lookup errors are still plain HTTP errors
+    analytics_data = await analytics_service.calculate_funnel_metrics(
+        funnel_id=funnel_id,
+        org_id=org_id,
+        start_date=start_date,
+        end_date=end_date,
+        user_intent=segment_filters.get("user_intent"),
+        content_category=segment_filters.get("content_category"),
+        surface=segment_filters.get("surface"),
+        user_tenure=segment_filters.get("user_tenure"),
+        segment_by=segment_by
+    )
+    if not analytics_data:
+        raise HTTPException(status_code=404, detail="Funnel not found or no data available")
+
+    async def event_stream():
+        async for event in genai_service.stream_report(
+            funnel_id=funnel_id,
+            analytics_data=analytics_data,
+            start_date=start_date,
+            end_date=end_date,
+            filters=segment_filters,
+            audience=audience,
+            format=format_type
+        ):
+            yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
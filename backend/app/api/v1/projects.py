@@ -39,12 +39,11 @@ async def list_projects():
         metadata_handler = MetadataHandler()
         
         # Check if default project exists first
-        projects = metadata_handler.load_projects()
-        existing_project = next((p for p in projects if p["id"] == DEFAULT_PROJECT_ID), None)
+        existing_project = metadata_handler.get_project(DEFAULT_PROJECT_ID)
         
         if existing_project:
             # Project exists, return it (mask API key for security)
-            project_dict = existing_project.copy()
+            project_dict = existing_project
             # Only mask if it's a full key (longer than 13 chars indicates full key)
             if len(project_dict.get("api_key", "")) > 13 and not project_dict["api_key"].endswith("***"):
                 project_dict["api_key"] = project_dict["api_key"][:10] + "***"
@@ -4,8 +4,9 @@ from fastapi import APIRouter, HTTPException, Header, Depends
 from pydantic import BaseModel
 from typing import Optional, Dict, List
 from datetime import datetime
-from app.services.track_service import TrackService
-from app.services.project_service import ProjectService
+from app.core.api_key_cache import api_key_cache
+from app.services.track_service import get_track_service
+from app.storage.metadata_handler import MetadataHandler
 
 router = APIRouter()
 
@@ -45,12 +46,17 @@ async def verify_api_key(x_api_key: str = Header(None)) -> str:
     if not x_api_key:
         return "poc-project-001"
     
-    project_service = ProjectService()
-    project = await project_service.get_project_by_api_key(x_api_key)
-    if not project:
+    project_id = api_key_cache.resolve(x_api_key, _load_project_id)
+    if not project_id:
         # POC: If API key invalid, still use default project for demonstration
         return "poc-project-001"
-    return project["id"]
+    return project_id
+
+
+def _load_project_id(api_key: str) -> Optional[str]:
+    """Look up the project ID for an API key in the metadata store (cache misses only)."""
+    project = MetadataHandler().get_project_by_api_key(api_key)
+    return project["id"] if project else None
 
 
 @router.post("")
@@ -59,8 +65,8 @@ async def track_event(
     x_api_key: str = Header(None),
     project_id: str = Depends(verify_api_key)
 ):
-    """Track a single event."""
-    track_service = TrackService()
+    """Track a single event (buffered; written when the buffer fills or on the periodic flush)."""
+    track_service = get_track_service()
     try:
         event_id = await track_service.track_event(
             project_id=project_id,
@@ -93,7 +99,7 @@ async def track_batch_events(
     project_id: str = Depends(verify_api_key)
 ):
     """Track multiple events in a single request."""
-    track_service = TrackService()
+    track_service = get_track_service()
     try:
         event_ids = await track_service.track_batch_events(
             project_id=project_id, events=[e.dict() for e in batch.events]
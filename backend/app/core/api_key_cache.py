@@ -0,0 +1,63 @@
+"""In-process cache of API key -> project ID for the tracking endpoints."""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+from app.core.config import settings
+from app.core.metrics import CACHE_REQUESTS
+
+
+def hash_api_key(api_key: str) -> str:
+    """SHA-256 digest of an API key (what the cache stores instead of the key)."""
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+
+class APIKeyCache:
+    """Bounded TTL cache of API key digests to project IDs.
+
+    Lookups are one dict access; the loader (metadata store) runs only on
+    a miss or after ``ttl`` seconds. Unknown keys are cached too, so bad
+    keys cannot force a store lookup per event. Project changes in this
+    process invalidate immediately; other workers catch up within ``ttl``.
+    Beyond ``max_entries`` the oldest entries are evicted.
+    """
+
+    def __init__(self, ttl: Optional[float] = None, max_entries: Optional[int] = None):
+        self.ttl = settings.API_KEY_CACHE_TTL if ttl is None else ttl
+        self.max_entries = max_entries or settings.API_KEY_CACHE_MAX_ENTRIES
+        # digest -> (project_id or None, expires_at)
+        self._entries: "OrderedDict[str, Tuple[Optional[str], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def resolve(self, api_key: str, loader: Callable[[str], Optional[str]]) -> Optional[str]:
+        """Get the project ID for an API key (None if unknown), calling ``loader(api_key)`` on a miss."""
+        digest = hash_api_key(api_key)
+        now = time.monotonic()
+        entry = self._entries.get(digest)
+        if entry is not None and entry[1] > now:
+            CACHE_REQUESTS.inc(cache="api_key", result="hit", project=entry[0] or "")
+            return entry[0]
+
+        project_id = loader(api_key)
+        CACHE_REQUESTS.inc(cache="api_key", result="miss", project=project_id or "")
+        with self._lock:
+            self._entries[digest] = (project_id, now + self.ttl)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return project_id
+
+    def invalidate(self, project_id: Optional[str] = None):
+        """Forget a project's keys and all unknown-key entries (everything when ``project_id`` is None)."""
+        with self._lock:
+            if project_id is None:
+                self._entries.clear()
+                return
+            stale = [d for d, (cached_id, _) in self._entries.items() if cached_id in (project_id, None)]
+            for digest in stale:
+                del self._entries[digest]
+
+
+api_key_cache = APIKeyCache()
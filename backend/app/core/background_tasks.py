@@ -9,31 +9,54 @@ class BackgroundTaskManager:
 
     def __init__(self):
         self._flush_task = None
+        self._rollup_task = None
         self._running = False
 
     async def start_periodic_flush(self):
         """Start periodic event buffer flush."""
-        from app.services.track_service import TrackService
-        track_service = TrackService()
-        
+        from app.services.track_service import get_track_service
+
         self._running = True
         while self._running:
             await asyncio.sleep(settings.EVENT_FLUSH_INTERVAL)
-            # Flush all project buffers
-            for project_id in list(track_service.event_buffer.keys()):
-                if track_service.event_buffer[project_id]:
-                    await track_service._flush_buffer(project_id)
+            # Flush all project buffers of the service the API tracks into
+            try:
+                await get_track_service().flush_all()
+            except Exception as e:
+                print(f"Event buffer flush failed: {e}")
+
+    async def start_periodic_rollups(self):
+        """Start periodic rollup compaction for closed days, weeks and months."""
+        from pathlib import Path
+        from app.storage.rollup_handler import RollupHandler
+
+        self._running = True
+        loop = asyncio.get_event_loop()
+        while self._running:
+            events_dir = Path(settings.DATA_DIR) / "events"
+            for project_dir in events_dir.glob("project_*"):
+                project_id = project_dir.name[len("project_"):]
+                try:
+                    # Rollup builds are blocking DuckDB work: keep them off the event loop
+                    await loop.run_in_executor(None, RollupHandler().compact_project, project_id)
+                except Exception as e:
+                    print(f"Rollup compaction failed for project {project_id}: {e}")
+            await asyncio.sleep(settings.ROLLUP_BUILD_INTERVAL)
 
     def start(self):
         """Start background tasks."""
         if self._flush_task is None or self._flush_task.done():
             self._flush_task = asyncio.create_task(self.start_periodic_flush())
+        if settings.ROLLUPS_ENABLED and (self._rollup_task is None or self._rollup_task.done()):
+            self._rollup_task = asyncio.create_task(self.start_periodic_rollups())
 
     def stop(self):
         """Stop background tasks."""
         self._running = False
         if self._flush_task and not self._flush_task.done():
             self._flush_task.cancel()
+        if self._rollup_task and not self._rollup_task.done():
+            self._rollup_task.cancel()
 
 
 # Global instance
@@ -11,6 +11,12 @@ class Settings(BaseSettings):
     # Data storage
     DATA_DIR: str = "./data"
     STORAGE_TYPE: str = "local"  # 'local' or 's3' (future)
+    METADATA_BACKEND: str = "sqlite"  # 'sqlite' (metadata/metadata.sqlite) or 'json' (metadata/*.json)
+    API_KEY_CACHE_TTL: float = 60.0  # seconds other workers may serve a changed project's old key
+    API_KEY_CACHE_MAX_ENTRIES: int = 10_000
+
+    # Metrics (/metrics, Prometheus text format)
+    METRICS_DUCKDB_ROWS_SCANNED: bool = True  # DuckDB profiling for rows scanned (~0.5ms per query)
 
     # Optional Redis
     REDIS_URL: str = "redis://localhost:6379/0"
@@ -31,14 +37,56 @@ class Settings(BaseSettings):
     EVENT_BUFFER_SIZE: int = 100
     EVENT_FLUSH_INTERVAL: int = 60  # seconds
 
+    # Funnel Executor (process pool for per-user stage evaluation)
+    FUNNEL_EXECUTOR_WORKERS: int = 0  # 0 = one worker per CPU core, 1 = in-process
+    FUNNEL_EXECUTOR_MIN_ROWS: int = 200_000  # smaller scans are evaluated in-process
+
+    # Analytics Range Limits and Rollups
+    ANALYTICS_MAX_RANGE_DAYS: int = 731  # longest funnel date range accepted by the API
+    RAW_SCAN_MAX_DAYS: int = 90  # longer ranges build missing rollups on demand
+    ROLLUPS_ENABLED: bool = True
+    ROLLUP_BUILD_INTERVAL: int = 3600  # seconds between background rollup compactions
+
+    # Distributed Query Workers (coordinator mode when QUERY_WORKERS is set)
+    QUERY_WORKERS: str = ""  # comma-separated worker URLs, e.g. http://host1:9101,http://host2:9101
+    QUERY_WORKER_BUCKETS: int = 64  # user-id hash buckets spread across workers
+    QUERY_WORKER_TIMEOUT: float = 60.0  # seconds
+    QUERY_WORKER_SECRET: str = ""  # shared secret sent by the coordinator; workers refuse to start without it
+
+    # Session Funnels
+    SESSION_INACTIVITY_MINUTES: int = 30  # gap that starts a new session when session_id is missing
+
+    # Path Analysis
+    PATH_COUNTER_CAPACITY: int = 10_000  # distinct paths tracked by the heavy-hitter counter
+    PATH_BATCH_ROWS: int = 100_000  # rows per Arrow batch streamed from DuckDB
+
     # GenAI Configuration
     OPENAI_API_KEY: Optional[str] = Field(default=None, env="OPENAI_API_KEY")
+    GENAI_MODEL: str = "gpt-4"  # gpt-3.5-turbo for cost savings
+    GENAI_MAX_CONCURRENCY: int = 4  # in-flight LLM calls per process
+    GENAI_TIMEOUT: float = 60.0  # seconds per attempt
+    GENAI_MAX_RETRIES: int = 3  # retries of transient failures (timeouts, 429, 5xx)
+    GENAI_RETRY_BASE_DELAY: float = 0.5  # seconds; full-jitter exponential backoff
+    GENAI_RETRY_MAX_DELAY: float = 8.0  # seconds
+    GENAI_BREAKER_FAILURES: int = 5  # consecutive failed calls that open the circuit
+    GENAI_BREAKER_RESET: float = 30.0  # seconds before a half-open trial call
+    GENAI_CACHE_TTL: float = 24 * 60 * 60  # seconds
+    GENAI_CACHE_MAX_ENTRIES: int = 1000  # least recently used entries are evicted beyond this
+    GENAI_CACHE_LEASE_SECONDS: float = 120.0  # cross-process single-flight lease (0 = in-process only)
+    GENAI_PROMPT_TOKEN_BUDGET: int = 600  # estimated tokens for the funnel data in a prompt
+    GENAI_PROMPT_TOP_SEGMENTS: int = 8  # segments listed in a prompt (the rest are folded into "other")
+    GENAI_USAGE_HISTORY: int = 200  # recent LLM calls kept with token counts and latency
 
     @property
     def cors_origins_list(self) -> List[str]:
         """Get CORS origins as list."""
         return [origin.strip() for origin in self.CORS_ORIGINS.split(",")]
 
+    @property
+    def query_workers_list(self) -> List[str]:
+        """Get query worker URLs as list."""
+        return [url.strip() for url in self.QUERY_WORKERS.split(",") if url.strip()]
+
     class Config:
         """Pydantic config."""
 
@@ -0,0 +1,197 @@
+"""Minimal Prometheus metrics registry (text exposition format, no client library).
+
+Updates are a dict lookup plus an add under a lock, cheap enough for
+per-event use. ``/metrics`` renders every registered series.
+"""
+
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Latency buckets (seconds): 1ms .. 60s
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    """Base class: one named metric with a fixed set of label names."""
+
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels_text(self, key: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+        if extra:
+            pairs.append(f'{extra[0]}="{extra[1]}"')
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value) -> List[str]:
+        return [f"{self.name}{self._labels_text(key)} {_format_value(value)}"]
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    """Monotonic counter."""
+
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """Value that can go up and down."""
+
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Histogram(_Metric):
+    """Cumulative histogram with fixed upper bounds."""
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [per-bucket counts (+Inf last), sum, count]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the ``with`` block (also when it raises)."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def _render_sample(self, key, state) -> List[str]:
+        counts, total, count = state[0][:], state[1], state[2]
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+            cumulative += bucket_count
+            lines.append(f"{self.name}_bucket{self._labels_text(key, ('le', _format_value(bound)))} {cumulative}")
+        lines.append(f"{self.name}_sum{self._labels_text(key)} {_format_value(total)}")
+        lines.append(f"{self.name}_count{self._labels_text(key)} {count}")
+        return lines
+
+
+class Registry:
+    """Collection of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text format (0.0.4)."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Ingestion
+EVENTS_INGESTED = REGISTRY.counter("iafa_events_ingested_total", "Events written to Parquet by the tracking API.", ["project"])
+EVENT_BUFFER_DEPTH = REGISTRY.gauge("iafa_event_buffer_depth", "Events buffered and not yet written.", ["project"])
+BUFFER_FLUSH_SECONDS = REGISTRY.histogram("iafa_buffer_flush_seconds", "Duration of event buffer flushes.", ["project"])
+PARQUET_BYTES_WRITTEN = REGISTRY.counter("iafa_parquet_bytes_written_total", "Bytes of Parquet files written.", ["project"])
+PARQUET_WRITE_SECONDS = REGISTRY.histogram("iafa_parquet_write_seconds", "Duration of Parquet event writes.", ["project"])
+
+# Queries
+DUCKDB_QUERY_SECONDS = REGISTRY.histogram(
+    "iafa_duckdb_query_seconds", "DuckDB query latency (execution and fetch).", ["project", "query"]
+)
+DUCKDB_ROWS_SCANNED = REGISTRY.counter("iafa_duckdb_rows_scanned_total", "Rows scanned by DuckDB queries.", ["project", "query"])
+DUCKDB_FILES_OPENED = REGISTRY.counter("iafa_duckdb_files_opened_total", "Parquet files read by DuckDB queries.", ["project", "query"])
+DUCKDB_QUERY_ERRORS = REGISTRY.counter("iafa_duckdb_query_errors_total", "DuckDB queries that failed.", ["project", "query"])
+
+# GenAI
+GENAI_CALL_SECONDS = REGISTRY.histogram("iafa_genai_call_seconds", "GenAI (LLM) call latency.", ["project", "kind"])
+GENAI_TOKENS = REGISTRY.counter("iafa_genai_tokens_total", "GenAI tokens used.", ["project", "kind", "type"])
+
+# Caches
+CACHE_REQUESTS = REGISTRY.counter("iafa_cache_requests_total", "Cache lookups by cache and result (hit or miss).", ["cache", "result", "project"])
@@ -0,0 +1 @@
+"""Distributed query workers and coordinator."""
@@ -0,0 +1,101 @@
+"""Coordinator fanning funnel queries out to query workers."""
+
+import asyncio
+from typing import Dict, List, Optional
+import httpx
+from app.core.config import settings
+from app.storage.duckdb_query import DuckDBQuery
+from app.storage.funnel_executor import merge_stage_counts
+
+
+def merge_funnel_results(partials: List[Dict], stages: List[Dict], segment_by: Optional[str] = None) -> Dict:
+    """Merge raw funnel results computed over disjoint user buckets."""
+    if not segment_by:
+        return merge_stage_counts(partials, stages)
+
+    segments: Dict[str, List[Dict]] = {}
+    for partial in partials:
+        for segment_value, counts in partial.get("segments", {}).items():
+            segments.setdefault(segment_value, []).append(counts)
+    return {
+        "segments": {value: merge_stage_counts(counts, stages) for value, counts in segments.items()},
+        "total": merge_stage_counts([p.get("total", {}) for p in partials], stages),
+    }
+
+
+class QueryCoordinator:
+    """Scatter a funnel query over workers by user bucket and gather partial counts.
+
+    Bucket ``b`` (``hash(user_id) % bucket_count``) is owned by worker
+    ``b % len(worker_urls)``. If a worker is unreachable its buckets are
+    evaluated locally, so a degraded cluster still returns exact counts.
+    """
+
+    def __init__(
+        self,
+        worker_urls: Optional[List[str]] = None,
+        bucket_count: Optional[int] = None,
+        timeout: Optional[float] = None,
+        secret: Optional[str] = None,
+    ):
+        if worker_urls is None:
+            worker_urls = settings.query_workers_list
+        self.worker_urls = [url.rstrip("/") for url in worker_urls]
+        self.bucket_count = bucket_count or settings.QUERY_WORKER_BUCKETS
+        self.timeout = timeout or settings.QUERY_WORKER_TIMEOUT
+        self.secret = secret or settings.QUERY_WORKER_SECRET
+
+    def bucket_assignment(self) -> Dict[str, List[int]]:
+        """Map each worker URL to the user buckets it owns."""
+        assignment = {url: [] for url in self.worker_urls}
+        for bucket in range(self.bucket_count):
+            assignment[self.worker_urls[bucket % len(self.worker_urls)]].append(bucket)
+        return {url: buckets for url, buckets in assignment.items() if buckets}
+
+    async def _query_worker(self, client: httpx.AsyncClient, url: str, payload: Dict) -> Dict:
+        """Request partial counts from one worker, falling back to a local scan of its buckets."""
+        try:
+            response = await client.post(
+                f"{url}/partial/funnel", json=payload, headers={"X-Worker-Secret": self.secret}
+            )
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPError as e:
+            print(f"Query worker {url} failed, evaluating its buckets locally: {e}")
+            return await asyncio.get_event_loop().run_in_executor(
+                None, lambda: DuckDBQuery().calculate_funnel_metrics(funnel_id="", **payload)
+            )
+
+    async def calculate_funnel_metrics(
+        self,
+        project_id: str,
+        stages: List[Dict],
+        start_date: str,
+        end_date: str,
+        user_intent: List[str] = None,
+        content_category: List[str] = None,
+        surface: List[str] = None,
+        user_tenure: List[str] = None,
+        segment_by: str = None,
+        unit: str = "user",
+    ) -> Dict:
+        """Calculate raw funnel counts across all workers (same shape as DuckDBQuery)."""
+        base_payload = {
+            "project_id": project_id,
+            "stages": stages,
+            "start_date": start_date,
+            "end_date": end_date,
+            "user_intent": user_intent,
+            "content_category": content_category,
+            "surface": surface,
+            "user_tenure": user_tenure,
+            "segment_by": segment_by,
+            "unit": unit,
+            "bucket_count": self.bucket_count,
+        }
+        async with httpx.AsyncClient(timeout=self.timeout) as client:
+            partials = await asyncio.gather(*[
+                self._query_worker(client, url, {**base_payload, "user_buckets": buckets})
+                for url, buckets in self.bucket_assignment().items()
+            ])
+        return merge_funnel_results(list(partials), stages, segment_by)
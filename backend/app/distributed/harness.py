@@ -0,0 +1,87 @@
+"""Local multi-worker harness: runs N query workers on localhost.
+
+Used by the test suite and for local experiments with coordinator mode::
+
+    with LocalWorkerCluster(3, data_dir="./data") as cluster:
+        coordinator = QueryCoordinator(worker_urls=cluster.urls, secret=cluster.secret)
+"""
+
+import os
+import secrets
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional
+import httpx
+from app.core.config import settings
+
+
+def _free_port() -> int:
+    """Ask the OS for an unused TCP port."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class LocalWorkerCluster:
+    """Start query worker subprocesses on localhost and stop them on exit."""
+
+    def __init__(self, num_workers: int, data_dir: Optional[str] = None, startup_timeout: float = 30.0):
+        self.num_workers = num_workers
+        self.data_dir = data_dir or settings.DATA_DIR
+        self.startup_timeout = startup_timeout
+        self.secret = settings.QUERY_WORKER_SECRET or secrets.token_urlsafe(32)
+        self.processes: List[subprocess.Popen] = []
+        self.urls: List[str] = []
+
+    def start(self):
+        """Start all workers and wait until they answer /health."""
+        backend_dir = Path(__file__).resolve().parents[2]
+        env = {**os.environ, "DATA_DIR": str(self.data_dir), "QUERY_WORKER_SECRET": self.secret}
+        for _ in range(self.num_workers):
+            port = _free_port()
+            process = subprocess.Popen(
+                [sys.executable, "-m", "app.distributed.worker", "--host", "127.0.0.1", "--port", str(port)],
+                cwd=backend_dir,
+                env=env,
+            )
+            self.processes.append(process)
+            self.urls.append(f"http://127.0.0.1:{port}")
+
+        deadline = time.monotonic() + self.startup_timeout
+        for url, process in zip(self.urls, self.processes):
+            while True:
+                if process.poll() is not None:
+                    self.stop()
+                    raise RuntimeError(f"Query worker {url} exited with code {process.returncode}")
+                try:
+                    if httpx.get(f"{url}/health", timeout=1.0).status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    pass
+                if time.monotonic() > deadline:
+                    self.stop()
+                    raise RuntimeError(f"Query worker {url} did not start within {self.startup_timeout}s")
+                time.sleep(0.1)
+        return self
+
+    def stop(self):
+        """Terminate all workers."""
+        for process in self.processes:
+            if process.poll() is None:
+                process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self.processes = []
+        self.urls = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
@@ -0,0 +1,105 @@
+"""Query worker serving partial funnel counts over HTTP.
+
+Run one per host (or several per host on different ports)::
+
+    QUERY_WORKER_SECRET=... python -m app.distributed.worker --host 10.0.0.5 --port 9101
+
+Workers are stateless: the coordinator tells each request which user buckets
+to evaluate. Every worker must see the same ``DATA_DIR`` (shared volume).
+Only the evaluation is partitioned: files are split by date, not by user,
+so each worker scans every file in the date range and filters rows by
+bucket (scan I/O does not shrink as workers are added).
+Requests must carry the ``QUERY_WORKER_SECRET`` shared with the coordinator
+in the ``X-Worker-Secret`` header.
+"""
+
+import argparse
+import hmac
+from typing import Dict, List, Optional
+from fastapi import Depends, FastAPI, Header, HTTPException
+from pydantic import BaseModel, Field
+from app.core.config import settings
+from app.schemas.project import PROJECT_ID_PATTERN
+from app.services.query_planner import QueryPlanner
+from app.storage.duckdb_query import DuckDBQuery
+
+
+class PartialFunnelRequest(BaseModel):
+    """Partial funnel evaluation request."""
+
+    project_id: str = Field(..., pattern=PROJECT_ID_PATTERN)
+    stages: List[Dict]
+    start_date: str
+    end_date: str
+    user_buckets: List[int]
+    bucket_count: int
+    user_intent: Optional[List[str]] = None
+    content_category: Optional[List[str]] = None
+    surface: Optional[List[str]] = None
+    user_tenure: Optional[List[str]] = None
+    segment_by: Optional[str] = None
+    unit: str = "user"
+
+
+def verify_worker_secret(x_worker_secret: Optional[str] = Header(None)):
+    """Reject requests without the coordinator's shared secret."""
+    secret = settings.QUERY_WORKER_SECRET
+    if not secret or not x_worker_secret or not hmac.compare_digest(x_worker_secret, secret):
+        raise HTTPException(status_code=401, detail="Invalid worker secret")
+
+
+def create_worker_app() -> FastAPI:
+    """Create the worker ASGI app."""
+    worker_app = FastAPI(title="IAFA Query Worker", docs_url=None, redoc_url=None)
+
+    @worker_app.get("/health")
+    async def health():
+        """Health check endpoint."""
+        return {"status": "healthy", "service": "iafa-query-worker"}
+
+    @worker_app.post("/partial/funnel", dependencies=[Depends(verify_worker_secret)])
+    def partial_funnel(request: PartialFunnelRequest):
+        """Raw stage counts for the requested user buckets (sync: runs in the threadpool)."""
+        # One connection per request: DuckDB connections are not shared across threads
+        duckdb_query = DuckDBQuery()
+        # Serve from rollups already built by the API host; never build them here
+        parquet_files = None
+        if settings.ROLLUPS_ENABLED and request.unit == "user":
+            parquet_files = QueryPlanner().plan_funnel_scan(
+                request.project_id, request.start_date, request.end_date
+            )["files"]
+        return duckdb_query.calculate_funnel_metrics(
+            funnel_id="",
+            project_id=request.project_id,
+            stages=request.stages,
+            start_date=request.start_date,
+            end_date=request.end_date,
+            user_intent=request.user_intent,
+            content_category=request.content_category,
+            surface=request.surface,
+            user_tenure=request.user_tenure,
+            segment_by=request.segment_by,
+            user_buckets=request.user_buckets,
+            bucket_count=request.bucket_count,
+            parquet_files=parquet_files,
+            unit=request.unit,
+        )
+
+    return worker_app
+
+
+def main():
+    """Run a worker with uvicorn."""
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="IAFA query worker")
+    parser.add_argument("--host", default="127.0.0.1", help="bind address (use a private interface, not 0.0.0.0)")
+    parser.add_argument("--port", type=int, default=9101)
+    args = parser.parse_args()
+    if not settings.QUERY_WORKER_SECRET:
+        parser.error("QUERY_WORKER_SECRET must be set (the same value as on the API host)")
+    uvicorn.run(create_worker_app(), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
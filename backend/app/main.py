@@ -3,8 +3,11 @@
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from app.core.config import settings
+from app.core.metrics import REGISTRY
 from app.core.background_tasks import background_manager
+from app.services.track_service import get_track_service
 from app.api.v1 import projects, funnels, track, analytics, events, events
 
 
@@ -37,7 +40,9 @@ async def lifespan(app: FastAPI):
     # Start background tasks
     background_manager.start()
     yield
-    # Shutdown: Cleanup (if needed)
+    # Shutdown: write events still buffered
+    background_manager.stop()
+    await get_track_service().flush_all()
 
 
 app = FastAPI(
@@ -82,3 +87,9 @@ async def root():
 async def health_check():
     """Health check endpoint."""
     return {"status": "healthy", "service": "iafa-api-poc"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics (text exposition format)."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
@@ -4,6 +4,9 @@ from pydantic import BaseModel
 from typing import Optional
 from datetime import datetime
 
+# Project IDs are UUIDs or slugs such as "poc-project-001"; they become directory names
+PROJECT_ID_PATTERN = r"^[A-Za-z0-9_-]{1,64}$"
+
 
 class ProjectCreate(BaseModel):
     """Project creation schema."""
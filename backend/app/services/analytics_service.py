@@ -1,8 +1,23 @@
 """Analytics service."""
 
+import asyncio
+import math
+from datetime import datetime, timedelta
 from typing import Optional, Dict, List
+import numpy as np
+import pyarrow as pa
 from app.storage.metadata_handler import MetadataHandler
 from app.storage.duckdb_query import DuckDBQuery
+from app.core.config import settings
+from app.distributed.coordinator import QueryCoordinator
+from app.services.query_planner import QueryPlanner
+from app.utils.date_utils import get_comparison_range
+from app.utils.stats_utils import two_proportion_ztest, sequential_bounds
+from app.utils.heavy_hitters import SpaceSaving
+from app.utils.profiling import QueryProfiler, profile_phase
+
+# Path step shown after a user's last event
+PATH_END = "(end)"
 
 
 class AnalyticsService:
@@ -11,6 +26,9 @@ class AnalyticsService:
     def __init__(self):
         self.metadata_handler = MetadataHandler()
         self.duckdb_query = DuckDBQuery()
+        # Coordinator mode: fan funnel queries out to query workers
+        self.coordinator = QueryCoordinator() if settings.query_workers_list else None
+        self.query_planner = QueryPlanner()
 
     async def calculate_funnel_metrics(
         self, 
@@ -25,41 +43,557 @@ class AnalyticsService:
         user_tenure: List[str] = None,
         # Segment breakdown
         segment_by: str = None,
+        # Period-over-period comparison ("previous_period" or "previous_year")
+        compare_to: str = None,
+        # Per-stage time-to-convert quantiles and histograms
+        time_to_convert: bool = False,
+        # Conversion unit: "user" or "session"
+        unit: str = "user",
+        # Attach phase timings and DuckDB operator breakdowns as "profile"
+        profile: bool = False,
     ) -> Optional[Dict]:
         """Calculate funnel metrics for a date range with segment filtering support."""
+        if unit == "session" and (compare_to or time_to_convert):
+            raise ValueError("unit=session cannot be combined with compare_to or time_to_convert")
         # Load funnel definition
-        funnels = self.metadata_handler.load_funnels()
-        funnel = next(
-            (
-                f
-                for f in funnels
-                if f["id"] == funnel_id and f["organization_id"] == org_id
+        funnel = self.metadata_handler.get_funnel(funnel_id)
+        if not funnel or funnel["organization_id"] != org_id:
+            return None
+        profiler = QueryProfiler() if profile else None
+        if profiler:
+            self.duckdb_query.enable_profiler(profiler)
+
+        filters = {
+            "user_intent": user_intent,
+            "content_category": content_category,
+            "surface": surface,
+            "user_tenure": user_tenure,
+        }
+        if compare_to:
+            response = await self._calculate_period_comparison(
+                funnel, start_date, end_date, filters, segment_by, compare_to
+            )
+        elif time_to_convert:
+            # Counts and timing come from one SQL pass (t-digests do not merge across workers, so this runs locally)
+            with profile_phase(profiler, "file_discovery"):
+                parquet_files = await self._plan_files(funnel["project_id"], start_date, end_date)
+            timed_result = self.duckdb_query.calculate_funnel_metrics_with_timing(
+                project_id=funnel["project_id"],
+                stages=funnel["stages"],
+                start_date=start_date,
+                end_date=end_date,
+                segment_by=segment_by,
+                parquet_files=parquet_files,
+                **filters,
+            )
+            with profile_phase(profiler, "formatting"):
+                response = self._build_funnel_response(
+                    funnel, timed_result["counts"], start_date, end_date, segment_by,
+                    time_to_convert=timed_result["time_to_convert"],
+                )
+        else:
+            response = await self._calculate_funnel_counts(funnel, start_date, end_date, filters, segment_by, unit, profiler)
+
+        if profiler:
+            response["profile"] = profiler.to_dict()
+        return response
+
+    async def _calculate_funnel_counts(
+        self, funnel: Dict, start_date: str, end_date: str, filters: Dict, segment_by: Optional[str],
+        unit: str, profiler: Optional[QueryProfiler],
+    ) -> Dict:
+        """Stage counts (locally or via the query workers) formatted as a funnel response."""
+        # Calculate metrics using DuckDB with segment filters
+        if self.coordinator:
+            with profile_phase(profiler, "workers"):
+                metrics_result = await self.coordinator.calculate_funnel_metrics(
+                    project_id=funnel["project_id"],
+                    stages=funnel["stages"],
+                    start_date=start_date,
+                    end_date=end_date,
+                    segment_by=segment_by,
+                    unit=unit,
+                    **filters,
+                )
+        else:
+            # Rollups drop session ids, so session funnels scan raw events
+            with profile_phase(profiler, "file_discovery"):
+                parquet_files = await self._plan_files(funnel["project_id"], start_date, end_date) if unit == "user" else None
+            # The scan and the funnel executor's shard results are waited on in a thread, not on the event loop
+            loop = asyncio.get_event_loop()
+            metrics_result = await loop.run_in_executor(
+                None,
+                lambda: self.duckdb_query.calculate_funnel_metrics(
+                    funnel_id=funnel["id"],
+                    project_id=funnel["project_id"],
+                    stages=funnel["stages"],
+                    start_date=start_date,
+                    end_date=end_date,
+                    segment_by=segment_by,
+                    parquet_files=parquet_files,
+                    unit=unit,
+                    **filters,
+                ),
+            )
+
+        with profile_phase(profiler, "formatting"):
+            response = self._build_funnel_response(funnel, metrics_result, start_date, end_date, segment_by)
+        response["unit"] = unit
+        return response
+
+    async def _calculate_period_comparison(
+        self,
+        funnel: Dict,
+        start_date: str,
+        end_date: str,
+        filters: Dict,
+        segment_by: Optional[str],
+        compare_to: str,
+    ) -> Dict:
+        """Calculate the current and comparison periods in one scan and attach deltas."""
+        previous_start, previous_end = get_comparison_range(start_date, end_date, compare_to)
+        if self.coordinator:
+            current, previous = await asyncio.gather(*[
+                self.coordinator.calculate_funnel_metrics(
+                    project_id=funnel["project_id"],
+                    stages=funnel["stages"],
+                    start_date=start,
+                    end_date=end,
+                    segment_by=segment_by,
+                    **filters,
+                )
+                for start, end in [(start_date, end_date), (previous_start, previous_end)]
+            ])
+        else:
+            current_files = await self._plan_files(funnel["project_id"], start_date, end_date)
+            previous_files = await self._plan_files(funnel["project_id"], previous_start, previous_end)
+            loop = asyncio.get_event_loop()
+            results = await loop.run_in_executor(
+                None,
+                lambda: self.duckdb_query.calculate_period_comparison(
+                    project_id=funnel["project_id"],
+                    stages=funnel["stages"],
+                    periods={
+                        "current": (start_date, end_date),
+                        "previous": (previous_start, previous_end),
+                    },
+                    segment_by=segment_by,
+                    parquet_files=None if current_files is None else current_files + previous_files,
+                    **filters,
+                ),
+            )
+            current, previous = results["current"], results["previous"]
+
+        response = self._build_funnel_response(funnel, current, start_date, end_date, segment_by)
+        previous_response = self._build_funnel_response(funnel, previous, previous_start, previous_end, segment_by)
+        for key in ("funnel_id", "funnel_name"):
+            previous_response.pop(key, None)
+
+        if segment_by:
+            deltas = {
+                "total": self._summary_deltas(response["total"], previous_response["total"]),
+                "segments": {
+                    segment: self._summary_deltas(metrics, previous_response["segments"][segment])
+                    for segment, metrics in response["segments"].items()
+                    if segment in previous_response["segments"]
+                },
+            }
+        else:
+            deltas = self._summary_deltas(response, previous_response)
+
+        response["comparison"] = {
+            "compare_to": compare_to,
+            "previous": previous_response,
+            "deltas": deltas,
+        }
+        return response
+
+    @staticmethod
+    def _relative_change(current: float, previous: float) -> Optional[float]:
+        """Relative change in percent (None when the previous value is zero)."""
+        return round((current - previous) / previous * 100, 2) if previous else None
+
+    def _summary_deltas(self, current: Dict, previous: Dict) -> Dict:
+        """Per-stage and overall deltas between two formatted funnel summaries."""
+        stage_deltas = []
+        for cur, prev in zip(current["stages"], previous["stages"]):
+            stage_deltas.append({
+                "stage_name": cur["stage_name"],
+                "stage_order": cur["stage_order"],
+                "users_current": cur["users"],
+                "users_previous": prev["users"],
+                "users_delta": cur["users"] - prev["users"],
+                "users_relative_change": self._relative_change(cur["users"], prev["users"]),
+                "conversion_rate_delta": round(cur["conversion_rate"] - prev["conversion_rate"], 2),
+                "conversion_rate_relative_change": self._relative_change(cur["conversion_rate"], prev["conversion_rate"]),
+                "drop_off_rate_delta": round(cur["drop_off_rate"] - prev["drop_off_rate"], 2),
+            })
+        return {
+            "stages": stage_deltas,
+            "total_users_delta": current["total_users"] - previous["total_users"],
+            "total_users_relative_change": self._relative_change(current["total_users"], previous["total_users"]),
+            "completed_users_delta": current["completed_users"] - previous["completed_users"],
+            "completed_users_relative_change": self._relative_change(current["completed_users"], previous["completed_users"]),
+            "overall_conversion_rate_delta": round(
+                current["overall_conversion_rate"] - previous["overall_conversion_rate"], 2
             ),
-            None,
+        }
+
+    async def calculate_funnel_trend(
+        self,
+        funnel_id: str,
+        org_id: str,
+        start_date: str,
+        end_date: str,
+        granularity: str = "day",
+        user_intent: List[str] = None,
+        content_category: List[str] = None,
+        surface: List[str] = None,
+        user_tenure: List[str] = None,
+        profile: bool = False,
+    ) -> Optional[Dict]:
+        """Calculate a cohort conversion trend as a compact columnar series."""
+        funnel = self.metadata_handler.get_funnel(funnel_id)
+        if not funnel or funnel["organization_id"] != org_id:
+            return None
+        profiler = QueryProfiler() if profile else None
+        if profiler:
+            self.duckdb_query.enable_profiler(profiler)
+
+        with profile_phase(profiler, "file_discovery"):
+            parquet_files = await self._plan_files(funnel["project_id"], start_date, end_date)
+        cohorts = self.duckdb_query.calculate_funnel_trend(
+            project_id=funnel["project_id"],
+            stages=funnel["stages"],
+            start_date=start_date,
+            end_date=end_date,
+            granularity=granularity,
+            user_intent=user_intent,
+            content_category=content_category,
+            surface=surface,
+            user_tenure=user_tenure,
+            parquet_files=parquet_files,
         )
-        if not funnel:
+
+        # Every bucket in the range, including empty ones, so series line up on the x-axis
+        bucket = datetime.fromisoformat(start_date).date()
+        end = datetime.fromisoformat(end_date).date()
+        if granularity == "week":
+            bucket -= timedelta(days=bucket.weekday())
+        step = timedelta(days=7 if granularity == "week" else 1)
+        buckets = []
+        while bucket <= end:
+            buckets.append(bucket.isoformat())
+            bucket += step
+
+        stage_names = [stage["name"] for stage in funnel["stages"]]
+        users = [[cohorts.get(b, {}).get(name, 0) for b in buckets] for name in stage_names]
+        conversion = [
+            round(last / first * 100, 2) if first else 0
+            for first, last in zip(users[0], users[-1])
+        ] if users else []
+
+        response = {
+            "funnel_id": funnel_id,
+            "funnel_name": funnel["name"],
+            "date_range": {"start": start_date, "end": end_date},
+            "granularity": granularity,
+            "buckets": buckets,
+            "stage_names": stage_names,
+            "users": users,
+            "overall_conversion_rate": conversion,
+        }
+        if profiler:
+            response["profile"] = profiler.to_dict()
+        return response
+
+    async def calculate_experiment_metrics(
+        self,
+        funnel_id: str,
+        org_id: str,
+        experiment_id: str,
+        start_date: str,
+        end_date: str,
+        control: str = "control",
+        confidence: float = 0.95,
+        user_intent: List[str] = None,
+        content_category: List[str] = None,
+        surface: List[str] = None,
+        user_tenure: List[str] = None,
+        profile: bool = False,
+    ) -> Optional[Dict]:
+        """Calculate per-variant funnels and significance of each variant against control."""
+        funnel = self.metadata_handler.get_funnel(funnel_id)
+        if not funnel or funnel["organization_id"] != org_id:
             return None
+        profiler = QueryProfiler() if profile else None
+        if profiler:
+            self.duckdb_query.enable_profiler(profiler)
 
-        # Calculate metrics using DuckDB with segment filters
-        metrics_result = self.duckdb_query.calculate_funnel_metrics(
-            funnel_id=funnel_id,
+        with profile_phase(profiler, "file_discovery"):
+            parquet_files = await self._plan_files(funnel["project_id"], start_date, end_date)
+        result = self.duckdb_query.calculate_experiment_metrics(
             project_id=funnel["project_id"],
             stages=funnel["stages"],
+            experiment_id=experiment_id,
             start_date=start_date,
             end_date=end_date,
             user_intent=user_intent,
             content_category=content_category,
             surface=surface,
             user_tenure=user_tenure,
-            segment_by=segment_by,
+            parquet_files=parquet_files,
         )
+        variants = result["variants"]
+        if variants and control not in variants:
+            raise ValueError(f"Control variant '{control}' not found in experiment {experiment_id}")
+
+        stages = funnel["stages"]
+        stage_names = [stage["name"] for stage in stages]
+        treatments = [v for v in variants if v != control]
+        comparisons = []
+        with profile_phase(profiler, "statistics"):
+            if treatments:
+                # (treatments x stages) arrays: conversion from the first stage
+                control_users = np.array([[variants[control][name] for name in stage_names]] * len(treatments))
+                treatment_users = np.array([[variants[v][name] for name in stage_names] for v in treatments])
+                control_entered = control_users[:, :1]
+                treatment_entered = treatment_users[:, :1]
+                fixed = two_proportion_ztest(
+                    control_users, control_entered, treatment_users, treatment_entered, confidence=confidence
+                )
+                sequential = sequential_bounds(
+                    control_users, control_entered, treatment_users, treatment_entered, alpha=1 - confidence
+                )
+                for v, variant in enumerate(treatments):
+                    stage_stats = []
+                    for i, name in enumerate(stage_names):
+                        p_value = self._finite(fixed["p_value"][v, i])
+                        sequential_p = self._finite(sequential["p_value"][v, i])
+                        control_rate = fixed["rate_a"][v, i]
+                        stage_stats.append({
+                            "stage_name": name,
+                            "control_rate": self._finite(control_rate * 100),
+                            "variant_rate": self._finite(fixed["rate_b"][v, i] * 100),
+                            "absolute_lift": self._finite(fixed["diff"][v, i] * 100),
+                            "relative_lift": self._finite(fixed["diff"][v, i] / control_rate * 100) if control_rate else None,
+                            "z_score": self._finite(fixed["z"][v, i]),
+                            "p_value": p_value,
+                            "ci_lower": self._finite(fixed["ci_lower"][v, i] * 100),
+                            "ci_upper": self._finite(fixed["ci_upper"][v, i] * 100),
+                            "significant": p_value is not None and p_value < 1 - confidence,
+                            "sequential": {
+                                "p_value": sequential_p,
+                                "ci_lower": self._finite(sequential["ci_lower"][v, i] * 100),
+                                "ci_upper": self._finite(sequential["ci_upper"][v, i] * 100),
+                                "significant": sequential_p is not None and sequential_p < 1 - confidence,
+                            },
+                        })
+                    comparisons.append({"variant": variant, "stages": stage_stats})
+
+        response = {
+            "funnel_id": funnel_id,
+            "funnel_name": funnel["name"],
+            "experiment_id": experiment_id,
+            "control": control,
+            "confidence": confidence,
+            "date_range": {"start": start_date, "end": end_date},
+            "crossover_users": result["crossover_users"],
+            "variants": [
+                {
+                    "variant": variant,
+                    "users": counts.get(stage_names[0], 0) if stage_names else 0,
+                    "stages": self._format_stage_metrics(counts, stages),
+                }
+                for variant, counts in variants.items()
+            ],
+            "comparisons": comparisons,
+        }
+        if profiler:
+            response["profile"] = profiler.to_dict()
+        return response
 
+    async def calculate_funnel_paths(
+        self,
+        funnel_id: str,
+        org_id: str,
+        stage_order: int,
+        start_date: str,
+        end_date: str,
+        steps: int = 3,
+        top_k: int = 20,
+        user_intent: List[str] = None,
+        content_category: List[str] = None,
+        surface: List[str] = None,
+        user_tenure: List[str] = None,
+        profile: bool = False,
+    ) -> Optional[Dict]:
+        """Find the top-k event sequences users follow after a funnel stage (Sankey-ready)."""
+        funnel = self.metadata_handler.get_funnel(funnel_id)
+        if not funnel or funnel["organization_id"] != org_id:
+            return None
+        stage = next((s for s in funnel["stages"] if s["order"] == stage_order), None)
+        if not stage:
+            raise ValueError(f"Funnel has no stage with order {stage_order}")
+        profiler = QueryProfiler() if profile else None
+        if profiler:
+            self.duckdb_query.enable_profiler(profiler)
+
+        def count_paths() -> SpaceSaving:
+            counter = SpaceSaving(max(settings.PATH_COUNTER_CAPACITY, top_k))
+            reader = self.duckdb_query.stream_event_paths(
+                project_id=funnel["project_id"],
+                anchor_event=stage["event_type"],
+                start_date=start_date,
+                end_date=end_date,
+                steps=steps,
+                user_intent=user_intent,
+                content_category=content_category,
+                surface=surface,
+                user_tenure=user_tenure,
+            )
+            if reader is None:
+                return counter
+            step_cols = [f"step_{k}" for k in range(1, steps + 1)]
+            # Batches are scanned lazily, so this phase covers the scan and the counting
+            with profile_phase(profiler, "scan_and_count"):
+                for batch in reader:
+                    # Pre-aggregate each batch so the counter sees each distinct path once
+                    grouped = pa.Table.from_batches([batch]).group_by(step_cols).aggregate([([], "count_all")])
+                    columns = grouped.to_pydict()
+                    for *path, users in zip(*(columns[c] for c in step_cols), columns["count_all"]):
+                        counter.update(self._normalize_path(path), users)
+            self.duckdb_query.profile_last_query("paths")
+            return counter
+
+        loop = asyncio.get_event_loop()
+        counter = await loop.run_in_executor(None, count_paths)
+
+        anchor = stage["event_type"]
+        top_paths = counter.top(top_k)
+        nodes: Dict[str, Dict] = {f"0:{anchor}": {"id": f"0:{anchor}", "name": anchor, "step": 0}}
+        links: Dict[tuple, int] = {}
+        for path, users, _ in top_paths:
+            previous = f"0:{anchor}"
+            for step, event_type in enumerate(path, start=1):
+                node_id = f"{step}:{event_type}"
+                nodes.setdefault(node_id, {"id": node_id, "name": event_type, "step": step})
+                links[(previous, node_id)] = links.get((previous, node_id), 0) + users
+                previous = node_id
+
+        covered = sum(users for _, users, _ in top_paths)
+        response = {
+            "funnel_id": funnel_id,
+            "funnel_name": funnel["name"],
+            "stage_name": stage["name"],
+            "anchor_event": anchor,
+            "steps": steps,
+            "date_range": {"start": start_date, "end": end_date},
+            "total_users": counter.total,
+            "paths": [
+                {"path": [anchor] + list(path), "users": users, "max_error": error}
+                for path, users, error in top_paths
+            ],
+            "coverage": round(covered / counter.total * 100, 2) if counter.total else 0,
+            "sankey": {
+                "nodes": list(nodes.values()),
+                "links": [
+                    {"source": source, "target": target, "value": value}
+                    for (source, target), value in links.items()
+                ],
+            },
+        }
+        if profiler:
+            response["profile"] = profiler.to_dict()
+        return response
+
+    @staticmethod
+    def _normalize_path(path: List[Optional[str]]) -> tuple:
+        """Cut a path at the first missing step, marking where the user's events ended."""
+        if None in path:
+            return tuple(path[:path.index(None)]) + (PATH_END,)
+        return tuple(path)
+
+    @staticmethod
+    def _finite(value) -> Optional[float]:
+        """Convert a NumPy scalar to a rounded float (None for NaN / inf)."""
+        value = float(value)
+        return round(value, 6) if math.isfinite(value) else None
+
+    async def calculate_batch_funnel_metrics(
+        self,
+        org_id: str,
+        start_date: str,
+        end_date: str,
+        items: List[Dict],
+        profiler: Optional[QueryProfiler] = None,
+    ) -> List[Dict]:
+        """Calculate several funnels with one shared scan per project.
+
+        Each item has ``funnel_id``, optional segment filter lists and an
+        optional ``segment_by``. Results keep item order; unknown funnels
+        get an ``error`` entry instead of metrics. Phases and queries are
+        recorded into ``profiler`` when given (the response is a list, so
+        the caller attaches the profile).
+        """
+        if profiler:
+            self.duckdb_query.enable_profiler(profiler)
+        funnels = {f["id"]: f for f in self.metadata_handler.list_funnels(org_id)}
+
+        # Group items by project so each project's files are scanned once
+        by_project: Dict[str, List[int]] = {}
+        for index, item in enumerate(items):
+            funnel = funnels.get(item["funnel_id"])
+            if funnel:
+                by_project.setdefault(funnel["project_id"], []).append(index)
+
+        results: List[Dict] = [
+            {"funnel_id": item["funnel_id"], "error": "Funnel not found"} for item in items
+        ]
+        for project_id, indexes in by_project.items():
+            scan_items = [
+                {**items[i], "stages": funnels[items[i]["funnel_id"]]["stages"]} for i in indexes
+            ]
+            with profile_phase(profiler, "file_discovery"):
+                parquet_files = await self._plan_files(project_id, start_date, end_date)
+            loop = asyncio.get_event_loop()
+            metrics_results = await loop.run_in_executor(
+                None,
+                lambda: self.duckdb_query.calculate_batch_funnel_metrics(
+                    project_id=project_id,
+                    items=scan_items,
+                    start_date=start_date,
+                    end_date=end_date,
+                    parquet_files=parquet_files,
+                ),
+            )
+            with profile_phase(profiler, "formatting"):
+                for i, metrics_result in zip(indexes, metrics_results):
+                    results[i] = self._build_funnel_response(
+                        funnels[items[i]["funnel_id"]], metrics_result, start_date, end_date, items[i].get("segment_by")
+                    )
+        return results
+
+    def _build_funnel_response(
+        self,
+        funnel: Dict,
+        metrics_result: Dict,
+        start_date: str,
+        end_date: str,
+        segment_by: str = None,
+        time_to_convert: Optional[Dict] = None,
+    ) -> Dict:
+        """Build the funnel analytics response from raw stage counts."""
+        funnel_id = funnel["id"]
+        time_to_convert = time_to_convert or {}
         # Check if we have segment breakdown
         if isinstance(metrics_result, dict) and "segments" in metrics_result:
             # Segment breakdown mode
             segments_metrics = {}
             for segment_value, segment_metrics in metrics_result["segments"].items():
-                stage_metrics = self._format_stage_metrics(segment_metrics, funnel["stages"])
+                stage_metrics = self._format_stage_metrics(
+                    segment_metrics, funnel["stages"], time_to_convert.get("segments", {}).get(segment_value)
+                )
                 segments_metrics[segment_value] = {
                     "stages": stage_metrics,
                     "total_users": stage_metrics[0]["users"] if stage_metrics else 0,
@@ -68,7 +602,9 @@ class AnalyticsService:
                 }
             
             # Total metrics (aggregated across all segments)
-            total_metrics = self._format_stage_metrics(metrics_result["total"], funnel["stages"])
+            total_metrics = self._format_stage_metrics(
+                metrics_result["total"], funnel["stages"], time_to_convert.get("total")
+            )
             total_users = total_metrics[0]["users"] if total_metrics else 0
             completed_users = total_metrics[-1]["users"] if total_metrics else 0
             overall_conversion = total_metrics[-1]["conversion_rate"] if total_metrics else 0
@@ -76,6 +612,7 @@ class AnalyticsService:
             return {
                 "funnel_id": funnel_id,
                 "funnel_name": funnel["name"],
+                "project_id": funnel["project_id"],
                 "date_range": {"start": start_date, "end": end_date},
                 "segment_by": segment_by,
                 "segments": segments_metrics,
@@ -89,7 +626,7 @@ class AnalyticsService:
         else:
             # Aggregate mode (no segment breakdown)
             metrics = metrics_result
-            stage_metrics = self._format_stage_metrics(metrics, funnel["stages"])
+            stage_metrics = self._format_stage_metrics(metrics, funnel["stages"], time_to_convert or None)
             
             overall_conversion = stage_metrics[-1]["conversion_rate"] if stage_metrics else 0
             total_users = stage_metrics[0]["users"] if stage_metrics else 0
@@ -98,6 +635,7 @@ class AnalyticsService:
             return {
                 "funnel_id": funnel_id,
                 "funnel_name": funnel["name"],
+                "project_id": funnel["project_id"],
                 "date_range": {"start": start_date, "end": end_date},
                 "stages": stage_metrics,
                 "overall_conversion_rate": overall_conversion,
@@ -105,8 +643,28 @@ class AnalyticsService:
                 "completed_users": completed_users,
             }
     
-    def _format_stage_metrics(self, metrics: Dict[str, int], stages: List[Dict]) -> List[Dict]:
-        """Format stage metrics from raw counts."""
+    async def _plan_files(self, project_id: str, start_date: str, end_date: str) -> Optional[List[str]]:
+        """Plan the scan over rollup tiers (None = plain raw scan).
+
+        Planning stats files and may build missing rollups, so it runs in the
+        default executor instead of blocking the event loop.
+        """
+        if not settings.ROLLUPS_ENABLED:
+            return None
+        range_days = (datetime.fromisoformat(end_date) - datetime.fromisoformat(start_date)).days
+        loop = asyncio.get_event_loop()
+        plan = await loop.run_in_executor(
+            None,
+            lambda: self.query_planner.plan_funnel_scan(
+                project_id, start_date, end_date, build_missing=range_days > settings.RAW_SCAN_MAX_DAYS
+            ),
+        )
+        return plan["files"]
+
+    def _format_stage_metrics(
+        self, metrics: Dict[str, int], stages: List[Dict], time_to_convert: Optional[Dict] = None
+    ) -> List[Dict]:
+        """Format stage metrics from raw counts (optionally with time-to-convert per stage)."""
         stage_metrics = []
         prev_count = None
         first_stage_count = metrics.get(stages[0]["name"], 0) if stages else 0
@@ -126,6 +684,8 @@ class AnalyticsService:
                     "drop_off_rate": round(drop_off_rate, 2),
                 }
             )
+            if time_to_convert is not None and stage_name in time_to_convert:
+                stage_metrics[-1]["time_to_convert"] = time_to_convert[stage_name]
             prev_count = users
 
         return stage_metrics
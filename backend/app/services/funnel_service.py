@@ -16,11 +16,7 @@ class FunnelService:
         self, org_id: str, project_id: Optional[str] = None
     ) -> List[Dict]:
         """List all funnels for an organization."""
-        funnels = self.metadata_handler.load_funnels()
-        org_funnels = [f for f in funnels if f["organization_id"] == org_id]
-        if project_id:
-            org_funnels = [f for f in org_funnels if f["project_id"] == project_id]
-        return org_funnels
+        return self.metadata_handler.list_funnels(org_id, project_id)
 
     async def create_funnel(
         self,
@@ -55,23 +51,15 @@ class FunnelService:
             "updated_at": datetime.utcnow().isoformat(),
         }
 
-        funnels = self.metadata_handler.load_funnels()
-        funnels.append(funnel)
-        self.metadata_handler.save_funnels(funnels)
+        self.metadata_handler.upsert_funnel(funnel)
 
         return funnel
 
     async def get_funnel(self, funnel_id: str, org_id: str) -> Optional[Dict]:
         """Get funnel by ID."""
-        funnels = self.metadata_handler.load_funnels()
-        funnel = next(
-            (
-                f
-                for f in funnels
-                if f["id"] == funnel_id and f["organization_id"] == org_id
-            ),
-            None,
-        )
+        funnel = self.metadata_handler.get_funnel(funnel_id)
+        if not funnel or funnel["organization_id"] != org_id:
+            return None
         return funnel
 
     async def update_funnel(
@@ -83,16 +71,8 @@ class FunnelService:
         stages: List[Dict],
     ) -> Optional[Dict]:
         """Update funnel definition."""
-        funnels = self.metadata_handler.load_funnels()
-        funnel = next(
-            (
-                f
-                for f in funnels
-                if f["id"] == funnel_id and f["organization_id"] == org_id
-            ),
-            None,
-        )
-        if not funnel:
+        funnel = self.metadata_handler.get_funnel(funnel_id)
+        if not funnel or funnel["organization_id"] != org_id:
             return None
 
         # Validate stages
@@ -104,23 +84,13 @@ class FunnelService:
         funnel["stages"] = stages
         funnel["updated_at"] = datetime.utcnow().isoformat()
 
-        self.metadata_handler.save_funnels(funnels)
+        self.metadata_handler.upsert_funnel(funnel)
         return funnel
 
     async def delete_funnel(self, funnel_id: str, org_id: str) -> bool:
         """Delete a funnel."""
-        funnels = self.metadata_handler.load_funnels()
-        funnel = next(
-            (
-                f
-                for f in funnels
-                if f["id"] == funnel_id and f["organization_id"] == org_id
-            ),
-            None,
-        )
-        if not funnel:
+        funnel = self.metadata_handler.get_funnel(funnel_id)
+        if not funnel or funnel["organization_id"] != org_id:
             return False
 
-        funnels.remove(funnel)
-        self.metadata_handler.save_funnels(funnels)
-        return True
+        return self.metadata_handler.delete_funnel(funnel_id)
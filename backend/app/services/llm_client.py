@@ -0,0 +1,260 @@
+"""Non-blocking LLM client with concurrency limits, timeouts, retries and a circuit breaker."""
+
+import asyncio
+import random
+import time
+from typing import AsyncIterator, Dict, List, Optional
+import openai
+from openai import AsyncOpenAI
+from app.core.config import settings
+
+# Failures worth retrying: the same request may succeed a moment later
+TRANSIENT_ERRORS = (
+    asyncio.TimeoutError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+class CircuitOpenError(Exception):
+    """Raised when the circuit breaker rejects a call without contacting the API."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker (closed -> open -> half-open -> closed).
+
+    After ``failure_threshold`` failed calls in a row the circuit opens and
+    calls fail fast. Once ``reset_timeout`` has passed one trial call is let
+    through; its outcome closes or re-opens the circuit. A trial that ends
+    without an outcome (cancelled, closed early) must call ``release_trial``.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def before_call(self) -> bool:
+        """Reject the call when open (or when a half-open trial is already running).
+
+        Returns True when the admitted call is the half-open trial.
+        """
+        state = self.state
+        if state == "open" or (state == "half_open" and self._trial_in_flight):
+            raise CircuitOpenError("LLM circuit breaker is open; skipping call")
+        if state == "half_open":
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def release_trial(self):
+        """End the half-open trial without an outcome so the next call can be the trial."""
+        self._trial_in_flight = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class LLMClient:
+    """AsyncOpenAI wrapper shared by GenAI features.
+
+    Calls never block the event loop; at most ``max_concurrency`` run at
+    once per process, each attempt is bounded by ``timeout`` and transient
+    failures are retried with full-jitter exponential backoff. A circuit
+    breaker fails fast while the API is down instead of queueing calls.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        client=None,
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        retry_base_delay: Optional[float] = None,
+        retry_max_delay: Optional[float] = None,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.api_key = api_key or settings.OPENAI_API_KEY
+        self.max_concurrency = max_concurrency or settings.GENAI_MAX_CONCURRENCY
+        self.timeout = timeout or settings.GENAI_TIMEOUT
+        self.max_retries = settings.GENAI_MAX_RETRIES if max_retries is None else max_retries
+        self.retry_base_delay = settings.GENAI_RETRY_BASE_DELAY if retry_base_delay is None else retry_base_delay
+        self.retry_max_delay = retry_max_delay or settings.GENAI_RETRY_MAX_DELAY
+        self.breaker = breaker or CircuitBreaker(settings.GENAI_BREAKER_FAILURES, settings.GENAI_BREAKER_RESET)
+        self._injected_client = client
+        self._client = client
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop = None
+
+    def _bind_loop(self):
+        """Create the semaphore and HTTP client for the running event loop."""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            if self._injected_client is None:
+                # Retries are ours (with jitter and the breaker), not the SDK's
+                self._client = AsyncOpenAI(api_key=self.api_key, max_retries=0, timeout=self.timeout)
+
+    def _backoff(self, attempt: int) -> float:
+        """Full-jitter delay before retry ``attempt`` (1-based)."""
+        return random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** (attempt - 1)))
+
+    async def chat(
+        self,
+        messages: List[Dict],
+        model: Optional[str] = None,
+        timeout: Optional[float] = None,
+        **kwargs,
+    ):
+        """Create a chat completion and return the SDK response object."""
+        self._bind_loop()
+        timeout = timeout or self.timeout
+        attempt = 0
+        while True:
+            is_trial = self.breaker.before_call()
+            try:
+                async with self._semaphore:
+                    response = await asyncio.wait_for(
+                        self._client.chat.completions.create(
+                            model=model or settings.GENAI_MODEL,
+                            messages=messages,
+                            timeout=timeout,
+                            **kwargs,
+                        ),
+                        timeout=timeout,
+                    )
+            except TRANSIENT_ERRORS as e:
+                self.breaker.record_failure()
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                print(f"LLM call failed ({type(e).__name__}), retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+            except Exception:
+                # The API answered (e.g. 400/401): not an outage, so it does not trip the breaker
+                self.breaker.record_success()
+                raise
+            except BaseException:
+                # Cancelled before an outcome
+                if is_trial:
+                    self.breaker.release_trial()
+                raise
+            self.breaker.record_success()
+            return response
+
+    async def stream_chat(
+        self,
+        messages: List[Dict],
+        model: Optional[str] = None,
+        timeout: Optional[float] = None,
+        **kwargs,
+    ) -> AsyncIterator[str]:
+        """Stream a chat completion, yielding text deltas as they arrive.
+
+        Opening the stream is retried like ``chat``; once text has been
+        yielded a failure is raised instead (a retry would repeat text).
+        ``timeout`` bounds the wait for every chunk, and the concurrency
+        slot is held until the stream ends.
+        """
+        self._bind_loop()
+        timeout = timeout or self.timeout
+        attempt = 0
+        while True:
+            is_trial = self.breaker.before_call()
+            try:
+                await self._semaphore.acquire()
+            except BaseException:
+                # Cancelled while waiting for a slot
+                if is_trial:
+                    self.breaker.release_trial()
+                raise
+            try:
+                stream = await asyncio.wait_for(
+                    self._client.chat.completions.create(
+                        model=model or settings.GENAI_MODEL,
+                        messages=messages,
+                        stream=True,
+                        timeout=timeout,
+                        **kwargs,
+                    ),
+                    timeout=timeout,
+                )
+                break
+            except TRANSIENT_ERRORS as e:
+                self._semaphore.release()
+                self.breaker.record_failure()
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                print(f"LLM stream failed ({type(e).__name__}), retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+            except Exception:
+                self._semaphore.release()
+                self.breaker.record_success()
+                raise
+            except BaseException:
+                self._semaphore.release()
+                if is_trial:
+                    self.breaker.release_trial()
+                raise
+
+        try:
+            chunks = stream.__aiter__()
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout=timeout)
+                except StopAsyncIteration:
+                    break
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except TRANSIENT_ERRORS:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            # Cancelled, closed early by the consumer (GeneratorExit) or a non-transient error
+            if is_trial:
+                self.breaker.release_trial()
+            raise
+        else:
+            self.breaker.record_success()
+        finally:
+            self._semaphore.release()
+            close = getattr(stream, "close", None)
+            if close is not None:
+                await close()
+
+
+_llm_client: Optional[LLMClient] = None
+
+
+def get_llm_client() -> LLMClient:
+    """Get the process-wide LLM client (shares one concurrency limit and breaker)."""
+    global _llm_client
+    if _llm_client is None:
+        _llm_client = LLMClient()
+    return _llm_client
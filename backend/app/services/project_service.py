@@ -1,10 +1,13 @@
 """Project service."""
 
+import re
 import uuid
 import secrets
 from datetime import datetime
 from typing import Optional, List, Dict
 from app.core.config import settings
+from app.core.api_key_cache import api_key_cache
+from app.schemas.project import PROJECT_ID_PATTERN
 from app.storage.metadata_handler import MetadataHandler
 
 
@@ -21,8 +24,7 @@ class ProjectService:
 
     async def list_projects(self, org_id: str, include_full_api_key: bool = False) -> List[Dict]:
         """List all projects for an organization."""
-        projects = self.metadata_handler.load_projects()
-        org_projects = [p.copy() for p in projects if p["organization_id"] == org_id]
+        org_projects = self.metadata_handler.list_projects(org_id)
         # Mask API keys unless explicitly requested
         if not include_full_api_key:
             for project in org_projects:
@@ -38,6 +40,8 @@ class ProjectService:
         # POC: Allow custom project_id for default project
         if project_id is None:
             project_id = str(uuid.uuid4())
+        elif not re.match(PROJECT_ID_PATTERN, project_id):
+            raise ValueError(f"Invalid project ID: {project_id!r}")
         
         # Generate API key
         api_key = secrets.token_urlsafe(32)
@@ -52,13 +56,11 @@ class ProjectService:
             "updated_at": datetime.utcnow().isoformat(),
         }
 
-        projects = self.metadata_handler.load_projects()
-        # Check if project exists
-        existing = next((p for p in projects if p["id"] == project_id), None)
-        if existing:
-            return existing
-        projects.append(project)
-        self.metadata_handler.save_projects(projects)
+        # Return the existing project if the ID is taken
+        if not self.metadata_handler.insert_project(project):
+            return self.metadata_handler.get_project(project_id)
+        # The new key may be cached as unknown
+        api_key_cache.invalidate(project_id)
 
         # Create project directory structure
         self.metadata_handler.create_project_directory(project_id)
@@ -68,10 +70,8 @@ class ProjectService:
     
     async def get_project_by_id(self, project_id: str, include_full_api_key: bool = False) -> Optional[Dict]:
         """Get project by ID (POC: no org check)."""
-        projects = self.metadata_handler.load_projects()
-        project = next((p for p in projects if p["id"] == project_id), None)
+        project = self.metadata_handler.get_project(project_id)
         if project:
-            project = project.copy()
             # Mask API key unless explicitly requested
             if not include_full_api_key and "api_key" in project and len(project["api_key"]) > 13:
                 project["api_key"] = project["api_key"][:10] + "***"  # Mask
@@ -79,39 +79,23 @@ class ProjectService:
 
     async def get_project(self, project_id: str, org_id: str) -> Optional[Dict]:
         """Get project by ID."""
-        projects = self.metadata_handler.load_projects()
-        project = next(
-            (
-                p
-                for p in projects
-                if p["id"] == project_id and p["organization_id"] == org_id
-            ),
-            None,
-        )
-        if project and "api_key" in project:
+        project = self.metadata_handler.get_project(project_id)
+        if not project or project["organization_id"] != org_id:
+            return None
+        if "api_key" in project:
             project["api_key"] = project["api_key"][:10] + "***"  # Mask
         return project
 
     async def get_project_by_api_key(self, api_key: str) -> Optional[Dict]:
         """Get project by API key (for tracking endpoints)."""
-        projects = self.metadata_handler.load_projects()
-        project = next((p for p in projects if p["api_key"] == api_key), None)
-        return project
+        return self.metadata_handler.get_project_by_api_key(api_key)
 
     async def update_project(
         self, project_id: str, org_id: str, name: str, domain: Optional[str] = None
     ) -> Optional[Dict]:
         """Update project settings."""
-        projects = self.metadata_handler.load_projects()
-        project = next(
-            (
-                p
-                for p in projects
-                if p["id"] == project_id and p["organization_id"] == org_id
-            ),
-            None,
-        )
-        if not project:
+        project = self.metadata_handler.get_project(project_id)
+        if not project or project["organization_id"] != org_id:
             return None
 
         project["name"] = name
@@ -119,7 +103,8 @@ class ProjectService:
             project["domain"] = domain
         project["updated_at"] = datetime.utcnow().isoformat()
 
-        self.metadata_handler.save_projects(projects)
+        self.metadata_handler.upsert_project(project)
+        api_key_cache.invalidate(project_id)
 
         # Mask API key
         project["api_key"] = project["api_key"][:10] + "***"
@@ -127,20 +112,12 @@ class ProjectService:
 
     async def delete_project(self, project_id: str, org_id: str) -> bool:
         """Delete a project."""
-        projects = self.metadata_handler.load_projects()
-        project = next(
-            (
-                p
-                for p in projects
-                if p["id"] == project_id and p["organization_id"] == org_id
-            ),
-            None,
-        )
-        if not project:
+        project = self.metadata_handler.get_project(project_id)
+        if not project or project["organization_id"] != org_id:
             return False
 
-        projects.remove(project)
-        self.metadata_handler.save_projects(projects)
+        self.metadata_handler.delete_project(project_id)
+        api_key_cache.invalidate(project_id)
 
         # TODO: Delete project directory and Parquet files
         return True
@@ -0,0 +1,102 @@
+"""Rollup-aware scan planner for funnel queries."""
+
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Set
+from app.storage.rollup_handler import RollupHandler, period_days
+
+
+class QueryPlanner:
+    """Plan which files a funnel scan reads.
+
+    Long ranges are covered greedily by the coarsest fresh rollup tier:
+    whole calendar months first, then whole ISO weeks, then single days.
+    Raw event files are read only for days no rollup covers, i.e. the open
+    edge of the range (today) or days whose rollup is missing and may not
+    be built. Scan cost therefore tracks the number of tiers touched.
+    """
+
+    def __init__(self):
+        self.rollup_handler = RollupHandler()
+
+    def plan_funnel_scan(
+        self,
+        project_id: str,
+        start_date: str,
+        end_date: str,
+        build_missing: bool = False,
+        tiers: tuple = ("monthly", "weekly", "daily"),
+    ) -> Dict:
+        """Plan the Parquet files for a funnel scan over [start_date, end_date].
+
+        ``tiers`` limits the rollup tiers that may be used, e.g. analyses
+        that need per-day activity can only use daily rollups.
+        """
+        start = datetime.fromisoformat(start_date).date()
+        end = datetime.fromisoformat(end_date).date()
+        # Only closed days (before today, UTC) are served from rollups
+        closed_end = min(end, datetime.utcnow().date() - timedelta(days=1))
+
+        remaining: Set[date] = {start + timedelta(days=i) for i in range((end - start).days + 1)}
+        sources: List[Dict] = []
+
+        for tier, period_start in self._candidate_periods(start, closed_end):
+            if tier not in tiers:
+                continue
+            days = period_days(tier, period_start)
+            if not remaining.issuperset(days):
+                continue
+            if not self.rollup_handler.has_raw_data(project_id, days):
+                remaining.difference_update(days)
+                continue
+            path = self.rollup_handler.ensure_rollup(project_id, tier, period_start, build=build_missing)
+            if path is not None:
+                sources.append({
+                    "tier": tier,
+                    "start": days[0].isoformat(),
+                    "end": days[-1].isoformat(),
+                    "path": str(path.absolute()),
+                })
+                remaining.difference_update(days)
+
+        # Open edges: fall back to raw events
+        for day in sorted(remaining):
+            raw_file = self.rollup_handler.raw_file_path(project_id, day)
+            if raw_file.exists():
+                sources.append({
+                    "tier": "raw",
+                    "start": day.isoformat(),
+                    "end": day.isoformat(),
+                    "path": str(raw_file.absolute()),
+                })
+
+        sources.sort(key=lambda s: s["start"])
+        tier_counts: Dict[str, int] = {}
+        for source in sources:
+            tier_counts[source["tier"]] = tier_counts.get(source["tier"], 0) + 1
+        return {
+            "files": [s["path"] for s in sources],
+            "sources": sources,
+            "tiers": tier_counts,
+        }
+
+    @staticmethod
+    def _candidate_periods(start: date, closed_end: date):
+        """Yield (tier, period_start) from coarsest to finest within [start, closed_end]."""
+        if closed_end < start:
+            return
+        month = start.replace(day=1)
+        while month <= closed_end:
+            days = period_days("monthly", month)
+            if days[0] >= start and days[-1] <= closed_end:
+                yield "monthly", month
+            month = days[-1] + timedelta(days=1)
+
+        week = start + timedelta(days=(7 - start.weekday()) % 7)
+        while week + timedelta(days=6) <= closed_end:
+            yield "weekly", week
+            week += timedelta(days=7)
+
+        day = start
+        while day <= closed_end:
+            yield "daily", day
+            day += timedelta(days=1)
@@ -0,0 +1,342 @@
+"""Local rendering of structured GenAI report documents.
+
+The LLM returns one JSON document per analytics snapshot (summary,
+insights, recommendations, experiment, guardrails). Every audience and
+format is rendered from it here, so changing either needs no LLM call.
+"""
+
+import html
+import re
+from typing import Dict, List
+
+# Sections rendered per audience, in order ("key_metrics" comes from the analytics, not the LLM)
+AUDIENCE_SECTIONS = {
+    "executive": ["summary", "key_metrics", "recommendations"],
+    "product_manager": ["summary", "insights", "recommendations", "experiment"],
+    "data_scientist": ["summary", "key_metrics", "insights", "experiment", "guardrails"],
+}
+SECTION_TITLES = {
+    "summary": "Summary",
+    "key_metrics": "Key Metrics",
+    "insights": "Key Insights",
+    "recommendations": "Recommendations",
+    "experiment": "Next Experiment",
+    "guardrails": "Guardrails",
+}
+# CSS class of each section in the HTML template
+SECTION_CLASSES = {
+    "summary": "summary",
+    "insights": "insights",
+    "recommendations": "recommendations",
+    "experiment": "experiments",
+    "guardrails": "guardrails",
+}
+REPORT_TYPES = {
+    "data_scientist": "Technical Analysis",
+    "executive": "Executive Summary",
+    "product_manager": "Product Insights",
+}
+AUDIENCE_DISPLAY = {
+    "data_scientist": "Data Scientist",
+    "executive": "Executive",
+    "product_manager": "Product Manager",
+}
+
+# HTML report template - Based on standard export styling
+HTML_REPORT_TEMPLATE = """
+<!DOCTYPE html>
+<html>
+<head>
+  <meta charset="UTF-8">
+  <title>IAFA Executive Report - __FUNNEL_NAME__</title>
+  <style>
+    body {
+      font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif;
+      line-height: 1.6;
+      color: #333;
+      max-width: 1200px;
+      margin: 0 auto;
+      padding: 40px 20px;
+      background-color: #f5f5f5;
+    }
+    .container {
+      background: white;
+      padding: 40px;
+      border-radius: 8px;
+      box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+    }
+    h1 {
+      color: #E60023;
+      border-bottom: 3px solid #E60023;
+      padding-bottom: 10px;
+      margin-bottom: 30px;
+    }
+    h2 {
+      color: #111827;
+      margin-top: 30px;
+      margin-bottom: 15px;
+      font-size: 1.5em;
+    }
+    h3 {
+      color: #111827;
+      margin-top: 20px;
+      margin-bottom: 10px;
+      font-size: 1.2em;
+    }
+    .summary {
+      background: #f9fafb;
+      padding: 20px;
+      border-radius: 8px;
+      margin: 20px 0;
+      border-left: 4px solid #E60023;
+    }
+    .summary-item {
+      display: flex;
+      justify-content: space-between;
+      padding: 10px 0;
+      border-bottom: 1px solid #e5e7eb;
+    }
+    .summary-item:last-child {
+      border-bottom: none;
+    }
+    .summary-label {
+      font-weight: 600;
+      color: #6b7280;
+    }
+    .summary-value {
+      font-weight: 700;
+      color: #111827;
+      font-size: 1.1em;
+    }
+    table {
+      width: 100%;
+      border-collapse: collapse;
+      margin: 20px 0;
+    }
+    th {
+      background: #f9fafb;
+      padding: 12px;
+      text-align: left;
+      font-weight: 600;
+      color: #374151;
+      border-bottom: 2px solid #e5e7eb;
+    }
+    td {
+      padding: 12px;
+      border-bottom: 1px solid #e5e7eb;
+    }
+    tr:hover {
+      background: #f9fafb;
+    }
+    .insights {
+      background: #eff6ff;
+      padding: 20px;
+      border-radius: 8px;
+      margin: 20px 0;
+      border-left: 4px solid #3b82f6;
+    }
+    .insights ul {
+      margin: 0;
+      padding-left: 20px;
+    }
+    .insights li {
+      margin: 8px 0;
+    }
+    .recommendations {
+      background: #fef2f2;
+      padding: 20px;
+      border-radius: 8px;
+      margin: 20px 0;
+      border-left: 4px solid #E60023;
+    }
+    .recommendation-item {
+      background: white;
+      padding: 15px;
+      margin: 10px 0;
+      border-radius: 6px;
+      border-left: 3px solid #E60023;
+    }
+    .experiments {
+      background: #f3e8ff;
+      padding: 20px;
+      border-radius: 8px;
+      margin: 20px 0;
+      border-left: 4px solid #a78bfa;
+    }
+    .guardrails {
+      background: #fef3c7;
+      padding: 20px;
+      border-radius: 8px;
+      margin: 20px 0;
+      border-left: 4px solid #f59e0b;
+    }
+    ul, ol {
+      margin: 15px 0;
+      padding-left: 20px;
+    }
+    li {
+      margin: 8px 0;
+    }
+    p {
+      margin: 15px 0;
+      line-height: 1.8;
+    }
+    .footer {
+      margin-top: 40px;
+      padding-top: 20px;
+      border-top: 1px solid #e5e7eb;
+      color: #6b7280;
+      font-size: 0.9em;
+      text-align: center;
+    }
+    strong {
+      color: #111827;
+      font-weight: 600;
+    }
+    .highlight {
+      background: #fef2f2;
+      padding: 2px 6px;
+      border-radius: 4px;
+      color: #E60023;
+      font-weight: 600;
+    }
+  </style>
+</head>
+<body>
+  <div class="container">
+    <h1>Inspiration-to-Action Funnel Analyzer (IAFA)</h1>
+    <h2>AI-Powered __REPORT_TYPE__ Report</h2>
+    
+    <div style="margin-bottom: 30px;">
+      <p><strong>Journey:</strong> __FUNNEL_NAME__</p>
+      <p><strong>Date Range:</strong> __START_DATE__ to __END_DATE__</p>
+      <p><strong>Audience:</strong> __AUDIENCE_DISPLAY__</p>
+    </div>
+    
+    <div class="content">
+      __REPORT_CONTENT__
+    </div>
+    
+    <div class="footer">
+      <p>Report Generated: __GENERATED_AT__</p>
+      <p>Inspiration-to-Action Funnel Analyzer (IAFA)</p>
+    </div>
+  </div>
+</body>
+</html>
+"""
+
+
+# Placeholders use __ delimiters to avoid conflicts with CSS braces; one compiled pass fills them all
+_PLACEHOLDER = re.compile(r"__([A-Z_]+)__")
+
+
+def sections_for(audience: str) -> List[str]:
+    """Sections rendered for an audience (a new list the caller may consume)."""
+    return list(AUDIENCE_SECTIONS.get(audience, AUDIENCE_SECTIONS["data_scientist"]))
+
+
+def _items(name: str, document: Dict, analytics_data: Dict) -> List[str]:
+    """Plain-text lines of a section (markdown emphasis allowed)."""
+    if name == "summary":
+        summary = document.get("summary") or ""
+        return [summary] if summary else []
+    if name == "insights":
+        return [str(insight) for insight in document.get("insights", [])]
+    if name == "recommendations":
+        lines = []
+        for rec in document.get("recommendations", []):
+            line = f"**[{rec.get('priority', '')}] {rec.get('title', '')}:** {rec.get('action', '')}"
+            if rec.get("impact"):
+                line += f" → {rec['impact']}"
+            if rec.get("effort"):
+                line += f" (effort: {rec['effort']})"
+            lines.append(line)
+        return lines
+    if name == "experiment":
+        experiment = document.get("experiment") or {}
+        labels = [("hypothesis", "Hypothesis"), ("test", "Test"), ("metric", "Primary metric")]
+        return [f"**{label}:** {experiment[key]}" for key, label in labels if experiment.get(key)]
+    if name == "guardrails":
+        return [
+            f"**{g.get('metric', '')}:** {g.get('threshold', '')}" + (f" ({g['why']})" if g.get("why") else "")
+            for g in document.get("guardrails", [])
+        ]
+    if name == "key_metrics":
+        return [
+            f"Total Users: {analytics_data.get('total_users', 0):,}",
+            f"Completed Users: {analytics_data.get('completed_users', 0):,}",
+            f"Overall Conversion Rate: {analytics_data.get('overall_conversion_rate', 0):.2f}%",
+        ]
+    raise ValueError(f"Unknown report section: {name}")
+
+
+def _html_inline(text: str) -> str:
+    """Escape text for HTML and turn **bold** into <strong>."""
+    return re.sub(r"\*\*(.+?)\*\*", r"<strong>\1</strong>", html.escape(text))
+
+
+def render_section(name: str, document: Dict, analytics_data: Dict, format: str) -> str:
+    """Render one report section as html, markdown or text."""
+    title = SECTION_TITLES[name]
+    items = _items(name, document, analytics_data)
+    stages = analytics_data.get("stages") or [] if name == "key_metrics" else []
+
+    if format == "html":
+        css_class = SECTION_CLASSES.get(name)
+        parts = [f'<div class="{css_class}">' if css_class else "<div>", f"<h2>{title}</h2>"]
+        if name == "summary":
+            parts.extend(f"<p>{_html_inline(item)}</p>" for item in items)
+        else:
+            parts.append("<ul>" + "".join(f"<li>{_html_inline(item)}</li>" for item in items) + "</ul>")
+        if stages:
+            parts.append("<table><tr><th>Stage</th><th>Users</th><th>Conversion</th><th>Drop-off</th></tr>")
+            for stage in stages:
+                parts.append(
+                    f"<tr><td>{html.escape(str(stage.get('stage_name', '')))}</td><td>{stage.get('users', 0):,}</td>"
+                    f"<td>{stage.get('conversion_rate', 0):.1f}%</td><td>{stage.get('drop_off_rate', 0):.1f}%</td></tr>"
+                )
+            parts.append("</table>")
+        parts.append("</div>")
+        return "\n".join(parts)
+
+    if format == "markdown":
+        lines = [f"## {title}"]
+        lines.extend(items if name == "summary" else [f"- {item}" for item in items])
+        if stages:
+            lines.extend(["", "| Stage | Users | Conversion | Drop-off |", "|-------|-------|------------|----------|"])
+            lines.extend(
+                f"| {stage.get('stage_name', '')} | {stage.get('users', 0):,} | "
+                f"{stage.get('conversion_rate', 0):.1f}% | {stage.get('drop_off_rate', 0):.1f}% |"
+                for stage in stages
+            )
+        return "\n".join(lines)
+
+    # Plain text
+    lines = [title.upper()]
+    lines.extend(f"- {item.replace('**', '')}" for item in items)
+    lines.extend(
+        f"- {stage.get('stage_name', '')}: {stage.get('users', 0):,} users, "
+        f"{stage.get('conversion_rate', 0):.1f}% conversion, {stage.get('drop_off_rate', 0):.1f}% drop-off"
+        for stage in stages
+    )
+    return "\n".join(lines)
+
+
+def render_report(
+    document: Dict, analytics_data: Dict, start_date: str, end_date: str, audience: str, format: str, generated_at: str
+) -> str:
+    """Render the full report for an audience in html, markdown or text."""
+    sections = [render_section(name, document, analytics_data, format) for name in sections_for(audience)]
+    if format == "html":
+        values = {
+            "FUNNEL_NAME": html.escape(analytics_data.get("funnel_name", "Unknown Journey")),
+            "START_DATE": start_date,
+            "END_DATE": end_date,
+            "REPORT_TYPE": REPORT_TYPES.get(audience, "Analytics"),
+            "AUDIENCE_DISPLAY": AUDIENCE_DISPLAY.get(audience, audience.replace("_", " ").title()),
+            "REPORT_CONTENT": "\n".join(sections),
+            "GENERATED_AT": generated_at,
+        }
+        return _PLACEHOLDER.sub(lambda m: values.get(m.group(1), m.group(0)), HTML_REPORT_TEMPLATE)
+    return "\n\n".join(sections)
@@ -0,0 +1,138 @@
+"""Retention service."""
+
+import asyncio
+from datetime import date, datetime, timedelta
+from typing import Optional, Dict, List
+from app.storage.metadata_handler import MetadataHandler
+from app.storage.duckdb_query import DuckDBQuery
+from app.core.config import settings
+from app.services.query_planner import QueryPlanner
+from app.utils.profiling import QueryProfiler, profile_phase
+
+# Rollup tiers whose periods nest inside one period of each retention granularity
+# (rollups keep one first time per period, so a tier must not straddle two periods;
+# ISO weeks straddle month boundaries)
+RETENTION_ROLLUP_TIERS = {
+    "day": ("daily",),
+    "week": ("weekly", "daily"),
+    "month": ("monthly", "daily"),
+}
+
+
+class RetentionService:
+    """Service for cohort retention analytics."""
+
+    def __init__(self):
+        self.metadata_handler = MetadataHandler()
+        self.duckdb_query = DuckDBQuery()
+        self.query_planner = QueryPlanner()
+
+    async def calculate_retention(
+        self,
+        project_id: str,
+        org_id: str,
+        cohort_event: str,
+        return_event: str,
+        start_date: str,
+        end_date: str,
+        granularity: str = "week",
+        periods: int = 12,
+        user_intent: List[str] = None,
+        content_category: List[str] = None,
+        surface: List[str] = None,
+        user_tenure: List[str] = None,
+        profile: bool = False,
+    ) -> Optional[Dict]:
+        """Calculate the cohort x period retention matrix for a project."""
+        project = self.metadata_handler.get_project(project_id)
+        if not project or project["organization_id"] != org_id:
+            return None
+        profiler = QueryProfiler() if profile else None
+        if profiler:
+            self.duckdb_query.enable_profiler(profiler)
+
+        with profile_phase(profiler, "file_discovery"):
+            parquet_files = await self._plan_files(project_id, start_date, end_date, granularity)
+        loop = asyncio.get_event_loop()
+        cohorts = await loop.run_in_executor(
+            None,
+            lambda: self.duckdb_query.calculate_retention_matrix(
+                project_id=project_id,
+                cohort_event=cohort_event,
+                return_event=return_event,
+                start_date=start_date,
+                end_date=end_date,
+                granularity=granularity,
+                periods=periods,
+                user_intent=user_intent,
+                content_category=content_category,
+                surface=surface,
+                user_tenure=user_tenure,
+                parquet_files=parquet_files,
+            ),
+        )
+
+        end = datetime.fromisoformat(end_date).date()
+        rows = []
+        for cohort in cohorts:
+            cohort_start = date.fromisoformat(cohort["cohort"])
+            # Periods starting after end_date have not been observed yet
+            observed = [
+                self._period_start(cohort_start, granularity, p) <= end for p in range(periods + 1)
+            ]
+            retained = [count if seen else None for count, seen in zip(cohort["retained"], observed)]
+            rows.append({
+                "cohort": cohort["cohort"],
+                "size": cohort["size"],
+                "retained": retained,
+                "retention_rate": [
+                    (count / cohort["size"] * 100) if count is not None and cohort["size"] > 0 else None
+                    for count in retained
+                ],
+            })
+
+        response = {
+            "project_id": project_id,
+            "cohort_event": cohort_event,
+            "return_event": return_event,
+            "granularity": granularity,
+            "periods": list(range(periods + 1)),
+            "date_range": {"start": start_date, "end": end_date},
+            "cohorts": rows,
+        }
+        if profiler:
+            response["profile"] = profiler.to_dict()
+        return response
+
+    @staticmethod
+    def _period_start(cohort_start: date, granularity: str, offset: int) -> date:
+        """Get the start date of the period ``offset`` periods after a cohort."""
+        if granularity == "day":
+            return cohort_start + timedelta(days=offset)
+        if granularity == "week":
+            return cohort_start + timedelta(weeks=offset)
+        month = cohort_start.month - 1 + offset
+        return date(cohort_start.year + month // 12, month % 12 + 1, 1)
+
+    async def _plan_files(
+        self, project_id: str, start_date: str, end_date: str, granularity: str
+    ) -> Optional[List[str]]:
+        """Plan the scan over rollup tiers fine enough for the granularity (None = plain raw scan).
+
+        Runs in the default executor: planning may build missing rollups.
+        """
+        if not settings.ROLLUPS_ENABLED:
+            return None
+        range_days = (datetime.fromisoformat(end_date) - datetime.fromisoformat(start_date)).days
+        loop = asyncio.get_event_loop()
+        plan = await loop.run_in_executor(
+            None,
+            lambda: self.query_planner.plan_funnel_scan(
+                project_id,
+                start_date,
+                end_date,
+                build_missing=range_days > settings.RAW_SCAN_MAX_DAYS,
+                tiers=RETENTION_ROLLUP_TIERS[granularity],
+            ),
+        )
+        return plan["files"]
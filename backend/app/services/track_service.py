@@ -2,16 +2,21 @@
 
 import uuid
 from datetime import datetime
-from typing import Dict, List
+from typing import Dict, List, Optional
 from app.storage.parquet_handler import ParquetHandler
 from app.core.config import settings
+from app.core.metrics import BUFFER_FLUSH_SECONDS, EVENT_BUFFER_DEPTH, EVENTS_INGESTED
 
 
 class TrackService:
-    """Service for event tracking."""
+    """Service for event tracking.
+
+    Events are buffered per project until the buffer is full, a batch
+    request ends or the periodic flush runs, so the API shares one
+    instance (``get_track_service``) whose buffers the flush can see.
+    """
 
     def __init__(self):
-        self.parquet_handler = ParquetHandler()
         self.event_buffer = {}  # project_id -> list of events
         self.buffer_size = settings.EVENT_BUFFER_SIZE
 
@@ -63,6 +68,7 @@ class TrackService:
         if project_id not in self.event_buffer:
             self.event_buffer[project_id] = []
         self.event_buffer[project_id].append(event)
+        EVENT_BUFFER_DEPTH.inc(project=project_id)
 
         # Flush if buffer is full
         if len(self.event_buffer[project_id]) >= self.buffer_size:
@@ -110,8 +116,33 @@ class TrackService:
         if not events:
             return
 
-        # Write to Parquet
-        await self.parquet_handler.append_events(project_id, events)
-
-        # Clear buffer
+        # Swap the buffer out before awaiting: events tracked while the write runs go to the next flush
         self.event_buffer[project_id] = []
+        try:
+            # DATA_DIR is read per flush: the shared service outlives settings changes
+            with BUFFER_FLUSH_SECONDS.time(project=project_id):
+                await ParquetHandler().append_events(project_id, events)
+        except Exception:
+            # Keep the unwritten events, ahead of anything tracked meanwhile
+            self.event_buffer[project_id] = events + self.event_buffer[project_id]
+            raise
+        EVENT_BUFFER_DEPTH.inc(-len(events), project=project_id)
+        # Events count as ingested once persisted
+        EVENTS_INGESTED.inc(len(events), project=project_id)
+
+    async def flush_all(self):
+        """Flush every non-empty project buffer."""
+        for project_id in list(self.event_buffer.keys()):
+            if self.event_buffer[project_id]:
+                await self._flush_buffer(project_id)
+
+
+_track_service: Optional[TrackService] = None
+
+
+def get_track_service() -> TrackService:
+    """Get the process-wide tracking service (shared buffers, drained by the periodic flush)."""
+    global _track_service
+    if _track_service is None:
+        _track_service = TrackService()
+    return _track_service
@@ -1,10 +1,40 @@
 """DuckDB query handler for analytics."""
 
+import re
+import time
 import duckdb
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional
 from app.core.config import settings
+from app.core.metrics import DUCKDB_FILES_OPENED, DUCKDB_QUERY_ERRORS, DUCKDB_QUERY_SECONDS, DUCKDB_ROWS_SCANNED
+from app.storage.funnel_executor import get_funnel_executor
+from app.utils.profiling import QueryProfiler, profile_phase
+
+# Segment dimensions supported for filtering and breakdowns
+SEGMENT_DIMENSIONS = ["user_intent", "surface", "user_tenure", "content_category"]
+# Time-to-convert histogram bucket upper bounds (seconds) and labels
+TIME_TO_CONVERT_BUCKETS = [
+    (60, "<1m"),
+    (300, "1-5m"),
+    (900, "5-15m"),
+    (3600, "15m-1h"),
+    (6 * 3600, "1-6h"),
+    (24 * 3600, "6-24h"),
+    (3 * 24 * 3600, "1-3d"),
+    (7 * 24 * 3600, "3-7d"),
+    (None, "7d+"),
+]
+# Value substituted for NULL when filtering on a dimension
+SEGMENT_NULL_VALUES = {
+    "user_intent": "Unknown",
+    "surface": "Unknown",
+    "user_tenure": "Unknown",
+    "content_category": "",
+}
+# Top-level rows scanned in DuckDB's JSON profile (it precedes the operator tree)
+_ROWS_SCANNED = re.compile(r'"cumulative_rows_scanned":\s*(\d+)')
 
 
 class DuckDBQuery:
@@ -14,6 +44,49 @@ class DuckDBQuery:
         self.data_dir = Path(settings.DATA_DIR)
         self.events_dir = self.data_dir / "events"
         self.conn = duckdb.connect()
+        self.profile_rows = settings.METRICS_DUCKDB_ROWS_SCANNED
+        if self.profile_rows:
+            # Profile into memory only; read back per query for the rows-scanned metric
+            self.conn.execute("PRAGMA enable_profiling='no_output'")
+        # Set by enable_profiler() for profile=true requests
+        self.profiler: Optional[QueryProfiler] = None
+
+    def enable_profiler(self, profiler: QueryProfiler):
+        """Record phase timings and operator breakdowns of the following queries into ``profiler``."""
+        if not self.profile_rows:
+            self.conn.execute("PRAGMA enable_profiling='no_output'")
+        self.profiler = profiler
+
+    def _phase(self, name: str):
+        return profile_phase(self.profiler, name)
+
+    def profile_last_query(self, query_name: str):
+        """Record the last query into the profiler (streamed results: call once fully read)."""
+        if self.profiler:
+            self.profiler.add_query(query_name, self.conn.get_profiling_information())
+
+    @contextmanager
+    def _observe(self, query_name: str, project_id: str, parquet_files: List, rows: bool = True):
+        """Record latency, files opened and rows scanned of the query run in the ``with`` block.
+
+        ``rows=False`` is for lazily produced results: rows scanned and the
+        query profile are not known until the result has been read.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            DUCKDB_QUERY_ERRORS.inc(project=project_id, query=query_name)
+            raise
+        finally:
+            DUCKDB_QUERY_SECONDS.observe(time.perf_counter() - started, project=project_id, query=query_name)
+            DUCKDB_FILES_OPENED.inc(len(parquet_files), project=project_id, query=query_name)
+        if rows:
+            self.profile_last_query(query_name)
+        if rows and self.profile_rows:
+            match = _ROWS_SCANNED.search(self.conn.get_profiling_information())
+            if match:
+                DUCKDB_ROWS_SCANNED.inc(int(match.group(1)), project=project_id, query=query_name)
 
     def _generate_parquet_file_paths(
         self, project_id: str, start_date: str, end_date: str
@@ -42,6 +115,111 @@ class DuckDBQuery:
 
         return files
 
+    @staticmethod
+    def _files_sql(parquet_files: List[str]) -> str:
+        """Build a DuckDB list literal of Parquet file paths."""
+        files_list = [f"'{f}'" for f in parquet_files]
+        return f"[{', '.join(files_list)}]"
+
+    @staticmethod
+    def _param(params: Dict, value) -> str:
+        """Add ``value`` to a query's named parameters and return its placeholder."""
+        name = f"p{len(params)}"
+        params[name] = value
+        return f"${name}"
+
+    @classmethod
+    def _segment_filter_conditions(
+        cls,
+        params: Dict,
+        user_intent: List[str] = None,
+        content_category: List[str] = None,
+        surface: List[str] = None,
+        user_tenure: List[str] = None,
+    ) -> List[str]:
+        """Build WHERE conditions for segment filters (NULL treated as Unknown / empty).
+
+        Filter values are added to ``params`` as bound parameters.
+        """
+        conditions = []
+        filters = {
+            "user_intent": user_intent,
+            "content_category": content_category,
+            "surface": surface,
+            "user_tenure": user_tenure,
+        }
+        for dimension, values in filters.items():
+            if values:
+                value_list = ", ".join(cls._param(params, value) for value in values)
+                null_value = SEGMENT_NULL_VALUES[dimension]
+                conditions.append(
+                    f"(COALESCE({dimension}, '{null_value}') IN ({value_list}) OR {dimension} IN ({value_list}))"
+                )
+        return conditions
+
+    def _funnel_where_conditions(
+        self,
+        params: Dict,
+        stages: List[Dict],
+        start_date: str,
+        end_date: str,
+        user_intent: List[str] = None,
+        content_category: List[str] = None,
+        surface: List[str] = None,
+        user_tenure: List[str] = None,
+        user_buckets: Optional[List[int]] = None,
+        bucket_count: Optional[int] = None,
+    ) -> List[str]:
+        """Build WHERE conditions for a funnel scan: stage events, date range, segments, buckets.
+
+        Event types, dates and segment values are added to ``params`` as bound parameters.
+        """
+        where_conditions = [
+            self._event_types_condition(params, [stage["event_type"] for stage in stages]),
+            *self._date_range_conditions(params, start_date, end_date),
+        ]
+
+        # Add segment filters (with null/Unknown handling for backward compatibility)
+        where_conditions.extend(self._segment_filter_conditions(
+            params,
+            user_intent=user_intent,
+            content_category=content_category,
+            surface=surface,
+            user_tenure=user_tenure,
+        ))
+
+        # Restrict to a subset of user buckets (DuckDB's hash() is stable across processes and hosts)
+        if user_buckets is not None and bucket_count:
+            bucket_list = ", ".join(str(int(b)) for b in user_buckets) or "NULL"
+            where_conditions.append(f"hash(user_id) % {int(bucket_count)} IN ({bucket_list})")
+        return where_conditions
+
+    @classmethod
+    def _event_types_condition(cls, params: Dict, event_types: List[str]) -> str:
+        """WHERE condition restricting the scan to ``event_types`` (bound parameters)."""
+        return f"event_type IN ({', '.join(cls._param(params, t) for t in event_types)})"
+
+    @classmethod
+    def _date_range_conditions(cls, params: Dict, start_date: str, end_date: str) -> List[str]:
+        """WHERE conditions for an inclusive date range (bound parameters)."""
+        return [
+            f"CAST(created_at AS DATE) >= CAST({cls._param(params, start_date)} AS DATE)",
+            f"CAST(created_at AS DATE) <= CAST({cls._param(params, end_date)} AS DATE)",
+        ]
+
+    @classmethod
+    def _stage_first_times_sql(cls, params: Dict, stages: List[Dict]) -> str:
+        """SELECT list of per-user first times of each stage event (t0, t1, ...)."""
+        return ", ".join(
+            f"MIN(created_at) FILTER (WHERE event_type = {cls._param(params, stage['event_type'])}) AS t{i}"
+            for i, stage in enumerate(stages)
+        )
+
+    @staticmethod
+    def _stage_reached_sql(stage_index: int) -> str:
+        """Condition for a user reaching a stage: first times of it and every earlier stage exist."""
+        return "(" + " AND ".join(f"t{j} IS NOT NULL" for j in range(stage_index + 1)) + ")"
+
     def get_available_event_types(self, project_id: str) -> List[str]:
         """Get list of distinct event types from all Parquet files for a project."""
         try:
@@ -66,7 +244,8 @@ class DuckDBQuery:
             ORDER BY event_type
             """
             
-            result = self.conn.execute(query).fetchall()
+            with self._observe("event_types", project_id, parquet_files):
+                result = self.conn.execute(query).fetchall()
             return [row[0] for row in result]
             
         except Exception as e:
@@ -87,12 +266,23 @@ class DuckDBQuery:
         user_tenure: List[str] = None,
         # Segment breakdown (if None, aggregate; if specified, break down by segment)
         segment_by: str = None,  # "user_intent", "surface", "user_tenure", "content_category"
+        # User-bucket restriction (distributed workers evaluate only the buckets they own)
+        user_buckets: Optional[List[int]] = None,
+        bucket_count: Optional[int] = None,
+        # Planned files (raw and/or rollups from QueryPlanner); generated from the date range if None
+        parquet_files: Optional[List[str]] = None,
+        # Conversion unit: "user" (whole range) or "session" (all stages within one session)
+        unit: str = "user",
     ) -> Dict:
         """Calculate funnel metrics using DuckDB with segment filtering support."""
+        if unit not in ("user", "session"):
+            raise ValueError("unit must be one of: user, session")
         # Generate Parquet file paths
-        parquet_files = self._generate_parquet_file_paths(
-            project_id, start_date, end_date
-        )
+        if parquet_files is None:
+            with self._phase("file_discovery"):
+                parquet_files = self._generate_parquet_file_paths(
+                    project_id, start_date, end_date
+                )
 
         if not parquet_files:
             # Return empty metrics
@@ -102,38 +292,23 @@ class DuckDBQuery:
             return empty_result
 
         # Build file paths list for DuckDB (proper syntax)
-        files_list = [f"'{f}'" for f in parquet_files]
-        files_str = f"[{', '.join(files_list)}]"
-
-        # Get event types from stages
-        event_types = [stage["event_type"] for stage in stages]
-        event_types_str = "', '".join(event_types)
+        files_str = self._files_sql(parquet_files)
 
         # Build WHERE clause with segment filters
-        where_conditions = [
-            f"event_type IN ('{event_types_str}')",
-            f"CAST(created_at AS DATE) >= CAST('{start_date}' AS DATE)",
-            f"CAST(created_at AS DATE) <= CAST('{end_date}' AS DATE)"
-        ]
-        
-        # Add segment filters (with null/Unknown handling for backward compatibility)
-        if user_intent:
-            intent_list = "', '".join(user_intent)
-            where_conditions.append(f"(COALESCE(user_intent, 'Unknown') IN ('{intent_list}') OR user_intent IN ('{intent_list}'))")
-        if content_category:
-            cat_list = "', '".join(content_category)
-            where_conditions.append(f"(COALESCE(content_category, '') IN ('{cat_list}') OR content_category IN ('{cat_list}'))")
-        if surface:
-            surface_list = "', '".join(surface)
-            where_conditions.append(f"(COALESCE(surface, 'Unknown') IN ('{surface_list}') OR surface IN ('{surface_list}'))")
-        if user_tenure:
-            tenure_list = "', '".join(user_tenure)
-            where_conditions.append(f"(COALESCE(user_tenure, 'Unknown') IN ('{tenure_list}') OR user_tenure IN ('{tenure_list}'))")
-        
+        params = {}
+        where_conditions = self._funnel_where_conditions(
+            params, stages, start_date, end_date,
+            user_intent=user_intent,
+            content_category=content_category,
+            surface=surface,
+            user_tenure=user_tenure,
+            user_buckets=user_buckets,
+            bucket_count=bucket_count,
+        )
         where_clause = " AND ".join(where_conditions)
 
         # Build SELECT clause with segment dimension if needed
-        if segment_by and segment_by in ["user_intent", "surface", "user_tenure", "content_category"]:
+        if segment_by and segment_by in SEGMENT_DIMENSIONS:
             # Use COALESCE for backward compatibility with old events without segment fields
             select_cols = f"user_id, event_type, created_at, COALESCE({segment_by}, 'Unknown') as {segment_by}"
             group_by_col = segment_by
@@ -142,17 +317,24 @@ class DuckDBQuery:
             group_by_col = None
 
         # Query events from Parquet files
-        query = f"""
-        SELECT 
-            {select_cols}
-        FROM read_parquet({files_str})
-        WHERE {where_clause}
-        ORDER BY user_id, created_at
-        """
+        if unit == "session":
+            query = self._session_events_sql(files_str, where_clause, group_by_col)
+        else:
+            query = f"""
+            SELECT 
+                {select_cols}
+            FROM read_parquet({files_str}, union_by_name=true)
+            WHERE {where_clause}
+            ORDER BY user_id, created_at
+            """
 
-        # Execute query
+        # Execute query (DuckDB materializes the result in execute(); fetchdf() converts it to pandas)
         try:
-            df = self.conn.execute(query).fetchdf()
+            with self._observe(f"funnel_{unit}", project_id, parquet_files):
+                with self._phase("scan"):
+                    result = self.conn.execute(query, params)
+                with self._phase("fetchdf"):
+                    df = result.fetchdf()
         except Exception as e:
             # If query fails, return empty metrics
             print(f"DuckDB query error: {e}")
@@ -168,25 +350,59 @@ class DuckDBQuery:
             return empty_result
 
         # Calculate funnel metrics
-        if segment_by and group_by_col and group_by_col in df.columns:
-            # Calculate metrics by segment
-            segments_result = {}
-            # Calculate total from all data (aggregate across all segments, ignoring segment dimension)
-            total_df = df[["user_id", "event_type", "created_at"]].copy()
-            total_result = self._calculate_stage_counts(total_df, stages)
-            
-            # Calculate per-segment metrics (exclude "Unknown" and empty segments)
+        with self._phase("stage_counting"):
+            return self._evaluate_funnel_frame(df, stages, group_by_col)
+
+    @staticmethod
+    def _session_events_sql(files_str: str, where_clause: str, segment_col: Optional[str] = None) -> str:
+        """Event query keyed by session instead of user (the key is returned as ``user_id``).
+
+        Events keep their ``session_id``; events without one are assigned a
+        session inferred from gaps longer than SESSION_INACTIVITY_MINUTES
+        between a user's consecutive funnel events. Both windows share the
+        (user_id, created_at) ordering, so this is one sorted pass. Raw
+        files only: rollups do not carry session ids.
+        """
+        segment_select = f", COALESCE({segment_col}, 'Unknown') AS {segment_col}" if segment_col else ""
+        segment_passthrough = f", {segment_col}" if segment_col else ""
+        gap = f"INTERVAL '{settings.SESSION_INACTIVITY_MINUTES} minutes'"
+        return f"""
+        WITH scanned AS (
+            SELECT
+                user_id, event_type, created_at, NULLIF(session_id, '') AS session_id{segment_select},
+                LAG(created_at) OVER (PARTITION BY user_id ORDER BY created_at) AS previous_at
+            FROM read_parquet({files_str}, union_by_name=true)
+            WHERE {where_clause}
+        )
+        SELECT
+            -- Length-prefixed so (user, session) pairs cannot collide
+            CAST(length(user_id) AS VARCHAR) || ':' || user_id || '/' || COALESCE(
+                session_id,
+                '~' || CAST(SUM(CASE WHEN previous_at IS NULL OR created_at - previous_at > {gap} THEN 1 ELSE 0 END)
+                    OVER (PARTITION BY user_id ORDER BY created_at ROWS UNBOUNDED PRECEDING) AS VARCHAR)
+            ) AS user_id,
+            event_type, created_at{segment_passthrough}
+        FROM scanned
+        ORDER BY user_id, created_at
+        """
+
+    def _evaluate_funnel_frame(self, df, stages: List[Dict], group_by_col: Optional[str] = None) -> Dict:
+        """Evaluate stage counts for a scanned frame, optionally broken down by a segment column."""
+        if group_by_col and group_by_col in df.columns:
+            # Calculate total (all data, ignoring segment dimension) and per-segment
+            # metrics in one scatter over the funnel executor
+            frames = {None: df[["user_id", "event_type", "created_at"]]}
             for segment_value in df[group_by_col].dropna().unique():
                 segment_str = str(segment_value).strip()
                 # Skip "Unknown" segments and empty strings
                 if segment_str == "Unknown" or segment_str == "" or segment_str == "None":
                     continue
-                segment_df = df[df[group_by_col] == segment_value][["user_id", "event_type", "created_at"]].copy()
-                segment_metrics = self._calculate_stage_counts(segment_df, stages)
-                segments_result[segment_str] = segment_metrics
-            
+                frames[segment_str] = df[df[group_by_col] == segment_value][["user_id", "event_type", "created_at"]]
+            results = get_funnel_executor().evaluate(frames, stages)
+            total_result = results.pop(None)
+
             return {
-                "segments": segments_result,
+                "segments": results,
                 "total": total_result
             }
         else:
@@ -197,38 +413,573 @@ class DuckDBQuery:
                 return {stage["name"]: 0 for stage in stages}
             df_clean = df[available_cols].copy()
             return self._calculate_stage_counts(df_clean, stages)
-    
+
+    def calculate_funnel_metrics_with_timing(
+        self,
+        project_id: str,
+        stages: List[Dict],
+        start_date: str,
+        end_date: str,
+        user_intent: List[str] = None,
+        content_category: List[str] = None,
+        surface: List[str] = None,
+        user_tenure: List[str] = None,
+        segment_by: str = None,
+        parquet_files: Optional[List[str]] = None,
+    ) -> Dict:
+        """Calculate stage counts and time-to-convert distributions in one DuckDB pass.
+
+        Per user, the first time of each stage event is taken; the time to
+        convert into stage i is the gap between the first stage i-1 and the
+        first stage i event (users who did stage i first are counted but not
+        timed). Quantiles use DuckDB's t-digest ``approx_quantile`` so memory
+        stays bounded. Returns ``{"counts": ..., "time_to_convert": ...}``
+        where ``counts`` has the same shape as ``calculate_funnel_metrics``.
+        """
+        group_by_col = segment_by if segment_by in SEGMENT_DIMENSIONS else None
+        empty_counts = {stage["name"]: 0 for stage in stages}
+        empty = {
+            "counts": {"segments": {}, "total": empty_counts} if group_by_col else empty_counts,
+            "time_to_convert": {"segments": {}, "total": {}} if group_by_col else {},
+        }
+
+        if parquet_files is None:
+            parquet_files = self._generate_parquet_file_paths(project_id, start_date, end_date)
+        if not parquet_files or not stages:
+            return empty
+
+        params = {}
+        where_conditions = self._funnel_where_conditions(
+            params, stages, start_date, end_date,
+            user_intent=user_intent,
+            content_category=content_category,
+            surface=surface,
+            user_tenure=user_tenure,
+        )
+        first_times = self._stage_first_times_sql(params, stages)
+        if group_by_col:
+            segment_select = f", COALESCE({group_by_col}, 'Unknown') AS segment"
+            per_user_keys = "segment, GROUPING(segment) AS is_total"
+            per_user_group = "GROUPING SETS ((user_id), (segment, user_id))"
+        else:
+            segment_select = ""
+            per_user_keys = "NULL AS segment, 1 AS is_total"
+            per_user_group = "user_id"
+
+        reached_cols = []
+        aggregates = []
+        for i in range(len(stages)):
+            reached_cols.append(f"{self._stage_reached_sql(i)} AS r{i}")
+            aggregates.append(f"COUNT(*) FILTER (WHERE r{i}) AS users_{i}")
+            if i == 0:
+                continue
+            reached_cols.append(f"date_diff('millisecond', t{i - 1}, t{i}) / 1000.0 AS d{i}")
+            timed = f"r{i} AND d{i} >= 0"
+            aggregates.append(f"COUNT(*) FILTER (WHERE {timed}) AS timed_{i}")
+            for q in (50, 90, 99):
+                aggregates.append(f"approx_quantile(d{i}, {q / 100}) FILTER (WHERE {timed}) AS p{q}_{i}")
+            lower = 0
+            for k, (upper, _) in enumerate(TIME_TO_CONVERT_BUCKETS):
+                bound = f" AND d{i} < {upper}" if upper is not None else ""
+                aggregates.append(f"COUNT(*) FILTER (WHERE {timed} AND d{i} >= {lower}{bound}) AS h{i}_{k}")
+                lower = upper
+
+        query = f"""
+        WITH events AS (
+            SELECT user_id, event_type, created_at{segment_select}
+            FROM read_parquet({self._files_sql(parquet_files)}, union_by_name=true)
+            WHERE {" AND ".join(where_conditions)}
+        ),
+        per_user AS (
+            SELECT {per_user_keys}, user_id, {first_times}
+            FROM events
+            GROUP BY {per_user_group}
+        ),
+        reached AS (
+            SELECT segment, is_total, {", ".join(reached_cols)}
+            FROM per_user
+        )
+        SELECT segment, is_total, {", ".join(aggregates)}
+        FROM reached
+        GROUP BY segment, is_total
+        """
+        try:
+            with self._observe("funnel_timing", project_id, parquet_files):
+                rows = self.conn.execute(query, params).fetchdf().to_dict("records")
+        except Exception as e:
+            print(f"DuckDB query error: {e}")
+            return empty
+
+        def parse_row(row: Dict):
+            counts = {stage["name"]: int(row[f"users_{i}"]) for i, stage in enumerate(stages)}
+            timing = {}
+            for i in range(1, len(stages)):
+                def seconds(value):
+                    return None if value is None or value != value else round(float(value), 3)
+
+                timing[stages[i]["name"]] = {
+                    "from_stage": stages[i - 1]["name"],
+                    "users": int(row[f"timed_{i}"]),
+                    "p50_seconds": seconds(row[f"p50_{i}"]),
+                    "p90_seconds": seconds(row[f"p90_{i}"]),
+                    "p99_seconds": seconds(row[f"p99_{i}"]),
+                    "histogram": [
+                        {"bucket": label, "users": int(row[f"h{i}_{k}"])}
+                        for k, (_, label) in enumerate(TIME_TO_CONVERT_BUCKETS)
+                    ],
+                }
+            return counts, timing
+
+        result = empty
+        for row in rows:
+            counts, timing = parse_row(row)
+            if not group_by_col:
+                result["counts"], result["time_to_convert"] = counts, timing
+            elif row["is_total"]:
+                result["counts"]["total"], result["time_to_convert"]["total"] = counts, timing
+            else:
+                # Skip "Unknown" segments and empty strings
+                segment_str = str(row["segment"]).strip()
+                if segment_str in ("Unknown", "", "None"):
+                    continue
+                result["counts"]["segments"][segment_str] = counts
+                result["time_to_convert"]["segments"][segment_str] = timing
+        return result
+
+    def calculate_funnel_trend(
+        self,
+        project_id: str,
+        stages: List[Dict],
+        start_date: str,
+        end_date: str,
+        granularity: str = "day",
+        user_intent: List[str] = None,
+        content_category: List[str] = None,
+        surface: List[str] = None,
+        user_tenure: List[str] = None,
+        parquet_files: Optional[List[str]] = None,
+    ) -> Dict[str, Dict[str, int]]:
+        """Calculate per-cohort stage counts in one grouped aggregation.
+
+        Each user belongs to the cohort (day or ISO week) of their first
+        stage-1 event; their stage progress is evaluated over the whole
+        range. Returns ``{cohort_date: {stage_name: users}}`` for cohorts
+        with at least one user.
+        """
+        if granularity not in ("day", "week"):
+            raise ValueError("granularity must be one of: day, week")
+        if parquet_files is None:
+            with self._phase("file_discovery"):
+                parquet_files = self._generate_parquet_file_paths(project_id, start_date, end_date)
+        if not parquet_files or not stages:
+            return {}
+
+        params = {}
+        where_conditions = self._funnel_where_conditions(
+            params, stages, start_date, end_date,
+            user_intent=user_intent,
+            content_category=content_category,
+            surface=surface,
+            user_tenure=user_tenure,
+        )
+        cohort = "CAST(t0 AS DATE)" if granularity == "day" else "CAST(date_trunc('week', CAST(t0 AS DATE)) AS DATE)"
+        stage_counts = ", ".join(
+            f"COUNT(*) FILTER (WHERE {self._stage_reached_sql(i)}) AS users_{i}" for i in range(len(stages))
+        )
+        query = f"""
+        WITH per_user AS (
+            SELECT user_id, {self._stage_first_times_sql(params, stages)}
+            FROM read_parquet({self._files_sql(parquet_files)}, union_by_name=true)
+            WHERE {" AND ".join(where_conditions)}
+            GROUP BY user_id
+        )
+        SELECT {cohort} AS cohort, {stage_counts}
+        FROM per_user
+        WHERE t0 IS NOT NULL
+        GROUP BY cohort
+        ORDER BY cohort
+        """
+        try:
+            with self._observe("trend", project_id, parquet_files), self._phase("scan"):
+                rows = self.conn.execute(query, params).fetchall()
+        except Exception as e:
+            print(f"DuckDB query error: {e}")
+            return {}
+
+        return {
+            row[0].isoformat(): {stage["name"]: int(row[i + 1]) for i, stage in enumerate(stages)}
+            for row in rows
+        }
+
+    def calculate_experiment_metrics(
+        self,
+        project_id: str,
+        stages: List[Dict],
+        experiment_id: str,
+        start_date: str,
+        end_date: str,
+        user_intent: List[str] = None,
+        content_category: List[str] = None,
+        surface: List[str] = None,
+        user_tenure: List[str] = None,
+        parquet_files: Optional[List[str]] = None,
+    ) -> Dict:
+        """Calculate stage counts per experiment variant in one grouped aggregation.
+
+        Each user is assigned the variant of their first event in the
+        experiment; users seen in more than one variant are counted in
+        ``crossover_users``. Returns
+        ``{"variants": {variant: {stage_name: users}}, "crossover_users": n}``.
+        """
+        if parquet_files is None:
+            parquet_files = self._generate_parquet_file_paths(project_id, start_date, end_date)
+        if not parquet_files or not stages:
+            return {"variants": {}, "crossover_users": 0}
+
+        params = {}
+        where_conditions = self._funnel_where_conditions(
+            params, stages, start_date, end_date,
+            user_intent=user_intent,
+            content_category=content_category,
+            surface=surface,
+            user_tenure=user_tenure,
+        )
+        where_conditions.append(f"experiment_id = {self._param(params, experiment_id)}")
+        where_conditions.append("variant IS NOT NULL")
+        stage_counts = ", ".join(
+            f"COUNT(*) FILTER (WHERE {self._stage_reached_sql(i)}) AS users_{i}" for i in range(len(stages))
+        )
+        query = f"""
+        WITH per_user AS (
+            SELECT
+                user_id,
+                arg_min(variant, created_at) AS variant,
+                COUNT(DISTINCT variant) AS variant_count,
+                {self._stage_first_times_sql(params, stages)}
+            FROM read_parquet({self._files_sql(parquet_files)}, union_by_name=true)
+            WHERE {" AND ".join(where_conditions)}
+            GROUP BY user_id
+        )
+        SELECT variant, COUNT(*) FILTER (WHERE variant_count > 1) AS crossover_users, {stage_counts}
+        FROM per_user
+        GROUP BY variant
+        ORDER BY variant
+        """
+        try:
+            with self._observe("experiment", project_id, parquet_files), self._phase("scan"):
+                rows = self.conn.execute(query, params).fetchall()
+        except Exception as e:
+            print(f"DuckDB query error: {e}")
+            return {"variants": {}, "crossover_users": 0}
+
+        return {
+            "variants": {
+                row[0]: {stage["name"]: int(row[i + 2]) for i, stage in enumerate(stages)}
+                for row in rows
+            },
+            "crossover_users": sum(int(row[1]) for row in rows),
+        }
+
+    def stream_event_paths(
+        self,
+        project_id: str,
+        anchor_event: str,
+        start_date: str,
+        end_date: str,
+        steps: int = 3,
+        user_intent: List[str] = None,
+        content_category: List[str] = None,
+        surface: List[str] = None,
+        user_tenure: List[str] = None,
+        batch_rows: Optional[int] = None,
+    ):
+        """Stream the next ``steps`` events after each user's first ``anchor_event``.
+
+        Events are ordered per user and the following event types are read
+        with LEAD window functions, so the result has one row per anchoring
+        user with columns ``step_1 .. step_N`` (NULL once the user has no
+        more events). Returns a pyarrow RecordBatchReader, or None when
+        there is nothing to scan.
+        """
+        with self._phase("file_discovery"):
+            parquet_files = self._generate_parquet_file_paths(project_id, start_date, end_date)
+        if not parquet_files:
+            return None
+
+        params = {}
+        where_conditions = self._date_range_conditions(params, start_date, end_date)
+        where_conditions.extend(self._segment_filter_conditions(
+            params,
+            user_intent=user_intent,
+            content_category=content_category,
+            surface=surface,
+            user_tenure=user_tenure,
+        ))
+        step_cols = ", ".join(f"step_{k}" for k in range(1, steps + 1))
+        leads = ", ".join(f"LEAD(event_type, {k}) OVER next_events AS step_{k}" for k in range(1, steps + 1))
+        query = f"""
+        SELECT {step_cols}
+        FROM (
+            SELECT
+                event_type,
+                ROW_NUMBER() OVER (PARTITION BY user_id, event_type ORDER BY created_at, id) AS occurrence,
+                {leads}
+            FROM read_parquet({self._files_sql(parquet_files)}, union_by_name=true)
+            WHERE {" AND ".join(where_conditions)}
+            WINDOW next_events AS (PARTITION BY user_id ORDER BY created_at, id)
+        )
+        WHERE event_type = {self._param(params, anchor_event)} AND occurrence = 1
+        """
+        try:
+            # Batches are produced lazily, so only the start of the scan is timed
+            with self._observe("paths", project_id, parquet_files, rows=False):
+                return self.conn.execute(query, params).to_arrow_reader(batch_rows or settings.PATH_BATCH_ROWS)
+        except Exception as e:
+            print(f"DuckDB query error: {e}")
+            return None
+
+    def calculate_retention_matrix(
+        self,
+        project_id: str,
+        cohort_event: str,
+        return_event: str,
+        start_date: str,
+        end_date: str,
+        granularity: str = "week",
+        periods: int = 12,
+        user_intent: List[str] = None,
+        content_category: List[str] = None,
+        surface: List[str] = None,
+        user_tenure: List[str] = None,
+        parquet_files: Optional[List[str]] = None,
+    ) -> List[Dict]:
+        """Calculate a cohort x period retention matrix in one scan.
+
+        A window over each user's events gives their first ``cohort_event``
+        time; each user then gets a bitset (UBIGINT) of the periods, relative
+        to their cohort period, in which they did ``return_event``. Cohort
+        rows count users per period bit. Returns are compared at period
+        resolution (a return earlier in the cohort period counts as period
+        0), so rollups that keep one first time per period give the same
+        matrix as raw events. Returns
+        ``[{"cohort": date, "size": n, "retained": [period 0..periods]}]``.
+        """
+        if granularity not in ("day", "week", "month"):
+            raise ValueError("granularity must be one of: day, week, month")
+        if not 1 <= periods <= 62:
+            raise ValueError("periods must be between 1 and 62")
+        if parquet_files is None:
+            parquet_files = self._generate_parquet_file_paths(project_id, start_date, end_date)
+        if not parquet_files:
+            return []
+
+        params = {}
+        where_conditions = self._funnel_where_conditions(
+            params, [{"event_type": cohort_event}, {"event_type": return_event}],
+            start_date, end_date,
+            user_intent=user_intent,
+            content_category=content_category,
+            surface=surface,
+            user_tenure=user_tenure,
+        )
+        offset = f"date_diff('{granularity}', date_trunc('{granularity}', first_seen), date_trunc('{granularity}', created_at))"
+        retained_cols = ", ".join(
+            f"COUNT(*) FILTER (WHERE (active >> {p}) & 1 = 1) AS period_{p}" for p in range(periods + 1)
+        )
+        query = f"""
+        WITH events AS (
+            SELECT
+                user_id, event_type, created_at,
+                MIN(CASE WHEN event_type = {self._param(params, cohort_event)} THEN created_at END)
+                    OVER (PARTITION BY user_id) AS first_seen
+            FROM read_parquet({self._files_sql(parquet_files)}, union_by_name=true)
+            WHERE {" AND ".join(where_conditions)}
+        ),
+        per_user AS (
+            SELECT
+                user_id,
+                CAST(date_trunc('{granularity}', first_seen) AS DATE) AS cohort,
+                bit_or(CAST(1 AS UBIGINT) << CAST({offset} AS INTEGER)) FILTER (
+                    WHERE event_type = {self._param(params, return_event)}
+                    AND {offset} BETWEEN 0 AND {periods}
+                ) AS active
+            FROM events
+            WHERE first_seen IS NOT NULL
+            GROUP BY user_id, cohort
+        )
+        SELECT cohort, COUNT(*) AS size, {retained_cols}
+        FROM per_user
+        GROUP BY cohort
+        ORDER BY cohort
+        """
+        try:
+            with self._observe("retention", project_id, parquet_files), self._phase("scan"):
+                rows = self.conn.execute(query, params).fetchall()
+        except Exception as e:
+            print(f"DuckDB query error: {e}")
+            return []
+
+        return [
+            {"cohort": row[0].isoformat(), "size": int(row[1]), "retained": [int(v) for v in row[2:]]}
+            for row in rows
+        ]
+
+    def calculate_batch_funnel_metrics(
+        self,
+        project_id: str,
+        items: List[Dict],
+        start_date: str,
+        end_date: str,
+        parquet_files: Optional[List[str]] = None,
+    ) -> List[Dict]:
+        """Calculate several funnels of one project from a single shared scan.
+
+        Each item has ``stages``, optional segment filter lists
+        (``user_intent``, ``content_category``, ``surface``, ``user_tenure``)
+        and an optional ``segment_by``. The scan reads the union of all
+        stage event types once; each funnel is then evaluated from the same
+        deduplicated per-user (event type, segment) state. Results are
+        returned in item order, in the same shape as ``calculate_funnel_metrics``.
+        """
+        def empty_result(item: Dict) -> Dict:
+            result = {stage["name"]: 0 for stage in item["stages"]}
+            return {"segments": {}, "total": result} if item.get("segment_by") else result
+
+        if parquet_files is None:
+            parquet_files = self._generate_parquet_file_paths(project_id, start_date, end_date)
+        if not parquet_files or not items:
+            return [empty_result(item) for item in items]
+
+        params = {}
+        event_types = sorted({stage["event_type"] for item in items for stage in item["stages"]})
+        where_conditions = [
+            self._event_types_condition(params, event_types),
+            *self._date_range_conditions(params, start_date, end_date),
+        ]
+        # Push down the disjunction of per-item filters (no pushdown if any item is unfiltered)
+        if all(any(item.get(dim) for dim in SEGMENT_DIMENSIONS) for item in items):
+            item_filters = [
+                self._segment_filter_conditions(
+                    params,
+                    user_intent=item.get("user_intent"),
+                    content_category=item.get("content_category"),
+                    surface=item.get("surface"),
+                    user_tenure=item.get("user_tenure"),
+                )
+                for item in items
+            ]
+            where_conditions.append("(" + " OR ".join(f"({' AND '.join(c)})" for c in item_filters) + ")")
+
+        # Segment dimensions are read with their filter NULL-substitutes; "" and "Unknown"
+        # are both excluded from breakdowns, so the same column serves filters and segments
+        dimension_cols = ", ".join(
+            f"COALESCE({dim}, '{SEGMENT_NULL_VALUES[dim]}') AS {dim}" for dim in SEGMENT_DIMENSIONS
+        )
+        query = f"""
+        SELECT user_id, event_type, MIN(created_at) AS created_at, {dimension_cols}
+        FROM read_parquet({self._files_sql(parquet_files)}, union_by_name=true)
+        WHERE {" AND ".join(where_conditions)}
+        GROUP BY ALL
+        """
+        try:
+            with self._observe("funnel_batch", project_id, parquet_files), self._phase("scan"):
+                state = self.conn.execute(query, params).fetchdf()
+        except Exception as e:
+            print(f"DuckDB query error: {e}")
+            return [empty_result(item) for item in items]
+
+        results = []
+        with self._phase("stage_counting"):
+            for item in items:
+                mask = state["event_type"].isin([stage["event_type"] for stage in item["stages"]])
+                for dim in SEGMENT_DIMENSIONS:
+                    if item.get(dim):
+                        mask &= state[dim].isin(item[dim])
+                item_df = state[mask]
+                if item_df.empty:
+                    results.append(empty_result(item))
+                    continue
+                segment_by = item.get("segment_by")
+                group_by_col = segment_by if segment_by in SEGMENT_DIMENSIONS else None
+                results.append(self._evaluate_funnel_frame(item_df, item["stages"], group_by_col))
+        return results
+
+    def calculate_period_comparison(
+        self,
+        project_id: str,
+        stages: List[Dict],
+        periods: Dict[str, tuple],
+        user_intent: List[str] = None,
+        content_category: List[str] = None,
+        surface: List[str] = None,
+        user_tenure: List[str] = None,
+        segment_by: str = None,
+        parquet_files: Optional[List[str]] = None,
+    ) -> Dict[str, Dict]:
+        """Calculate funnel metrics for several non-overlapping date ranges in one scan.
+
+        ``periods`` maps a period label (e.g. "current", "previous") to a
+        ``(start_date, end_date)`` tuple. Each row is tagged with its period
+        in the query and every period is evaluated from the same result.
+        """
+        def empty_result() -> Dict:
+            result = {stage["name"]: 0 for stage in stages}
+            return {"segments": {}, "total": result} if segment_by else result
+
+        if parquet_files is None:
+            parquet_files = []
+            for start_date, end_date in periods.values():
+                parquet_files.extend(self._generate_parquet_file_paths(project_id, start_date, end_date))
+        if not parquet_files:
+            return {label: empty_result() for label in periods}
+
+        params = {}
+        period_cases = " ".join(
+            f"WHEN CAST(created_at AS DATE) BETWEEN CAST({self._param(params, start)} AS DATE) "
+            f"AND CAST({self._param(params, end)} AS DATE) THEN {self._param(params, label)}"
+            for label, (start, end) in periods.items()
+        )
+        where_conditions = [
+            self._event_types_condition(params, [stage["event_type"] for stage in stages]),
+            "period IS NOT NULL",
+        ]
+        where_conditions.extend(self._segment_filter_conditions(
+            params,
+            user_intent=user_intent,
+            content_category=content_category,
+            surface=surface,
+            user_tenure=user_tenure,
+        ))
+        group_by_col = segment_by if segment_by in SEGMENT_DIMENSIONS else None
+        segment_col = f", COALESCE({group_by_col}, 'Unknown') AS {group_by_col}" if group_by_col else ""
+
+        query = f"""
+        SELECT user_id, event_type, created_at, period{segment_col}
+        FROM (
+            SELECT *, CASE {period_cases} END AS period
+            FROM read_parquet({self._files_sql(parquet_files)}, union_by_name=true)
+        )
+        WHERE {" AND ".join(where_conditions)}
+        """
+        try:
+            with self._observe("period_comparison", project_id, parquet_files):
+                df = self.conn.execute(query, params).fetchdf()
+        except Exception as e:
+            print(f"DuckDB query error: {e}")
+            return {label: empty_result() for label in periods}
+
+        results = {}
+        for label in periods:
+            period_df = df[df["period"] == label]
+            if period_df.empty:
+                results[label] = empty_result()
+            else:
+                results[label] = self._evaluate_funnel_frame(period_df, stages, group_by_col)
+        return results
+
     def _calculate_stage_counts(self, df, stages: List[Dict]) -> Dict[str, int]:
-        """Calculate stage counts from dataframe."""
-        # Calculate user progression through stages
-        user_events = df.groupby("user_id")["event_type"].apply(list).to_dict()
-
-        # Calculate users at each stage
-        stage_counts = {}
-        for i, stage in enumerate(stages):
-            stage_event = stage["event_type"]
-            stage_name = stage["name"]
-            users_at_stage = set()
-
-            for user_id, user_event_list in user_events.items():
-                # Check if user reached this stage
-                # User must have completed all previous stages in order
-                reached_stage = True
-
-                # Check previous stages were completed
-                for prev_stage_idx in range(i):
-                    prev_event = stages[prev_stage_idx]["event_type"]
-                    if prev_event not in user_event_list:
-                        reached_stage = False
-                        break
-
-                # Check if current stage event exists
-                if reached_stage and stage_event in user_event_list:
-                    users_at_stage.add(user_id)
-
-            stage_counts[stage_name] = len(users_at_stage)
-
-        return stage_counts
+        """Calculate stage counts from dataframe (sharded across the funnel executor)."""
+        return get_funnel_executor().count(df, stages)
 
     def close(self):
         """Close DuckDB connection."""
@@ -0,0 +1,159 @@
+"""Process-pool executor for per-user funnel stage evaluation."""
+
+import atexit
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Hashable, List, Optional
+import pandas as pd
+import pyarrow as pa
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def count_stage_users(df: pd.DataFrame, stages: List[Dict]) -> Dict[str, int]:
+    """Count users reaching each stage (all events of the stage and its predecessors present)."""
+    stage_counts = {stage["name"]: 0 for stage in stages}
+    if df.empty or not stages:
+        return stage_counts
+
+    user_events = (
+        df[["user_id", "event_type"]]
+        .drop_duplicates()
+        .groupby("user_id")["event_type"]
+        .agg(frozenset)
+    )
+    stage_events = [stage["event_type"] for stage in stages]
+    stage_names = [stage["name"] for stage in stages]
+
+    reached = [0] * len(stages)
+    for events in user_events:
+        for i, stage_event in enumerate(stage_events):
+            if stage_event not in events:
+                break
+            reached[i] += 1
+
+    for name, count in zip(stage_names, reached):
+        stage_counts[name] = count
+    return stage_counts
+
+
+def merge_stage_counts(partials: List[Dict[str, int]], stages: List[Dict]) -> Dict[str, int]:
+    """Sum stage counts from disjoint user shards."""
+    merged = {stage["name"]: 0 for stage in stages}
+    for partial in partials:
+        for name, count in partial.items():
+            merged[name] = merged.get(name, 0) + int(count)
+    return merged
+
+
+def _table_to_ipc(table: pa.Table) -> bytes:
+    """Serialize an Arrow table to an IPC stream buffer."""
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _ipc_to_table(buffer: bytes) -> pa.Table:
+    """Deserialize an Arrow IPC stream buffer."""
+    return pa.ipc.open_stream(pa.py_buffer(buffer)).read_all()
+
+
+def _evaluate_shard(shard_ipc: bytes, stages: List[Dict]) -> bytes:
+    """Worker entry point: evaluate one user shard and return counts as an Arrow buffer."""
+    df = _ipc_to_table(shard_ipc).to_pandas()
+    counts = count_stage_users(df, stages)
+    result = pa.table({
+        "stage_name": pa.array(list(counts.keys()), type=pa.string()),
+        "users": pa.array(list(counts.values()), type=pa.int64()),
+    })
+    return _table_to_ipc(result)
+
+
+class FunnelExecutor:
+    """Scatter/gather funnel evaluation across CPU cores.
+
+    Rows are split into shards by a stable hash of ``user_id`` so that every
+    user lands in exactly one shard; per-shard stage counts can then simply
+    be summed. Shards travel to the worker processes as Arrow IPC buffers.
+    ``evaluate`` blocks until the shards are done, so async callers run it
+    (or the query calling it) in a thread via ``run_in_executor``.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, min_rows: Optional[int] = None):
+        workers = settings.FUNNEL_EXECUTOR_WORKERS if max_workers is None else max_workers
+        self.max_workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.min_rows = settings.FUNNEL_EXECUTOR_MIN_ROWS if min_rows is None else min_rows
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """Lazily start the worker pool (spawn context: DuckDB threads do not survive fork)."""
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    def _split_by_user(self, df: pd.DataFrame) -> List[pd.DataFrame]:
+        """Partition rows into user-hash shards."""
+        shard_ids = pd.util.hash_pandas_object(df["user_id"], index=False) % self.max_workers
+        return [shard for _, shard in df.groupby(shard_ids.values, sort=False)]
+
+    def evaluate(self, frames: Dict[Hashable, pd.DataFrame], stages: List[Dict]) -> Dict[Hashable, Dict[str, int]]:
+        """Evaluate stage counts for several frames (e.g. total + each segment) in one scatter."""
+        total_rows = sum(len(df) for df in frames.values())
+        if self.max_workers <= 1 or total_rows < self.min_rows:
+            return {key: count_stage_users(df, stages) for key, df in frames.items()}
+
+        try:
+            pool = self._get_pool()
+            futures = {}
+            for key, df in frames.items():
+                futures[key] = [
+                    pool.submit(
+                        _evaluate_shard,
+                        _table_to_ipc(pa.Table.from_pandas(shard[["user_id", "event_type"]], preserve_index=False)),
+                        stages,
+                    )
+                    for shard in self._split_by_user(df)
+                ]
+
+            results = {}
+            for key, shard_futures in futures.items():
+                partials = []
+                for future in shard_futures:
+                    table = _ipc_to_table(future.result())
+                    partials.append(dict(zip(table["stage_name"].to_pylist(), table["users"].to_pylist())))
+                results[key] = merge_stage_counts(partials, stages)
+            return results
+        except BrokenProcessPool as e:
+            logger.warning("Funnel executor pool failed, evaluating in-process: %s", e)
+            self.shutdown()
+            return {key: count_stage_users(df, stages) for key, df in frames.items()}
+
+    def count(self, df: pd.DataFrame, stages: List[Dict]) -> Dict[str, int]:
+        """Evaluate stage counts for a single frame."""
+        return self.evaluate({None: df}, stages)[None]
+
+    def shutdown(self):
+        """Stop the worker pool."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+_executor: Optional[FunnelExecutor] = None
+
+
+def get_funnel_executor() -> FunnelExecutor:
+    """Get the process-wide funnel executor."""
+    global _executor
+    if _executor is None:
+        _executor = FunnelExecutor()
+        atexit.register(_executor.shutdown)
+    return _executor
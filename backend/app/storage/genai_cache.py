@@ -0,0 +1,170 @@
+"""Persistent cache for GenAI outputs (SQLite in DATA_DIR).
+
+Entries expire after a TTL and the least recently used ones are evicted
+beyond ``max_entries``. The database is shared by all uvicorn workers on a
+host. ``get_or_compute`` coalesces identical concurrent requests: callers
+in the same process await one in-flight future, and callers in other
+processes wait on a short-lived lease row instead of calling the LLM again.
+"""
+
+import asyncio
+import json
+import sqlite3
+import time
+import uuid
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from app.core.config import settings
+
+
+class GenAICache:
+    """SQLite-backed TTL + LRU cache with single-flight computation."""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttl: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        lease_seconds: Optional[float] = None,
+    ):
+        self.path = Path(path) if path else Path(settings.DATA_DIR) / "cache" / "genai_cache.sqlite"
+        self.ttl = settings.GENAI_CACHE_TTL if ttl is None else ttl
+        self.max_entries = max_entries or settings.GENAI_CACHE_MAX_ENTRIES
+        self.lease_seconds = settings.GENAI_CACHE_LEASE_SECONDS if lease_seconds is None else lease_seconds
+        self.owner = uuid.uuid4().hex
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._ensure_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        # One short-lived connection per operation: safe across threads and processes
+        return sqlite3.connect(self.path, timeout=10)
+
+    def _ensure_schema(self):
+        """Create the database and tables if needed."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS entries ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, last_access REAL NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+                )
+        finally:
+            conn.close()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Get a fresh entry (and mark it recently used)."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                row = conn.execute("SELECT value, created_at FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                if now - row[1] >= self.ttl:
+                    conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    return None
+                conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+            return json.loads(row[0])
+        finally:
+            conn.close()
+
+    def set(self, key: str, value: Dict):
+        """Store an entry, then drop expired and least recently used entries."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, created_at, last_access) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), now, now),
+                )
+                conn.execute("DELETE FROM entries WHERE created_at <= ?", (now - self.ttl,))
+                conn.execute(
+                    "DELETE FROM entries WHERE key IN ("
+                    "SELECT key FROM entries ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+        finally:
+            conn.close()
+
+    def _try_acquire_lease(self, key: str) -> bool:
+        """Take the cross-process compute lease for a key (expired leases are taken over)."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM leases WHERE key = ? AND expires_at <= ?", (key, now))
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO leases (key, owner, expires_at) VALUES (?, ?, ?)",
+                    (key, self.owner, now + self.lease_seconds),
+                )
+                return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def _release_lease(self, key: str):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, self.owner))
+        finally:
+            conn.close()
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Dict]],
+        cacheable: Callable[[Dict], bool] = lambda value: True,
+    ) -> Tuple[Dict, bool]:
+        """Return ``(value, cache_hit)``, computing at most once across concurrent callers."""
+        loop = asyncio.get_event_loop()
+        cached = await loop.run_in_executor(None, self.get, key)
+        if cached is not None:
+            return cached, True
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight), False
+
+        future = loop.create_future()
+        self._inflight[key] = future
+        try:
+            value, hit = await self._compute_with_lease(key, compute, cacheable)
+            future.set_result(value)
+            return value, hit
+        except BaseException as e:
+            future.set_exception(e)
+            # Followers re-raise it; mark it retrieved so an unawaited future does not warn
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def _compute_with_lease(
+        self, key: str, compute: Callable[[], Awaitable[Dict]], cacheable: Callable[[Dict], bool]
+    ) -> Tuple[Dict, bool]:
+        """Compute under the cross-process lease, or wait for the process holding it."""
+        loop = asyncio.get_event_loop()
+        if self.lease_seconds > 0:
+            deadline = time.monotonic() + self.lease_seconds
+            while not await loop.run_in_executor(None, self._try_acquire_lease, key):
+                if time.monotonic() > deadline:
+                    break
+                await asyncio.sleep(0.25)
+                cached = await loop.run_in_executor(None, self.get, key)
+                if cached is not None:
+                    return cached, True
+        try:
+            value = await compute()
+            if cacheable(value):
+                await loop.run_in_executor(None, self.set, key, value)
+            return value, False
+        finally:
+            if self.lease_seconds > 0:
+                await loop.run_in_executor(None, self._release_lease, key)
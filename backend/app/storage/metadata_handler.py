@@ -1,151 +1,284 @@
-"""Metadata handler for JSON file operations."""
+"""Metadata handler for projects, funnels, users and organizations.
+
+Records live in a pluggable backend (``METADATA_BACKEND``):
+
+- ``sqlite`` (default): ``metadata/metadata.sqlite`` in WAL mode with
+  indexed tables and row-level writes (see ``sqlite_metadata``). Existing
+  ``metadata/*.json`` files are imported the first time it is opened.
+- ``json``: one JSON file per record kind, kept parsed and indexed in
+  memory per process and re-read only when a file's inode, mtime or size
+  changes. Saves replace the file atomically.
+"""
 
 import json
 import os
+import threading
 import uuid
 from pathlib import Path
-from typing import List, Dict
+from typing import Any, Dict, List, Optional, Tuple
 from app.core.config import settings
-import aiofiles
-import asyncio
+from app.storage.sqlite_metadata import SQLiteMetadataStore
 
+# record kind -> (JSON key, unique fields, grouped fields)
+METADATA_SPECS = {
+    "users": ("users", ("id",), ("organization_id",)),
+    "projects": ("projects", ("id", "api_key"), ("organization_id",)),
+    "funnels": ("funnels", ("id",), ("organization_id", "project_id")),
+    "organizations": ("organizations", ("id",), ()),
+}
 
-class MetadataHandler:
-    """Handler for metadata JSON files."""
 
-    def __init__(self):
-        self.data_dir = Path(settings.DATA_DIR)
-        self.metadata_dir = self.data_dir / "metadata"
-        self.metadata_dir.mkdir(parents=True, exist_ok=True)
+class _MetadataFile:
+    """In-memory, indexed contents of one metadata JSON file."""
+
+    def __init__(self, path: Path, key: str, unique: Tuple[str, ...] = ("id",), grouped: Tuple[str, ...] = ()):
+        self.path = path
+        self.key = key
+        self.unique = unique
+        self.grouped = grouped
+        self.records: List[Dict] = []
+        self.indexes: Dict[str, Dict[Any, Dict]] = {}
+        self.groups: Dict[str, Dict[Any, List[Dict]]] = {}
+        self._signature = None
+        self._lock = threading.Lock()
+
+    def _stat(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _index(self, records: List[Dict], signature):
+        """Replace the cached records and rebuild the indexes."""
+        self.records = records
+        self.indexes = {field: {r[field]: r for r in records if field in r} for field in self.unique}
+        self.groups = {field: {} for field in self.grouped}
+        for field in self.grouped:
+            for record in records:
+                self.groups[field].setdefault(record.get(field), []).append(record)
+        self._signature = signature
+
+    def refresh(self):
+        """Re-read the file if it changed since it was last read or written."""
+        signature = self._stat()
+        if signature == self._signature:
+            return
+        with self._lock:
+            signature = self._stat()
+            if signature == self._signature:
+                return
+            if signature is None:
+                self._index([], None)
+                return
+            with open(self.path, "r") as f:
+                content = f.read()
+            data = json.loads(content) if content else {}
+            self._index(data.get(self.key, []), signature)
+
+    def written(self, records: List[Dict]):
+        """Take over records just saved to the file (copied so later caller edits do not leak in)."""
+        with self._lock:
+            self._index([dict(r) for r in records], self._stat())
+
+    def all(self) -> List[Dict]:
+        self.refresh()
+        return [dict(r) for r in self.records]
+
+    def get(self, field: str, value: Any) -> Optional[Dict]:
+        self.refresh()
+        record = self.indexes[field].get(value)
+        return dict(record) if record is not None else None
 
+    def group(self, field: str, value: Any) -> List[Dict]:
+        self.refresh()
+        return [dict(r) for r in self.groups[field].get(value, [])]
+
+
+class JSONMetadataStore:
+    """Metadata records in ``metadata/*.json`` files, cached in memory."""
+
+    def __init__(self, metadata_dir: Path, specs=METADATA_SPECS):
+        self.metadata_dir = metadata_dir
+        self.specs = specs
+        self.files = {
+            name: _MetadataFile((metadata_dir / f"{name}.json").absolute(), key, unique, grouped)
+            for name, (key, unique, grouped) in specs.items()
+        }
+        # Serializes read-modify-write of single records within the process
+        self._write_lock = threading.Lock()
+        self.metadata_dir.mkdir(parents=True, exist_ok=True)
         # Initialize metadata files if they don't exist
-        self._init_metadata_files()
-
-    def _init_metadata_files(self):
-        """Initialize metadata files if they don't exist."""
-        users_file = self.metadata_dir / "users.json"
-        projects_file = self.metadata_dir / "projects.json"
-        funnels_file = self.metadata_dir / "funnels.json"
-        orgs_file = self.metadata_dir / "organizations.json"
-
-        if not users_file.exists():
-            self._save_json_sync(users_file, {"users": []})
-        if not projects_file.exists():
-            self._save_json_sync(projects_file, {"projects": []})
-        if not funnels_file.exists():
-            self._save_json_sync(funnels_file, {"funnels": []})
-        if not orgs_file.exists():
-            self._save_json_sync(orgs_file, {"organizations": []})
-
-    def _save_json_sync(self, file_path: Path, data: Dict):
-        """Synchronously save JSON file (for initialization only)."""
-        with open(file_path, "w") as f:
-            json.dump(data, f, indent=2)
+        for name, (key, _, _) in specs.items():
+            if not self.files[name].path.exists():
+                self._write_json(self.files[name].path, {key: []})
 
-    async def _load_json(self, file_path: Path) -> Dict:
-        """Asynchronously load JSON file."""
-        if not file_path.exists():
-            return {}
-        async with aiofiles.open(file_path, "r") as f:
-            content = await f.read()
-            return json.loads(content) if content else {}
-
-    async def _save_json(self, file_path: Path, data: Dict):
-        """Asynchronously save JSON file (atomic write)."""
-        # Write to temp file first
-        temp_file = file_path.with_suffix(".tmp")
-        async with aiofiles.open(temp_file, "w") as f:
-            await f.write(json.dumps(data, indent=2))
-        # Atomic rename
+    @staticmethod
+    def _write_json(file_path: Path, data: Dict):
+        """Save a JSON file atomically (temp file + rename)."""
+        temp_file = file_path.with_name(f".{file_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(temp_file, "w") as f:
+            json.dump(data, f, indent=2)
         os.replace(temp_file, file_path)
 
+    def all(self, name: str) -> List[Dict]:
+        return self.files[name].all()
+
+    def get(self, name: str, field: str, value) -> Optional[Dict]:
+        return self.files[name].get(field, value)
+
+    def group(self, name: str, field: str, value) -> List[Dict]:
+        return self.files[name].group(field, value)
+
+    def save(self, name: str, records: List[Dict]):
+        """Replace a file's records and update the in-memory copy."""
+        self._write_json(self.files[name].path, {self.specs[name][0]: records})
+        self.files[name].written(records)
+
+    def insert(self, name: str, record: Dict) -> bool:
+        with self._write_lock:
+            records = self.all(name)
+            if any(r["id"] == record["id"] for r in records):
+                return False
+            self.save(name, records + [record])
+            return True
+
+    def upsert(self, name: str, record: Dict):
+        with self._write_lock:
+            records = self.all(name)
+            index = next((i for i, r in enumerate(records) if r["id"] == record["id"]), None)
+            if index is None:
+                records.append(record)
+            else:
+                records[index] = record
+            self.save(name, records)
+
+    def delete(self, name: str, record_id: str) -> bool:
+        with self._write_lock:
+            records = self.all(name)
+            remaining = [r for r in records if r["id"] != record_id]
+            if len(remaining) == len(records):
+                return False
+            self.save(name, remaining)
+            return True
+
+
+# One store per backend and metadata directory, shared by every MetadataHandler in the process
+_stores: Dict[Tuple[str, Path], Any] = {}
+_stores_lock = threading.Lock()
+
+
+def _get_store(backend: str, metadata_dir: Path):
+    """Get (creating on first use) the metadata store for a backend."""
+    key = (backend, metadata_dir.absolute())
+    store = _stores.get(key)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(key)
+            if store is None:
+                if backend == "json":
+                    store = JSONMetadataStore(metadata_dir)
+                elif backend == "sqlite":
+                    store = SQLiteMetadataStore(metadata_dir / "metadata.sqlite", METADATA_SPECS)
+                    store.migrate_from_json(metadata_dir)
+                else:
+                    raise ValueError(f"Unknown METADATA_BACKEND: {backend}")
+                _stores[key] = store
+    return store
+
+
+class MetadataHandler:
+    """Handler for metadata records.
+
+    ``load_*`` return copies, so callers may edit them and pass the list
+    to the matching ``save_*``; prefer the single-record ``insert_*``,
+    ``upsert_*`` and ``delete_*`` methods, which do not overwrite
+    concurrent changes to other records.
+    """
+
+    def __init__(self):
+        self.data_dir = Path(settings.DATA_DIR)
+        self.metadata_dir = self.data_dir / "metadata"
+        self.store = _get_store(settings.METADATA_BACKEND, self.metadata_dir)
+
     def load_users(self) -> List[Dict]:
-        """Load users from JSON file (synchronous for now)."""
-        users_file = self.metadata_dir / "users.json"
-        if not users_file.exists():
-            return []
-        with open(users_file, "r") as f:
-            data = json.load(f)
-            return data.get("users", [])
+        """Load users."""
+        return self.store.all("users")
 
     def save_users(self, users: List[Dict]):
-        """Save users to JSON file (synchronous wrapper)."""
-        users_file = self.metadata_dir / "users.json"
-        try:
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                self._save_json_sync(users_file, {"users": users})
-            else:
-                asyncio.run(self._save_json(users_file, {"users": users}))
-        except RuntimeError:
-            self._save_json_sync(users_file, {"users": users})
+        """Save users."""
+        self.store.save("users", users)
 
     def load_projects(self) -> List[Dict]:
-        """Load projects from JSON file."""
-        projects_file = self.metadata_dir / "projects.json"
-        if not projects_file.exists():
-            return []
-        with open(projects_file, "r") as f:
-            data = json.load(f)
-            return data.get("projects", [])
+        """Load projects."""
+        return self.store.all("projects")
 
     def save_projects(self, projects: List[Dict]):
-        """Save projects to JSON file (synchronous wrapper)."""
-        projects_file = self.metadata_dir / "projects.json"
-        try:
-            # Try to use existing event loop
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                # If loop is running, use synchronous save
-                self._save_json_sync(projects_file, {"projects": projects})
-            else:
-                # If no loop running, create one
-                asyncio.run(self._save_json(projects_file, {"projects": projects}))
-        except RuntimeError:
-            # No event loop, use synchronous save
-            self._save_json_sync(projects_file, {"projects": projects})
+        """Save projects."""
+        self.store.save("projects", projects)
+
+    def get_project(self, project_id: str) -> Optional[Dict]:
+        """Get a project by ID."""
+        return self.store.get("projects", "id", project_id)
+
+    def get_project_by_api_key(self, api_key: str) -> Optional[Dict]:
+        """Get a project by API key."""
+        return self.store.get("projects", "api_key", api_key)
+
+    def list_projects(self, org_id: str) -> List[Dict]:
+        """List the projects of an organization."""
+        return self.store.group("projects", "organization_id", org_id)
+
+    def insert_project(self, project: Dict) -> bool:
+        """Add a project unless its ID exists; returns whether it was added."""
+        return self.store.insert("projects", project)
+
+    def upsert_project(self, project: Dict):
+        """Add or update a project."""
+        self.store.upsert("projects", project)
+
+    def delete_project(self, project_id: str) -> bool:
+        """Delete a project; returns whether it existed."""
+        return self.store.delete("projects", project_id)
 
     def load_funnels(self) -> List[Dict]:
-        """Load funnels from JSON file."""
-        funnels_file = self.metadata_dir / "funnels.json"
-        if not funnels_file.exists():
-            return []
-        with open(funnels_file, "r") as f:
-            data = json.load(f)
-            return data.get("funnels", [])
+        """Load funnels."""
+        return self.store.all("funnels")
 
     def save_funnels(self, funnels: List[Dict]):
-        """Save funnels to JSON file (synchronous wrapper)."""
-        funnels_file = self.metadata_dir / "funnels.json"
-        try:
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                self._save_json_sync(funnels_file, {"funnels": funnels})
-            else:
-                asyncio.run(self._save_json(funnels_file, {"funnels": funnels}))
-        except RuntimeError:
-            self._save_json_sync(funnels_file, {"funnels": funnels})
+        """Save funnels."""
+        self.store.save("funnels", funnels)
+
+    def get_funnel(self, funnel_id: str) -> Optional[Dict]:
+        """Get a funnel by ID."""
+        return self.store.get("funnels", "id", funnel_id)
+
+    def list_funnels(self, org_id: str, project_id: Optional[str] = None) -> List[Dict]:
+        """List the funnels of an organization (optionally of one project)."""
+        funnels = self.store.group("funnels", "organization_id", org_id)
+        if project_id:
+            funnels = [f for f in funnels if f["project_id"] == project_id]
+        return funnels
+
+    def upsert_funnel(self, funnel: Dict):
+        """Add or update a funnel."""
+        self.store.upsert("funnels", funnel)
+
+    def delete_funnel(self, funnel_id: str) -> bool:
+        """Delete a funnel; returns whether it existed."""
+        return self.store.delete("funnels", funnel_id)
 
     def load_organizations(self) -> List[Dict]:
-        """Load organizations from JSON file."""
-        orgs_file = self.metadata_dir / "organizations.json"
-        if not orgs_file.exists():
-            return []
-        with open(orgs_file, "r") as f:
-            data = json.load(f)
-            return data.get("organizations", [])
+        """Load organizations."""
+        return self.store.all("organizations")
 
     def save_organizations(self, orgs: List[Dict]):
-        """Save organizations to JSON file (synchronous wrapper)."""
-        orgs_file = self.metadata_dir / "organizations.json"
-        try:
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                self._save_json_sync(orgs_file, {"organizations": orgs})
-            else:
-                asyncio.run(self._save_json(orgs_file, {"organizations": orgs}))
-        except RuntimeError:
-            self._save_json_sync(orgs_file, {"organizations": orgs})
+        """Save organizations."""
+        self.store.save("organizations", orgs)
+
+    def get_organization(self, org_id: str) -> Optional[Dict]:
+        """Get an organization by ID."""
+        return self.store.get("organizations", "id", org_id)
 
     def create_project_directory(self, project_id: str):
         """Create directory structure for a project."""
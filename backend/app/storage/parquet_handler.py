@@ -1,6 +1,8 @@
 """Parquet file handler for event storage."""
 
 import json
+import os
+import threading
 import uuid
 from datetime import datetime
 from pathlib import Path
@@ -9,6 +11,17 @@ import pandas as pd
 import pyarrow as pa
 import pyarrow.parquet as pq
 from app.core.config import settings
+from app.core.metrics import PARQUET_BYTES_WRITTEN, PARQUET_WRITE_SECONDS
+
+# Daily files are read, extended and rewritten; one lock per file serializes
+# concurrent writers in this process (batch requests run in executor threads)
+_file_locks: Dict[Path, threading.Lock] = {}
+_file_locks_guard = threading.Lock()
+
+
+def _file_lock(file_path: Path) -> threading.Lock:
+    with _file_locks_guard:
+        return _file_locks.setdefault(file_path, threading.Lock())
 
 
 class ParquetHandler:
@@ -40,6 +53,11 @@ class ParquetHandler:
 
     def _write_events_sync(self, project_id: str, events: List[Dict]):
         """Synchronously write events to Parquet (run in executor)."""
+        with PARQUET_WRITE_SECONDS.time(project=project_id):
+            self._write_events(project_id, events)
+
+    def _write_events(self, project_id: str, events: List[Dict]):
+        """Write events to their daily Parquet files."""
         # Group events by date
         events_by_date = {}
         for event in events:
@@ -88,18 +106,19 @@ class ParquetHandler:
             # Fill remaining None values with empty string or None (for nullable columns)
             df = df.fillna("")  # Fill remaining None values
 
-            # Write to Parquet (append if file exists)
-            if file_path.exists():
-                try:
-                    # Read existing data
-                    existing_df = pd.read_parquet(file_path)
-                    # Append new events
-                    combined_df = pd.concat([existing_df, df], ignore_index=True)
-                    # Write back
-                    combined_df.to_parquet(file_path, compression="snappy", index=False)
-                except Exception as e:
-                    # If read fails, just write new file
-                    df.to_parquet(file_path, compression="snappy", index=False)
-            else:
-                # Create new file
-                df.to_parquet(file_path, compression="snappy", index=False)
+            # Write to Parquet (append if file exists); temp file + rename so readers never see a partial file
+            with _file_lock(file_path):
+                if file_path.exists():
+                    try:
+                        # Read existing data and append new events
+                        existing_df = pd.read_parquet(file_path)
+                        df = pd.concat([existing_df, df], ignore_index=True)
+                    except Exception as e:
+                        # If read fails, just write new file
+                        print(f"Error reading {file_path}, rewriting it: {e}")
+                temp_file = file_path.with_name(f".{file_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+                df.to_parquet(temp_file, compression="snappy", index=False)
+                os.replace(temp_file, file_path)
+
+            # Daily files are rewritten whole
+            PARQUET_BYTES_WRITTEN.inc(file_path.stat().st_size, project=project_id)
@@ -0,0 +1,169 @@
+"""Rollup handler for precomputed per-user event summaries.
+
+A rollup holds one row per (user, event type, segment dimensions) for a
+period, with the first time the event was seen and the number of events.
+That is all funnel stage evaluation needs, so a month of raw events
+collapses into one file with at most users x event types rows.
+
+Layout (next to ``events/``)::
+
+    rollups/project_{id}/daily/{YYYY}/{MM}/rollup_{YYYY-MM-DD}.parquet
+    rollups/project_{id}/weekly/rollup_{YYYY-MM-DD}.parquet   (Monday of the week)
+    rollups/project_{id}/monthly/rollup_{YYYY-MM}.parquet
+
+Daily rollups are built from raw files, weekly and monthly rollups from
+daily rollups. A rollup is fresh when it is newer than all of its inputs.
+"""
+
+import os
+import uuid
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import List, Optional
+import duckdb
+from app.core.config import settings
+
+ROLLUP_TIERS = ("daily", "weekly", "monthly")
+ROLLUP_DIMENSIONS = [
+    "user_intent", "content_category", "surface", "user_tenure", "experiment_id", "variant"
+]
+
+
+def period_days(tier: str, period_start: date) -> List[date]:
+    """List the days covered by a rollup period."""
+    if tier == "daily":
+        return [period_start]
+    if tier == "weekly":
+        return [period_start + timedelta(days=i) for i in range(7)]
+    if tier == "monthly":
+        next_month = (period_start.replace(day=28) + timedelta(days=4)).replace(day=1)
+        return [period_start + timedelta(days=i) for i in range((next_month - period_start).days)]
+    raise ValueError(f"Unknown rollup tier: {tier}")
+
+
+class RollupHandler:
+    """Handler for building and locating rollup files."""
+
+    def __init__(self):
+        self.data_dir = Path(settings.DATA_DIR)
+        self.events_dir = self.data_dir / "events"
+        self.rollups_dir = self.data_dir / "rollups"
+
+    def raw_file_path(self, project_id: str, day: date) -> Path:
+        """Get the raw Parquet file path for a day (same layout as ParquetHandler)."""
+        return (
+            self.events_dir
+            / f"project_{project_id}"
+            / str(day.year)
+            / f"{day.month:02d}"
+            / f"events_{day.isoformat()}.parquet"
+        )
+
+    def rollup_path(self, project_id: str, tier: str, period_start: date) -> Path:
+        """Get the rollup file path for a tier and period."""
+        project_dir = self.rollups_dir / f"project_{project_id}" / tier
+        if tier == "daily":
+            return project_dir / str(period_start.year) / f"{period_start.month:02d}" / f"rollup_{period_start.isoformat()}.parquet"
+        if tier == "weekly":
+            return project_dir / f"rollup_{period_start.isoformat()}.parquet"
+        if tier == "monthly":
+            return project_dir / f"rollup_{period_start.strftime('%Y-%m')}.parquet"
+        raise ValueError(f"Unknown rollup tier: {tier}")
+
+    def has_raw_data(self, project_id: str, days: List[date]) -> bool:
+        """Check whether any raw event file exists for the given days."""
+        return any(self.raw_file_path(project_id, day).exists() for day in days)
+
+    @staticmethod
+    def _is_fresh(path: Path, inputs: List[Path]) -> bool:
+        """A rollup is fresh when it exists and is at least as new as every input."""
+        if not path.exists():
+            return False
+        mtime = path.stat().st_mtime_ns
+        return all(mtime >= p.stat().st_mtime_ns for p in inputs)
+
+    def ensure_rollup(self, project_id: str, tier: str, period_start: date, build: bool = True) -> Optional[Path]:
+        """Return a fresh rollup for the period, building it when allowed.
+
+        Returns None when the period has no data or when the rollup (or one
+        of the daily rollups it derives from) is missing or stale and
+        ``build`` is False.
+        """
+        if tier == "daily":
+            raw_file = self.raw_file_path(project_id, period_start)
+            inputs = [raw_file] if raw_file.exists() else []
+        else:
+            inputs = []
+            for day in period_days(tier, period_start):
+                if not self.raw_file_path(project_id, day).exists():
+                    continue
+                daily = self.ensure_rollup(project_id, "daily", day, build=build)
+                if daily is None:
+                    return None
+                inputs.append(daily)
+        if not inputs:
+            return None
+
+        path = self.rollup_path(project_id, tier, period_start)
+        if self._is_fresh(path, inputs):
+            return path
+        if not build:
+            return None
+        self._build_rollup(path, inputs, from_raw=(tier == "daily"))
+        return path
+
+    def _build_rollup(self, path: Path, inputs: List[Path], from_raw: bool):
+        """Aggregate inputs into a rollup file (written to a temp file, then renamed)."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        files_str = "[" + ", ".join(f"'{p.absolute()}'" for p in inputs) + "]"
+        dimensions = ", ".join(ROLLUP_DIMENSIONS)
+        event_count = "COUNT(*)" if from_raw else "SUM(event_count)"
+        query = f"""
+        COPY (
+            SELECT
+                user_id, event_type, {dimensions},
+                MIN(created_at) AS created_at,
+                {event_count} AS event_count
+            FROM read_parquet({files_str}, union_by_name=true)
+            GROUP BY user_id, event_type, {dimensions}
+            ORDER BY user_id
+        ) TO '{temp_path.absolute()}' (FORMAT PARQUET, COMPRESSION ZSTD)
+        """
+        conn = duckdb.connect()
+        try:
+            conn.execute(query)
+        finally:
+            conn.close()
+        os.replace(temp_path, path)
+
+    def compact_project(self, project_id: str) -> int:
+        """Build missing or stale rollups for closed days, weeks and months; returns the number of fresh rollups."""
+        project_dir = self.events_dir / f"project_{project_id}"
+        if not project_dir.exists():
+            return 0
+        today = datetime.utcnow().date()
+        days = set()
+        for raw_file in project_dir.rglob("events_*.parquet"):
+            try:
+                day = date.fromisoformat(raw_file.stem[len("events_"):])
+            except ValueError:
+                continue
+            if day < today:
+                days.add(day)
+
+        periods = set()
+        for day in days:
+            periods.add(("daily", day))
+            week_start = day - timedelta(days=day.weekday())
+            if week_start + timedelta(days=6) < today:
+                periods.add(("weekly", week_start))
+            month_start = day.replace(day=1)
+            if period_days("monthly", month_start)[-1] < today:
+                periods.add(("monthly", month_start))
+
+        fresh = 0
+        for tier, period_start in sorted(periods, key=lambda p: (ROLLUP_TIERS.index(p[0]), p[1])):
+            if self.ensure_rollup(project_id, tier, period_start, build=True) is not None:
+                fresh += 1
+        return fresh
@@ -0,0 +1,182 @@
+"""SQLite metadata backend (WAL mode, row-level writes).
+
+Each record kind (users, projects, funnels, organizations) is a table
+keyed by ``id`` that stores the record as JSON, with indexed columns for
+the fields records are looked up by. Writes touch single rows inside a
+transaction, so concurrent requests and uvicorn workers no longer
+overwrite each other's changes. Records are not cached in memory (a
+per-process cache would miss other workers' writes); each thread reuses
+one connection, so a lookup is a single indexed query.
+
+Run ``python -m app.storage.sqlite_metadata`` to import the JSON
+metadata files into the database.
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# record kind -> (JSON key, unique fields, grouped fields); "id" must be the first unique field
+Specs = Dict[str, Tuple[str, Tuple[str, ...], Tuple[str, ...]]]
+
+
+class SQLiteMetadataStore:
+    """Metadata records in an embedded SQLite database."""
+
+    def __init__(self, path: Path, specs: Specs):
+        self.path = Path(path)
+        self.specs = specs
+        self._local = threading.local()
+        self._ensure_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        """This thread's connection (sqlite3 connections may not be shared across threads or forks)."""
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():
+            local.conn = sqlite3.connect(self.path, timeout=10)
+            local.pid = os.getpid()
+        return local.conn
+
+    def _columns(self, name: str) -> List[str]:
+        """Indexed columns of a table (besides ``id`` and ``data``)."""
+        _, unique, grouped = self.specs[name]
+        return [field for field in unique + grouped if field != "id"]
+
+    def _ensure_schema(self):
+        """Create the database, tables and indexes if needed."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            for name, (_, unique, grouped) in self.specs.items():
+                columns = "".join(f", {field} TEXT" for field in self._columns(name))
+                conn.execute(f"CREATE TABLE IF NOT EXISTS {name} (id TEXT PRIMARY KEY{columns}, data TEXT NOT NULL)")
+                for field in unique[1:]:
+                    conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {name}_{field} ON {name} ({field})")
+                for field in grouped:
+                    conn.execute(f"CREATE INDEX IF NOT EXISTS {name}_{field} ON {name} ({field})")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    def _query(self, sql: str, params: tuple = ()) -> List[Dict]:
+        conn = self._connect()
+        return [json.loads(row[0]) for row in conn.execute(sql, params)]
+
+    def _row(self, name: str, record: Dict) -> tuple:
+        return (record["id"], *(record.get(field) for field in self._columns(name)), json.dumps(record))
+
+    def _upsert_sql(self, name: str) -> str:
+        columns = ["id", *self._columns(name), "data"]
+        updates = ", ".join(f"{column} = excluded.{column}" for column in columns[1:])
+        return (
+            f"INSERT INTO {name} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+            f"ON CONFLICT(id) DO UPDATE SET {updates}"
+        )
+
+    def all(self, name: str) -> List[Dict]:
+        """All records of a kind, in insertion order."""
+        return self._query(f"SELECT data FROM {name} ORDER BY rowid")
+
+    def get(self, name: str, field: str, value) -> Optional[Dict]:
+        """The record whose unique ``field`` equals ``value``."""
+        rows = self._query(f"SELECT data FROM {name} WHERE {field} = ?", (value,))
+        return rows[0] if rows else None
+
+    def group(self, name: str, field: str, value) -> List[Dict]:
+        """Records whose indexed ``field`` equals ``value``, in insertion order."""
+        return self._query(f"SELECT data FROM {name} WHERE {field} = ? ORDER BY rowid", (value,))
+
+    def insert(self, name: str, record: Dict) -> bool:
+        """Insert a record unless its id exists; returns whether it was inserted."""
+        conn = self._connect()
+        with conn:
+            columns = ["id", *self._columns(name), "data"]
+            cursor = conn.execute(
+                f"INSERT OR IGNORE INTO {name} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                self._row(name, record),
+            )
+            return cursor.rowcount == 1
+
+    def upsert(self, name: str, record: Dict):
+        """Insert or update one record."""
+        conn = self._connect()
+        with conn:
+            conn.execute(self._upsert_sql(name), self._row(name, record))
+
+    def delete(self, name: str, record_id: str) -> bool:
+        """Delete one record; returns whether it existed."""
+        conn = self._connect()
+        with conn:
+            return conn.execute(f"DELETE FROM {name} WHERE id = ?", (record_id,)).rowcount == 1
+
+    def save(self, name: str, records: List[Dict]):
+        """Make the table hold exactly ``records`` (unchanged rows are left alone)."""
+        conn = self._connect()
+        with conn:
+            # BEGIN IMMEDIATE: the read below and the writes are one atomic step
+            conn.execute("BEGIN IMMEDIATE")
+            current = {row[0]: row[1] for row in conn.execute(f"SELECT id, data FROM {name}")}
+            keep = {record["id"] for record in records}
+            conn.executemany(f"DELETE FROM {name} WHERE id = ?", [(i,) for i in current if i not in keep])
+            conn.executemany(
+                self._upsert_sql(name),
+                [self._row(name, r) for r in records if current.get(r["id"]) != json.dumps(r)],
+            )
+
+    def migrate_from_json(self, metadata_dir: Path, overwrite: bool = False) -> Dict[str, int]:
+        """Import ``metadata_dir/*.json`` once; returns the records imported per kind.
+
+        Later runs do nothing unless ``overwrite`` is set, in which case
+        the tables are replaced by the file contents.
+        """
+        conn = self._connect()
+        done = conn.execute("SELECT value FROM meta WHERE key = 'migrated_from_json'").fetchone()
+        if done and not overwrite:
+            return {}
+
+        imported = {}
+        for name, (key, _, _) in self.specs.items():
+            json_file = Path(metadata_dir) / f"{name}.json"
+            if not json_file.exists():
+                continue
+            content = json_file.read_text()
+            records = (json.loads(content) if content else {}).get(key, [])
+            if overwrite:
+                self.save(name, records)
+            else:
+                for record in records:
+                    self.upsert(name, record)
+            imported[name] = len(records)
+
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from_json', ?)", (json.dumps(imported),)
+            )
+        return imported
+
+
+def main():
+    """Import the JSON metadata files into the SQLite metadata database."""
+    from app.core.config import settings
+    from app.storage.metadata_handler import METADATA_SPECS
+
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--data-dir", default=settings.DATA_DIR, help="DATA_DIR holding metadata/*.json")
+    parser.add_argument("--overwrite", action="store_true", help="replace the database contents even if already migrated")
+    args = parser.parse_args()
+
+    metadata_dir = Path(args.data_dir) / "metadata"
+    store = SQLiteMetadataStore(metadata_dir / "metadata.sqlite", METADATA_SPECS)
+    imported = store.migrate_from_json(metadata_dir, overwrite=args.overwrite)
+    if not imported:
+        print("Nothing imported (already migrated or no JSON files); use --overwrite to re-import")
+    for name, count in imported.items():
+        print(f"Imported {count} {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Developer tools (synthetic data generation, load testing)."""
@@ -0,0 +1,266 @@
+"""Open-loop load generator for the tracking API.
+
+Requests are sent on a fixed schedule (Poisson or uniform arrivals at
+``rate`` requests/s) whether or not earlier ones have finished, and
+latency is measured from each request's scheduled time. A slow server
+therefore shows up as queueing latency instead of a lower send rate
+(no coordinated omission). Stepping through several rates finds the
+ingest saturation point.
+
+Usage (from backend/):
+    python -m app.tools.loadgen --url http://localhost:8000 --rate 200 --duration 30
+    python -m app.tools.loadgen --rate 50,100,200,400 --batch-size 100   # in-process (ASGI)
+
+In-process runs share one event loop with the app, so the generator
+competes with request handling; use ``--url`` for saturation numbers.
+
+Events/s counts events written to Parquet, read from the server's
+``iafa_events_ingested_total`` before and after the run: /track only
+buffers, so a run waits (up to ``--settle`` seconds) for the periodic
+flush, or flushes directly when in-process.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import shutil
+import tempfile
+from collections import Counter
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional
+import httpx
+import numpy as np
+from app.core.config import settings
+from app.tools.datagen import DatagenConfig, EventGenerator
+
+TRACK_PATH = "/api/v1/track"
+BATCH_PATH = "/api/v1/track/batch"
+METRICS_PATH = "/metrics"
+PERSISTED_METRIC = "iafa_events_ingested_total"
+# Event fields taken from generated events for request payloads
+PAYLOAD_FIELDS = [
+    "event_type", "user_id", "session_id", "user_intent", "content_category", "surface", "user_tenure",
+    "experiment_id", "variant",
+]
+
+
+def event_payloads(count: int = 10_000, seed: int = 0) -> List[Dict]:
+    """Realistic /track payloads from the synthetic data generator (no timestamp: the server sets it)."""
+    table = next(EventGenerator(DatagenConfig(project_id="loadgen", events=count, seed=seed, days=1)).chunks())
+    rows = table.select(PAYLOAD_FIELDS).slice(0, count).to_pylist()
+    return [{key: value for key, value in row.items() if value is not None} for row in rows]
+
+
+def _percentiles(seconds: List[float]) -> Dict:
+    if not seconds:
+        return {}
+    values = np.asarray(seconds) * 1000
+    p50, p95, p99, p999 = np.percentile(values, [50, 95, 99, 99.9])
+    return {
+        "p50": round(p50, 2), "p95": round(p95, 2), "p99": round(p99, 2), "p999": round(p999, 2),
+        "mean": round(values.mean(), 2), "max": round(values.max(), 2),
+    }
+
+
+async def persisted_events(client: httpx.AsyncClient) -> Optional[int]:
+    """Events the server has written to Parquet, summed over projects (None if /metrics is unavailable)."""
+    try:
+        response = await client.get(METRICS_PATH)
+    except httpx.HTTPError:
+        return None
+    if response.status_code != 200:
+        return None
+    total = 0.0
+    for line in response.text.splitlines():
+        name, _, value = line.rpartition(" ")
+        if name == PERSISTED_METRIC or name.startswith(PERSISTED_METRIC + "{"):
+            total += float(value)
+    return int(total)
+
+
+async def run_load(
+    client: httpx.AsyncClient,
+    rate: float,
+    duration: float,
+    batch_size: int = 1,
+    concurrency: int = 256,
+    arrival: str = "poisson",
+    payloads: Optional[List[Dict]] = None,
+    api_key: Optional[str] = None,
+    seed: int = 0,
+    flush: Optional[Callable[[], Awaitable]] = None,
+    settle: Optional[float] = None,
+) -> Dict:
+    """Send ``rate`` requests/s for ``duration`` seconds and summarize throughput, latency and errors.
+
+    ``batch_size`` 1 posts single events to /track, larger sizes post
+    batches to /track/batch. At most ``concurrency`` requests are in
+    flight; arrivals beyond that wait (and count as latency). Events/s
+    counts persisted events only: after sending, ``flush`` (if given)
+    runs and the run waits up to ``settle`` seconds (default: the flush
+    interval plus 5s) for the persisted count to catch up.
+    """
+    if arrival not in ("poisson", "uniform"):
+        raise ValueError("arrival must be one of: poisson, uniform")
+    rng = np.random.default_rng(seed)
+    events: Iterator[Dict] = itertools.cycle(payloads or event_payloads(seed=seed))
+    path = TRACK_PATH if batch_size == 1 else BATCH_PATH
+    headers = {"X-API-Key": api_key} if api_key else {}
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    service_times: List[float] = []
+    statuses: Counter = Counter()
+    exceptions: Counter = Counter()
+    loop = asyncio.get_running_loop()
+    if flush:
+        # Start from empty buffers so earlier traffic is not counted
+        await flush()
+    persisted_before = await persisted_events(client)
+
+    async def send(scheduled: float, body: Dict):
+        async with semaphore:
+            sent = loop.time()
+            try:
+                response = await client.post(path, json=body, headers=headers)
+                statuses[response.status_code] += 1
+                ok = response.status_code < 400
+            except httpx.HTTPError as e:
+                exceptions[type(e).__name__] += 1
+                ok = False
+            done = loop.time()
+        if ok:
+            latencies.append(done - scheduled)
+            service_times.append(done - sent)
+
+    tasks = []
+    max_lag = 0.0
+    started = loop.time()
+    scheduled = started
+    while True:
+        scheduled += rng.exponential(1 / rate) if arrival == "poisson" else 1 / rate
+        if scheduled - started >= duration:
+            break
+        delay = scheduled - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            max_lag = max(max_lag, -delay)
+        body = next(events) if batch_size == 1 else {"events": list(itertools.islice(events, batch_size))}
+        tasks.append(asyncio.create_task(send(scheduled, body)))
+    await asyncio.gather(*tasks)
+    elapsed = loop.time() - started
+
+    accepted = len(latencies) * batch_size
+    persisted = None
+    if flush:
+        await flush()
+    if persisted_before is not None:
+        deadline = loop.time() + (settings.EVENT_FLUSH_INTERVAL + 5 if settle is None else settle)
+        while True:
+            current = await persisted_events(client)
+            persisted = (persisted_before if current is None else current) - persisted_before
+            if persisted >= accepted or loop.time() >= deadline:
+                break
+            await asyncio.sleep(0.5)
+    # Events/s runs until the events are on disk, not just accepted
+    persisted_elapsed = loop.time() - started
+
+    requests = len(tasks)
+    failed = requests - len(latencies)
+    return {
+        "endpoint": path,
+        "offered_rps": rate,
+        "duration_s": duration,
+        "batch_size": batch_size,
+        "requests": requests,
+        "events": accepted,
+        # None when the server's /metrics could not be read (events/s is then unknown)
+        "persisted_events": persisted,
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "throughput_eps": round(persisted / persisted_elapsed, 1) if persisted is not None else None,
+        "error_rate": round(failed / requests, 4) if requests else 0.0,
+        "errors": {
+            "status": {str(code): count for code, count in statuses.items() if code >= 400},
+            "exceptions": dict(exceptions),
+        },
+        # Measured from the scheduled send time (includes waiting for a concurrency slot)
+        "latency_ms": _percentiles(latencies),
+        # Measured from the actual send time
+        "service_ms": _percentiles(service_times),
+        # How far the generator fell behind its schedule (large = the client itself is saturated)
+        "max_schedule_lag_ms": round(max_lag * 1000, 2),
+    }
+
+
+def _format(result: Dict) -> str:
+    latency = result["latency_ms"] or {key: float("nan") for key in ("p50", "p95", "p99", "p999")}
+    eps = result["throughput_eps"]
+    persisted = result["persisted_events"]
+    return (
+        f"{result['offered_rps']:>8.0f} {result['throughput_rps']:>9.1f} {float('nan') if eps is None else eps:>10.1f} "
+        f"{latency['p50']:>8.1f} {latency['p95']:>8.1f} {latency['p99']:>8.1f} {latency['p999']:>8.1f} "
+        f"{result['error_rate'] * 100:>6.2f}% {'?' if persisted is None else persisted:>9}/{result['events']}"
+    )
+
+
+async def _run(args) -> List[Dict]:
+    payloads = event_payloads(seed=args.seed)
+    flush = None
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+    else:
+        from app.main import app
+        from app.services.track_service import get_track_service
+
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadgen", timeout=args.timeout)
+        # No lifespan (periodic flush) in-process: flush the buffered events directly
+        flush = get_track_service().flush_all
+    results = []
+    async with client:
+        print(f"{'offered':>8} {'req/s':>9} {'events/s':>10} {'p50':>8} {'p95':>8} {'p99':>8} {'p999':>8} {'errors':>7} {'persisted':>9}")
+        for rate in args.rate:
+            result = await run_load(
+                client, rate, args.duration, args.batch_size, args.concurrency, args.arrival, payloads,
+                args.api_key, args.seed, flush, args.settle,
+            )
+            print(_format(result))
+            results.append(result)
+    return results
+
+
+def main(argv: Optional[List[str]] = None):
+    """Drive /track or /track/batch at fixed arrival rates and report throughput, latency and errors."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--url", help="base URL of a running server (default: in-process ASGI app)")
+    parser.add_argument("--rate", type=lambda v: [float(r) for r in v.split(",")], default=[100.0],
+                        help="requests/s; comma-separated rates are run in sequence")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per rate")
+    parser.add_argument("--batch-size", type=int, default=1, help="events per request (>1 uses /track/batch)")
+    parser.add_argument("--concurrency", type=int, default=256, help="maximum requests in flight")
+    parser.add_argument("--arrival", choices=["poisson", "uniform"], default="poisson")
+    parser.add_argument("--api-key", help="X-API-Key header")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--settle", type=float,
+                        help="seconds to wait for events to be persisted (default: EVENT_FLUSH_INTERVAL + 5)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", help="in-process only: DATA_DIR to write into (default: a temporary directory)")
+    parser.add_argument("--output", type=Path, help="write results as JSON")
+    args = parser.parse_args(argv)
+
+    temp_dir = None
+    if not args.url:
+        # Keep load-test events out of the real data directory
+        temp_dir = None if args.data_dir else tempfile.mkdtemp(prefix="iafa-loadgen-")
+        settings.DATA_DIR = args.data_dir or temp_dir
+    try:
+        results = asyncio.run(_run(args))
+    finally:
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -51,3 +51,29 @@ def validate_date_range(start_date: str, end_date: str, max_days: int = 90) -> N
         raise ValueError("end_date must be after start_date")
     if (end - start).days > max_days:
         raise ValueError(f"Date range cannot exceed {max_days} days")
+
+
+def get_comparison_range(start_date: str, end_date: str, compare_to: str) -> Tuple[str, str]:
+    """Get the comparison date range for period-over-period analysis.
+
+    ``previous_period`` is the equally long range ending the day before
+    ``start_date``; ``previous_year`` is the same calendar range one year
+    earlier (Feb 29 maps to Feb 28).
+    """
+    start, end = get_date_range(start_date, end_date)
+    if compare_to == "previous_period":
+        previous_end = start - timedelta(days=1)
+        previous_start = previous_end - (end - start)
+    elif compare_to == "previous_year":
+        def shift(date: datetime) -> datetime:
+            try:
+                return date.replace(year=date.year - 1)
+            except ValueError:
+                return date.replace(year=date.year - 1, day=28)
+
+        previous_start, previous_end = shift(start), shift(end)
+        if previous_end >= start:
+            raise ValueError("previous_year comparison requires a date range shorter than one year")
+    else:
+        raise ValueError("compare_to must be one of: previous_period, previous_year")
+    return format_date_for_query(previous_start), format_date_for_query(previous_end)
@@ -0,0 +1,60 @@
+"""Bounded-memory heavy-hitter counting (Space-Saving)."""
+
+import heapq
+from typing import Dict, Hashable, List, Tuple
+
+
+class SpaceSaving:
+    """Space-Saving counter (Metwally et al.) tracking at most ``capacity`` items.
+
+    Counts are overestimates by at most ``error`` per item, and every item
+    whose true count exceeds ``total / capacity`` is guaranteed to be
+    tracked. Updates may be weighted, so pre-aggregated batches can be fed in.
+    """
+
+    def __init__(self, capacity: int):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.total = 0
+        self.counts: Dict[Hashable, int] = {}
+        self.errors: Dict[Hashable, int] = {}
+        # Min-heap of (count, seq, item); entries go stale when a count grows
+        self._heap: List[Tuple[int, int, Hashable]] = []
+        self._seq = 0
+
+    def _push(self, item: Hashable):
+        self._seq += 1
+        heapq.heappush(self._heap, (self.counts[item], self._seq, item))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(count, i, key) for i, (key, count) in enumerate(self.counts.items())]
+            heapq.heapify(self._heap)
+            self._seq = len(self._heap)
+
+    def _pop_min(self) -> Tuple[Hashable, int]:
+        """Remove and return the tracked item with the smallest count."""
+        while True:
+            count, _, item = heapq.heappop(self._heap)
+            if self.counts.get(item) == count:
+                del self.counts[item]
+                del self.errors[item]
+                return item, count
+
+    def update(self, item: Hashable, weight: int = 1):
+        """Count ``weight`` occurrences of ``item``."""
+        self.total += weight
+        if item in self.counts:
+            self.counts[item] += weight
+        elif len(self.counts) < self.capacity:
+            self.counts[item] = weight
+            self.errors[item] = 0
+        else:
+            _, min_count = self._pop_min()
+            self.counts[item] = min_count + weight
+            self.errors[item] = min_count
+        self._push(item)
+
+    def top(self, k: int) -> List[Tuple[Hashable, int, int]]:
+        """Return the ``k`` largest items as (item, count, error)."""
+        items = heapq.nlargest(k, self.counts.items(), key=lambda kv: kv[1])
+        return [(item, count, self.errors[item]) for item, count in items]
@@ -0,0 +1,75 @@
+"""Incremental parser for a streamed JSON object."""
+
+import json
+from typing import Any, List, Tuple
+
+
+class JSONObjectStream:
+    """Emit the top-level members of a JSON object as soon as each one is complete.
+
+    Text is fed in arbitrary chunks (e.g. LLM deltas). Anything before the
+    first ``{`` (such as a code fence) is ignored. A member is complete at
+    the next top-level ``,`` or at the closing ``}``; it is then parsed on
+    its own, so a member is never emitted twice or half-written. A member
+    that does not parse sets ``failed`` and ends the stream: nothing after
+    it is emitted.
+    """
+
+    def __init__(self):
+        self.started = False
+        self.finished = False
+        self.failed = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._member: List[str] = []
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        """Consume a chunk; return the ``(key, value)`` members it completed."""
+        members = []
+        for char in text:
+            if self.finished:
+                break
+            if not self.started:
+                if char == "{":
+                    self.started = True
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                self._member.append(char)
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self.finished = True
+                    members.extend(self._flush())
+                    continue
+            elif char == "," and self._depth == 1:
+                members.extend(self._flush())
+                continue
+            self._member.append(char)
+        return members
+
+    def _flush(self) -> List[Tuple[str, Any]]:
+        """Parse the buffered member (an empty buffer yields nothing)."""
+        text = "".join(self._member).strip()
+        self._member = []
+        if not text:
+            return []
+        try:
+            return list(json.loads("{" + text + "}").items())
+        except json.JSONDecodeError:
+            self.failed = self.finished = True
+            return []
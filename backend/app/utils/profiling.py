@@ -0,0 +1,80 @@
+"""Per-request query profiling (phase timings and DuckDB operator trees)."""
+
+import json
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional
+
+# extra_info keys kept per operator (others, e.g. full file lists, are dropped)
+OPERATOR_INFO_KEYS = ("Function", "Projections", "Filters", "Groups", "Aggregates", "Order By", "Join Type",
+                      "Conditions", "Total Files Read", "Estimated Cardinality")
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 3)
+
+
+def flatten_operators(node: Dict, depth: int = 0) -> List[Dict]:
+    """Flatten DuckDB's JSON operator tree into a pre-order list with depths (as in EXPLAIN ANALYZE)."""
+    operators = []
+    for child in node.get("children", []):
+        extra = child.get("extra_info") or {}
+        operators.append({
+            "depth": depth,
+            "operator": child.get("operator_name") or child.get("operator_type"),
+            "ms": _ms(child.get("operator_timing", 0)),
+            "rows": child.get("operator_cardinality", 0),
+            "rows_scanned": child.get("operator_rows_scanned", 0),
+            "info": {key: extra[key] for key in OPERATOR_INFO_KEYS if key in extra},
+        })
+        operators.extend(flatten_operators(child, depth + 1))
+    return operators
+
+
+class QueryProfiler:
+    """Collects wall-clock phases and DuckDB query profiles for one request.
+
+    Phases with the same name add up. Each DuckDB query adds its latency,
+    rows scanned and operator breakdown; operator timings are DuckDB's own
+    and exclude converting the result to Python/pandas.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.queries: List[Dict] = []
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time the ``with`` block under ``name``."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - started
+
+    def add_query(self, name: str, profiling_information: str):
+        """Record one query from ``conn.get_profiling_information()`` (JSON format)."""
+        try:
+            profile = json.loads(profiling_information)
+        except ValueError:
+            return
+        self.queries.append({
+            "query": name,
+            "latency_ms": _ms(profile.get("latency", 0)),
+            "cpu_ms": _ms(profile.get("cpu_time", 0)),
+            "rows_scanned": profile.get("cumulative_rows_scanned", 0),
+            "operators": flatten_operators(profile),
+        })
+
+    def to_dict(self) -> Dict:
+        return {
+            "total_ms": _ms(time.perf_counter() - self.started),
+            "phases_ms": {name: _ms(seconds) for name, seconds in self.phases.items()},
+            "queries": self.queries,
+        }
+
+
+def profile_phase(profiler: Optional[QueryProfiler], name: str):
+    """``profiler.phase(name)``, or a no-op when not profiling."""
+    return profiler.phase(name) if profiler else nullcontext()
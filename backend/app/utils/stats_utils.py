@@ -0,0 +1,85 @@
+"""Statistics helpers for experiment analysis (NumPy only, no SciPy).
+
+All functions are elementwise over arrays, so every variant x stage
+comparison of an experiment is computed in one call.
+"""
+
+import math
+from statistics import NormalDist
+from typing import Dict
+import numpy as np
+
+# Chebyshev fit of erfc (Numerical Recipes ``erfcc``), highest power first; relative error < 1.2e-7
+_ERFC_COEFFICIENTS = [
+    0.17087277, -0.82215223, 1.48851587, -1.13520398, 0.27886807,
+    -0.18628806, 0.09678418, 0.37409196, 1.00002368, -1.26551223,
+]
+
+
+def _erfc(x) -> np.ndarray:
+    """Complementary error function, elementwise (NaN stays NaN)."""
+    x = np.asarray(x, dtype=float)
+    z = np.abs(x)
+    t = 1.0 / (1.0 + 0.5 * z)
+    result = t * np.exp(np.polyval(_ERFC_COEFFICIENTS, t) - z * z)
+    return np.where(x >= 0, result, 2.0 - result)
+
+
+def _as_arrays(*values):
+    """Convert counts to float arrays of a common shape."""
+    return np.broadcast_arrays(*(np.asarray(v, dtype=float) for v in values))
+
+
+def two_proportion_ztest(x_a, n_a, x_b, n_b, confidence: float = 0.95) -> Dict[str, np.ndarray]:
+    """Two-sided two-proportion z-test of B against A.
+
+    The test statistic uses the pooled standard error; the confidence
+    interval for ``rate_b - rate_a`` uses the unpooled (Wald) one. Cells
+    without users or without variance come back as NaN.
+    """
+    x_a, n_a, x_b, n_b = _as_arrays(x_a, n_a, x_b, n_b)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rate_a = x_a / n_a
+        rate_b = x_b / n_b
+        diff = rate_b - rate_a
+        pooled = (x_a + x_b) / (n_a + n_b)
+        z = diff / np.sqrt(pooled * (1 - pooled) * (1 / n_a + 1 / n_b))
+        se = np.sqrt(rate_a * (1 - rate_a) / n_a + rate_b * (1 - rate_b) / n_b)
+        z = np.where(np.isfinite(z), z, np.nan)
+    z_crit = NormalDist().inv_cdf(0.5 + confidence / 2)
+    return {
+        "rate_a": rate_a,
+        "rate_b": rate_b,
+        "diff": diff,
+        "z": z,
+        # 2 * (1 - Phi(|z|)) without cancellation in the tail
+        "p_value": _erfc(np.abs(z) / math.sqrt(2.0)),
+        "ci_lower": diff - z_crit * se,
+        "ci_upper": diff + z_crit * se,
+    }
+
+
+def sequential_bounds(x_a, n_a, x_b, n_b, alpha: float = 0.05, mixture_variance: float = 1e-3) -> Dict[str, np.ndarray]:
+    """Always-valid p-values and confidence sequences for ``rate_b - rate_a``.
+
+    Uses the normal-mixture SPRT: with estimate variance ``v`` and mixing
+    variance ``tau2`` the likelihood ratio is
+    ``sqrt(v / (v + tau2)) * exp(tau2 * diff**2 / (2 * v * (v + tau2)))``.
+    Bounds stay valid however often results are checked; callers that
+    peek repeatedly should keep the running minimum p-value.
+    """
+    x_a, n_a, x_b, n_b = _as_arrays(x_a, n_a, x_b, n_b)
+    tau2 = mixture_variance
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        rate_a = x_a / n_a
+        rate_b = x_b / n_b
+        diff = rate_b - rate_a
+        v = rate_a * (1 - rate_a) / n_a + rate_b * (1 - rate_b) / n_b
+        v = np.where(v > 0, v, np.nan)
+        log_lr = 0.5 * np.log(v / (v + tau2)) + tau2 * diff ** 2 / (2 * v * (v + tau2))
+        half_width = np.sqrt(v * (v + tau2) / tau2 * (np.log((v + tau2) / v) + 2 * math.log(1 / alpha)))
+    return {
+        "p_value": np.minimum(1.0, np.exp(-log_lr)),
+        "ci_lower": diff - half_width,
+        "ci_upper": diff + half_width,
+    }
@@ -0,0 +1,32 @@
+"""Local token estimates for LLM prompts (no tokenizer dependency)."""
+
+import re
+from typing import Dict, List
+
+# Words, numbers and single punctuation marks; BPE tokenizers split them about the same way
+_PIECES = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+# Chat messages carry a few tokens of framing each (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of a text.
+
+    Letters-only words count one token per 4 characters (rounded up),
+    digit runs one per 3 digits, and each punctuation mark one token,
+    which tracks GPT tokenizers closely for tabular English text.
+    """
+    tokens = 0
+    for piece in _PIECES.findall(text):
+        if piece[0].isdigit():
+            tokens += (len(piece) + 2) // 3
+        elif piece[0].isalpha():
+            tokens += (len(piece) + 3) // 4
+        else:
+            tokens += 1
+    return tokens
+
+
+def estimate_message_tokens(messages: List[Dict]) -> int:
+    """Estimate the prompt tokens of a list of chat messages."""
+    return sum(estimate_tokens(m.get("content") or "") + MESSAGE_OVERHEAD_TOKENS for m in messages)
@@ -0,0 +1,301 @@
+"""Ingest and query benchmarks over synthetic projects.
+
+Usage (from backend/):
+    python -m benchmarks.run --scale 1m
+    python -m benchmarks.run --scale 10m --output results/10m.json --compare results/10m-main.json
+
+Results are written as JSON (commit, environment, dataset, ingest and
+per-query latency and peak RSS), so runs on different commits can be
+diffed or compared with ``--compare``.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+import duckdb
+import pyarrow as pa
+from app.core.config import settings
+from app.services.track_service import TrackService
+from app.storage.duckdb_query import DuckDBQuery
+from app.storage.parquet_handler import ParquetHandler
+from app.tools.datagen import DatagenConfig, EventGenerator, generate
+
+SCALES = {"1m": 1_000_000, "10m": 10_000_000, "100m": 100_000_000}
+PROJECT_ID = "bench"
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+DAYS = 30
+# Benchmark funnel: the generator's default funnel event types
+STAGES = [
+    {"name": event_type, "event_type": event_type, "order": i + 1}
+    for i, event_type in enumerate(DatagenConfig().funnel)
+]
+DEFAULT_DATA_DIR = Path(__file__).parent / ".data"
+DEFAULT_RESULTS_DIR = Path(__file__).parent / "results"
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _current_rss() -> Optional[int]:
+    """Resident set size in bytes (Linux /proc; None elsewhere)."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _max_rss() -> int:
+    """Peak RSS of the whole process so far, in bytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class PeakRSS:
+    """Peak RSS while the ``with`` block runs, sampled every ``interval`` seconds.
+
+    Falls back to the process-wide peak where /proc is not available.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, _current_rss() or 0)
+
+    def __enter__(self):
+        self.peak = _current_rss() or 0
+        if self.peak:
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self.peak = max(self.peak, _current_rss() or 0)
+        else:
+            self.peak = _max_rss()
+
+    @property
+    def peak_mb(self) -> float:
+        return round(self.peak / 2**20, 1)
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _summary(runs: List[float]) -> Dict:
+    return {
+        "runs_ms": [round(ms, 2) for ms in runs],
+        "min_ms": round(min(runs), 2),
+        "median_ms": round(statistics.median(runs), 2),
+        "max_ms": round(max(runs), 2),
+    }
+
+
+def _datagen_config(project_id: str, events: int, seed: int) -> DatagenConfig:
+    return DatagenConfig(project_id=project_id, events=events, start_date=START.date().isoformat(), days=DAYS, seed=seed)
+
+
+def prepare_dataset(events: int, seed: int, reuse: bool) -> Dict:
+    """Generate the query project (or reuse a matching one from a previous run)."""
+    project_dir = Path(settings.DATA_DIR) / "events" / f"project_{PROJECT_ID}"
+    manifest_path = project_dir / "manifest.json"
+    if reuse and manifest_path.exists():
+        manifest = json.loads(manifest_path.read_text())
+        if manifest["target_events"] == events and manifest["seed"] == seed:
+            return {**manifest, "reused": True}
+    shutil.rmtree(project_dir, ignore_errors=True)
+    with PeakRSS() as rss:
+        manifest = generate(_datagen_config(PROJECT_ID, events, seed), overwrite=True)
+    manifest.update(target_events=events, seed=seed, peak_rss_mb=rss.peak_mb)
+    manifest_path.write_text(json.dumps(manifest))
+    return {**manifest, "reused": False}
+
+
+def bench_ingest(events: int, batch_size: int, seed: int) -> Dict:
+    """Ingest throughput through TrackService (batches) and ParquetHandler (one bulk write)."""
+    chunks = EventGenerator(_datagen_config("bench-ingest", events, seed + 1)).chunks()
+    table = pa.concat_tables(list(chunks)).slice(0, events)
+    rows = table.select(
+        ["event_type", "user_id", "created_at", "user_intent", "content_category", "surface", "user_tenure"]
+    ).to_pylist()
+    tracked = []
+    for row in rows:
+        row["timestamp"] = row.pop("created_at").isoformat()
+        tracked.append(row)
+    stored = [
+        {**event, "id": f"ingest-{i}", "project_id": "bench-ingest-direct", "properties": {},
+         "created_at": event["timestamp"]}
+        for i, event in enumerate(tracked)
+    ]
+
+    results = {"events": events, "batch_size": batch_size}
+    for project_dir in ("project_bench-ingest", "project_bench-ingest-direct"):
+        shutil.rmtree(Path(settings.DATA_DIR) / "events" / project_dir, ignore_errors=True)
+
+    async def track_all():
+        service = TrackService()
+        for offset in range(0, events, batch_size):
+            await service.track_batch_events("bench-ingest", tracked[offset:offset + batch_size])
+
+    with PeakRSS() as rss:
+        started = time.perf_counter()
+        asyncio.run(track_all())
+        seconds = time.perf_counter() - started
+    results["track_service"] = {
+        "seconds": round(seconds, 3), "events_per_second": round(events / seconds), "peak_rss_mb": rss.peak_mb,
+    }
+
+    with PeakRSS() as rss:
+        started = time.perf_counter()
+        ParquetHandler()._write_events_sync("bench-ingest-direct", stored)
+        seconds = time.perf_counter() - started
+    results["parquet_handler"] = {
+        "seconds": round(seconds, 3), "events_per_second": round(events / seconds), "peak_rss_mb": rss.peak_mb,
+    }
+    return results
+
+
+def bench_queries(repeat: int) -> Dict:
+    """Latency and peak RSS of the event-type, funnel and segment-breakdown queries."""
+    start_date, end_date = START.date().isoformat(), (START + timedelta(days=DAYS - 1)).date().isoformat()
+    queries: Dict[str, Callable[[DuckDBQuery], object]] = {
+        "event_types": lambda q: q.get_available_event_types(PROJECT_ID),
+        "funnel": lambda q: q.calculate_funnel_metrics("bench", PROJECT_ID, STAGES, start_date, end_date),
+        "funnel_by_surface": lambda q: q.calculate_funnel_metrics(
+            "bench", PROJECT_ID, STAGES, start_date, end_date, segment_by="surface"
+        ),
+        "funnel_filtered": lambda q: q.calculate_funnel_metrics(
+            "bench", PROJECT_ID, STAGES, start_date, end_date, user_intent=["Planner"], surface=["Home"]
+        ),
+    }
+
+    results = {}
+    for name, run in queries.items():
+        # A fresh handler per run, as each API request creates its own
+        run(DuckDBQuery())  # warm-up (file metadata, page cache)
+        runs = []
+        with PeakRSS() as rss:
+            for _ in range(repeat):
+                query = DuckDBQuery()
+                started = time.perf_counter()
+                result = run(query)
+                runs.append((time.perf_counter() - started) * 1000)
+                query.close()
+        results[name] = {**_summary(runs), "peak_rss_mb": rss.peak_mb, "result": result}
+    return results
+
+
+def run_benchmark(
+    events: int,
+    data_dir: Path = DEFAULT_DATA_DIR,
+    ingest_events: int = 20_000,
+    ingest_batch_size: int = 1000,
+    repeat: int = 5,
+    seed: int = 0,
+    reuse: bool = True,
+) -> Dict:
+    """Run the full suite against ``data_dir`` and return the results document."""
+    settings.DATA_DIR = str(data_dir)
+    data_dir.mkdir(parents=True, exist_ok=True)
+    started = time.perf_counter()
+    results = {
+        "commit": _git_commit(),
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "duckdb": duckdb.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "config": {"events": events, "days": DAYS, "seed": seed, "repeat": repeat},
+        "dataset": prepare_dataset(events, seed, reuse),
+        "ingest": bench_ingest(min(ingest_events, events), ingest_batch_size, seed) if ingest_events else None,
+        "queries": bench_queries(repeat),
+    }
+    results["peak_rss_mb"] = round(_max_rss() / 2**20, 1)
+    results["seconds"] = round(time.perf_counter() - started, 3)
+    return results
+
+
+def compare(results: Dict, baseline: Dict) -> List[str]:
+    """Lines comparing median query latency and ingest throughput with a baseline run."""
+    lines = [f"vs {baseline.get('commit') or 'baseline'}:"]
+    for name, query in results["queries"].items():
+        before = baseline.get("queries", {}).get(name)
+        if before:
+            ratio = query["median_ms"] / before["median_ms"] if before["median_ms"] else float("inf")
+            lines.append(f"  {name:<22} {before['median_ms']:>10.1f}ms -> {query['median_ms']:>10.1f}ms  x{ratio:.2f}")
+    for path in ("track_service", "parquet_handler"):
+        before = (baseline.get("ingest") or {}).get(path)
+        after = (results.get("ingest") or {}).get(path)
+        if before and after:
+            ratio = after["events_per_second"] / before["events_per_second"]
+            lines.append(
+                f"  {'ingest/' + path:<22} {before['events_per_second']:>10}/s -> {after['events_per_second']:>10}/s  x{ratio:.2f}"
+            )
+    return lines
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark ingest and funnel queries on a synthetic project.")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="1m", help="Dataset size")
+    parser.add_argument("--events", type=int, help="Exact number of events (overrides --scale)")
+    parser.add_argument("--data-dir", type=Path, default=DEFAULT_DATA_DIR, help="Where the synthetic project is kept")
+    parser.add_argument("--ingest-events", type=int, default=20_000, help="Events pushed through TrackService (0 = skip)")
+    parser.add_argument("--ingest-batch-size", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per query")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-reuse", action="store_true", help="Regenerate the dataset even if it matches")
+    parser.add_argument("--output", type=Path, help="Result JSON path (default: benchmarks/results/<scale>-<commit>.json)")
+    parser.add_argument("--compare", type=Path, help="Baseline result JSON to compare against")
+    args = parser.parse_args(argv)
+
+    events = args.events or SCALES[args.scale]
+    results = run_benchmark(
+        events, args.data_dir, args.ingest_events, args.ingest_batch_size, args.repeat, args.seed,
+        reuse=not args.no_reuse,
+    )
+    output = args.output or DEFAULT_RESULTS_DIR / f"{args.scale if not args.events else events}-{results['commit'] or 'local'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2, default=str))
+
+    dataset = results["dataset"]
+    print(f"dataset: {dataset['events']:,} events, {dataset['files']} files, {dataset['bytes'] / 2**20:.1f} MiB"
+          + (" (reused)" if dataset["reused"] else f", generated in {dataset['seconds']}s"))
+    if results["ingest"]:
+        for path in ("track_service", "parquet_handler"):
+            print(f"ingest/{path}: {results['ingest'][path]['events_per_second']:,} events/s")
+    for name, query in results["queries"].items():
+        print(f"{name}: median {query['median_ms']}ms, peak RSS {query['peak_rss_mb']} MiB")
+    if args.compare:
+        print("\n".join(compare(results, json.loads(args.compare.read_text()))))
+    print(f"results: {output}")
+
+
+if __name__ == "__main__":
+    main()
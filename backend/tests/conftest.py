@@ -1,8 +1,21 @@
 """Pytest configuration and fixtures."""
 
+import random
+from datetime import datetime, timedelta
 import pytest
 from httpx import AsyncClient
 from app.main import app
+from app.core.config import settings
+
+SAMPLE_PROJECT_ID = "test-project"
+SAMPLE_START_DATE = datetime(2024, 1, 1)
+SAMPLE_DAYS = 14
+SAMPLE_STAGES = [
+    {"order": 1, "name": "View", "event_type": "pin_view"},
+    {"order": 2, "name": "Save", "event_type": "save"},
+    {"order": 3, "name": "Click", "event_type": "click"},
+    {"order": 4, "name": "Purchase", "event_type": "purchase"},
+]
 
 
 @pytest.fixture
@@ -10,3 +23,41 @@ async def client():
     """Async HTTP client for testing."""
     async with AsyncClient(app=app, base_url="http://test") as ac:
         yield ac
+
+
+@pytest.fixture
+def event_data_dir(tmp_path, monkeypatch):
+    """Isolated DATA_DIR populated with two weeks of synthetic funnel events."""
+    from app.storage.parquet_handler import ParquetHandler
+
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path))
+    rng = random.Random(42)
+    events = []
+    for i in range(400):
+        user_id = f"user_{i}"
+        segments = {
+            "user_intent": rng.choice(["Browser", "Planner", "Actor", "Curator"]),
+            "surface": rng.choice(["Home", "Search", "Boards"]),
+            "user_tenure": rng.choice(["New", "Retained"]),
+            "content_category": rng.choice(["recipes", "travel"]),
+            "experiment_id": "exp_1",
+            "variant": "control" if i % 2 == 0 else "treatment",
+        }
+        session_id = f"sess_{i}"
+        timestamp = SAMPLE_START_DATE + timedelta(days=rng.randrange(SAMPLE_DAYS), minutes=rng.randrange(600))
+        for stage in SAMPLE_STAGES:
+            events.append({
+                "id": f"{user_id}_{stage['event_type']}",
+                "project_id": SAMPLE_PROJECT_ID,
+                "event_type": stage["event_type"],
+                "user_id": user_id,
+                "session_id": session_id,
+                "properties": {},
+                "created_at": timestamp.isoformat(),
+                **segments,
+            })
+            if rng.random() > 0.6 + 0.1 * (i % 2):
+                break
+            timestamp += timedelta(minutes=rng.randrange(1, 180))
+    ParquetHandler()._write_events_sync(SAMPLE_PROJECT_ID, events)
+    return tmp_path
@@ -0,0 +1,49 @@
+"""API-key cache tests."""
+
+from app.core.api_key_cache import APIKeyCache, api_key_cache, hash_api_key
+from app.core.config import settings
+from app.services.project_service import ProjectService
+from app.api.v1.track import verify_api_key
+
+
+def test_cache_hits_misses_and_ttl():
+    """Known and unknown keys are cached by digest until the TTL expires or they are invalidated."""
+    calls = []
+
+    def loader(api_key):
+        calls.append(api_key)
+        return {"key-a": "a"}.get(api_key)
+
+    cache = APIKeyCache(ttl=60, max_entries=2)
+    assert cache.resolve("key-a", loader) == "a"
+    assert cache.resolve("key-a", loader) == "a"
+    assert cache.resolve("bad", loader) is None
+    assert cache.resolve("bad", loader) is None
+    assert calls == ["key-a", "bad"]
+    assert "key-a" not in cache._entries and hash_api_key("key-a") in cache._entries
+
+    cache.invalidate("a")
+    assert cache._entries == {}
+    cache.resolve("key-a", loader)
+    cache.resolve("k2", loader)
+    cache.resolve("k3", loader)
+    assert len(cache._entries) == 2 and hash_api_key("key-a") not in cache._entries
+
+    expired = APIKeyCache(ttl=0)
+    expired.resolve("key-a", loader)
+    expired.resolve("key-a", loader)
+    assert calls.count("key-a") == 4
+
+
+async def test_tracking_key_resolution_follows_project_changes(tmp_path, monkeypatch):
+    """A key first seen as unknown resolves once its project is created, and stops after deletion."""
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path))
+    api_key_cache.invalidate()
+    service = ProjectService()
+
+    assert await verify_api_key("not-yet") == "poc-project-001"
+    project = await service.create_project(org_id="poc-org", name="Shop", project_id="shop")
+    assert await verify_api_key(project["api_key"]) == "shop"
+
+    await service.delete_project("shop", "poc-org")
+    assert await verify_api_key(project["api_key"]) == "poc-project-001"
@@ -0,0 +1,31 @@
+"""Batch funnel analytics tests."""
+
+from app.storage.duckdb_query import DuckDBQuery
+from tests.conftest import SAMPLE_PROJECT_ID, SAMPLE_STAGES
+
+START_DATE = "2024-01-01"
+END_DATE = "2024-01-14"
+
+
+def test_batch_matches_individual_queries(event_data_dir):
+    """Every funnel in a shared scan matches its own single-funnel query."""
+    items = [
+        {"stages": SAMPLE_STAGES},
+        {"stages": SAMPLE_STAGES[:2], "surface": ["Home", "Search"]},
+        {"stages": SAMPLE_STAGES[1:], "user_intent": ["Planner"], "segment_by": "user_tenure"},
+    ]
+    query = DuckDBQuery()
+    batch = query.calculate_batch_funnel_metrics(SAMPLE_PROJECT_ID, items, START_DATE, END_DATE)
+
+    for item, result in zip(items, batch):
+        expected = query.calculate_funnel_metrics(
+            "",
+            SAMPLE_PROJECT_ID,
+            item["stages"],
+            START_DATE,
+            END_DATE,
+            user_intent=item.get("user_intent"),
+            surface=item.get("surface"),
+            segment_by=item.get("segment_by"),
+        )
+        assert result == expected
@@ -0,0 +1,27 @@
+"""Benchmark suite smoke test."""
+
+import json
+from app.core.config import settings
+from benchmarks.run import STAGES, compare, main, run_benchmark
+
+
+def test_small_run_produces_comparable_results(tmp_path, monkeypatch):
+    """A tiny run generates the project in the ParquetHandler layout and reports every section."""
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path))
+    results = run_benchmark(5000, tmp_path, ingest_events=200, ingest_batch_size=100, repeat=1)
+
+    assert results["dataset"]["files"] == 30 and not results["dataset"]["reused"]
+    assert (tmp_path / "events" / "project_bench" / "2024" / "01" / "events_2024-01-15.parquet").exists()
+    assert results["ingest"]["track_service"]["events_per_second"] > 0
+    funnel = results["queries"]["funnel"]["result"]
+    counts = [funnel[stage["name"]] for stage in STAGES]
+    assert counts[0] > 0 and counts == sorted(counts, reverse=True)
+    assert set(results["queries"]["funnel_by_surface"]["result"]["segments"]) <= {"Home", "Search", "Boards", "Profile"}
+    assert all(q["peak_rss_mb"] > 0 for q in results["queries"].values())
+    assert compare(results, results)[1].strip().startswith("event_types")
+
+    output = tmp_path / "results.json"
+    main(["--events", "5000", "--data-dir", str(tmp_path), "--ingest-events", "0", "--repeat", "1",
+          "--output", str(output)])
+    rerun = json.loads(output.read_text())
+    assert rerun["dataset"]["reused"] and rerun["queries"]["funnel"]["result"] == funnel
@@ -0,0 +1,54 @@
+"""Synthetic data generator tests."""
+
+import duckdb
+import pytest
+from app.core.config import settings
+from app.storage.duckdb_query import DuckDBQuery
+from app.tools.datagen import DatagenConfig, generate, main
+
+
+def test_generated_project_is_queryable_and_follows_config(tmp_path, monkeypatch):
+    """Files land in the ParquetHandler layout, journeys are in funnel order and experiments are split."""
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path))
+    config = DatagenConfig(project_id="synthetic", users=3000, days=7, chunk_users=1000)
+    stats = generate(config)
+
+    files = sorted((tmp_path / "events" / "project_synthetic" / "2024" / "01").glob("*.parquet"))
+    assert [f.name for f in files] == [f"events_2024-01-0{day}.parquet" for day in range(1, 8)]
+    pattern = str(tmp_path / "events" / "project_synthetic" / "*" / "*" / "*.parquet")
+    conn = duckdb.connect()
+    assert conn.execute(f"SELECT COUNT(*), COUNT(DISTINCT user_id) FROM '{pattern}'").fetchone() == (stats["events"], 3000)
+
+    # Every journey (session) is a prefix of the funnel, in time order
+    journeys = conn.execute(f"""
+        SELECT DISTINCT string_agg(event_type, ',' ORDER BY created_at) FROM '{pattern}'
+        WHERE session_id IS NOT NULL GROUP BY session_id
+    """).fetchall()
+    prefixes = {",".join(config.funnel[:n]) for n in range(1, len(config.funnel) + 1)}
+    assert {row[0] for row in journeys} <= prefixes
+
+    enrolled = dict(conn.execute(f"""
+        SELECT COALESCE(variant, 'none'), COUNT(DISTINCT user_id) FROM '{pattern}' GROUP BY ALL
+    """).fetchall())
+    assert enrolled["none"] == pytest.approx(1500, rel=0.15)
+    assert enrolled["control"] == pytest.approx(750, rel=0.15)
+
+    stages = [{"name": t, "event_type": t, "order": i + 1} for i, t in enumerate(config.funnel)]
+    counts = DuckDBQuery().calculate_funnel_metrics("f", "synthetic", stages, "2024-01-01", "2024-01-07")
+    assert list(counts.values()) == sorted(counts.values(), reverse=True) and counts["purchase"] > 0
+
+    with pytest.raises(FileExistsError):
+        generate(config)
+
+
+def test_cli_targets_event_count(tmp_path, monkeypatch):
+    """--events generates users until about that many events, replacing files with --overwrite."""
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path))
+    args = ["--data-dir", str(tmp_path), "--project-id", "cli", "--events", "20000", "--days", "3"]
+    main(args)
+    main(args + ["--overwrite", "--seed", "1"])
+    pattern = str(tmp_path / "events" / "project_cli" / "*" / "*" / "*.parquet")
+    total = duckdb.connect().execute(f"SELECT COUNT(*) FROM '{pattern}'").fetchone()[0]
+    assert total == pytest.approx(20000, rel=0.1)
+    with pytest.raises(ValueError):
+        DatagenConfig(transitions=[0.5])
@@ -0,0 +1,53 @@
+"""Experiment analysis tests."""
+
+import math
+import numpy as np
+from app.storage.duckdb_query import DuckDBQuery
+from app.utils.stats_utils import _erfc, two_proportion_ztest, sequential_bounds
+from tests.conftest import SAMPLE_PROJECT_ID, SAMPLE_STAGES
+
+START_DATE = "2024-01-01"
+END_DATE = "2024-01-14"
+
+
+def test_two_proportion_ztest_known_values():
+    """45/100 vs 60/100 matches the textbook z-test; empty cells are NaN."""
+    result = two_proportion_ztest([45, 0], [100, 0], [60, 0], [100, 0])
+    assert np.isclose(result["z"][0], 2.1240, atol=1e-4)
+    assert np.isclose(result["p_value"][0], 0.0337, atol=1e-4)
+    assert result["ci_lower"][0] < 0.15 < result["ci_upper"][0]
+    assert np.isnan(result["p_value"][1])
+
+
+def test_erfc_matches_math_erfc():
+    """The vectorized erfc keeps its relative accuracy far into the tail (tiny p-values)."""
+    xs = np.linspace(-5, 8, 1301)
+    expected = np.array([math.erfc(x) for x in xs])
+    assert np.allclose(_erfc(xs), expected, rtol=2e-7, atol=0)
+
+
+def test_sequential_bounds_are_wider():
+    """The confidence sequence contains the fixed-horizon interval."""
+    fixed = two_proportion_ztest([450], [1000], [500], [1000])
+    sequential = sequential_bounds([450], [1000], [500], [1000])
+    assert sequential["ci_lower"][0] < fixed["ci_lower"][0]
+    assert sequential["ci_upper"][0] > fixed["ci_upper"][0]
+    assert sequential["p_value"][0] > fixed["p_value"][0]
+
+
+def test_variants_add_up_to_funnel(event_data_dir):
+    """Per-variant stage counts sum to the funnel over all users."""
+    query = DuckDBQuery()
+    expected = query.calculate_funnel_metrics("", SAMPLE_PROJECT_ID, SAMPLE_STAGES, START_DATE, END_DATE)
+    result = query.calculate_experiment_metrics(SAMPLE_PROJECT_ID, SAMPLE_STAGES, "exp_1", START_DATE, END_DATE)
+    assert set(result["variants"]) == {"control", "treatment"}
+    assert result["crossover_users"] == 0
+    for stage in SAMPLE_STAGES:
+        assert sum(v[stage["name"]] for v in result["variants"].values()) == expected[stage["name"]]
+    assert query.calculate_experiment_metrics(
+        SAMPLE_PROJECT_ID, SAMPLE_STAGES, "missing", START_DATE, END_DATE
+    )["variants"] == {}
+    # The experiment ID is a bound parameter, not SQL
+    assert query.calculate_experiment_metrics(
+        SAMPLE_PROJECT_ID, SAMPLE_STAGES, "x' OR '1'='1", START_DATE, END_DATE
+    )["variants"] == {}
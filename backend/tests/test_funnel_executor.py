@@ -0,0 +1,82 @@
+"""Funnel executor tests."""
+
+import asyncio
+import time
+import pandas as pd
+from app.services.analytics_service import AnalyticsService
+from app.storage.funnel_executor import FunnelExecutor, count_stage_users, merge_stage_counts
+
+STAGES = [
+    {"order": 1, "name": "View", "event_type": "pin_view"},
+    {"order": 2, "name": "Save", "event_type": "save"},
+    {"order": 3, "name": "Purchase", "event_type": "purchase"},
+]
+
+
+def _events() -> pd.DataFrame:
+    rows = []
+    for i in range(300):
+        user_id = f"user_{i}"
+        rows.append((user_id, "pin_view"))
+        if i % 2 == 0:
+            rows.append((user_id, "save"))
+        if i % 6 == 0:
+            rows.append((user_id, "purchase"))
+        if i % 2 == 1 and i % 7 == 0:
+            # Purchase without save never counts
+            rows.append((user_id, "purchase"))
+    return pd.DataFrame(rows, columns=["user_id", "event_type"])
+
+
+def test_count_stage_users():
+    """Users must have every earlier stage event to be counted at a stage."""
+    counts = count_stage_users(_events(), STAGES)
+    assert counts == {"View": 300, "Save": 150, "Purchase": 50}
+
+
+def test_merge_stage_counts():
+    """Shard counts are summed per stage."""
+    merged = merge_stage_counts([{"View": 2, "Save": 1}, {"View": 3}], STAGES)
+    assert merged == {"View": 5, "Save": 1, "Purchase": 0}
+
+
+def test_process_pool_matches_in_process():
+    """Scatter/gather over worker processes returns the same counts."""
+    df = _events()
+    executor = FunnelExecutor(max_workers=2, min_rows=0)
+    try:
+        results = executor.evaluate({None: df, "even": df[df["user_id"].str[-1].isin(list("02468"))]}, STAGES)
+    finally:
+        executor.shutdown()
+    assert results[None] == count_stage_users(df, STAGES)
+    assert results["even"]["View"] == 150
+
+
+async def test_local_funnel_does_not_block_the_event_loop(monkeypatch):
+    """The scan and shard evaluation run in a thread: other coroutines keep running meanwhile."""
+    service = AnalyticsService()
+    service.coordinator = None
+
+    def slow_metrics(**kwargs):
+        time.sleep(0.2)
+        return {"View": 3, "Save": 2, "Purchase": 1}
+
+    async def no_files(*args):
+        return None
+
+    monkeypatch.setattr(service.duckdb_query, "calculate_funnel_metrics", slow_metrics)
+    monkeypatch.setattr(service, "_plan_files", no_files)
+    ticks = []
+
+    async def ticker():
+        for _ in range(5):
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.02)
+
+    funnel = {"id": "f", "name": "F", "project_id": "p", "stages": STAGES}
+    started = time.perf_counter()
+    response, _ = await asyncio.gather(
+        service._calculate_funnel_counts(funnel, "2024-01-01", "2024-01-02", {}, None, "user", None), ticker()
+    )
+    assert response["completed_users"] == 1
+    assert len(ticks) == 5 and ticks[-1] - started < 0.2
@@ -0,0 +1,70 @@
+"""GenAI cache tests."""
+
+import asyncio
+import time
+from app.storage.genai_cache import GenAICache
+
+
+def test_ttl_and_lru_eviction(tmp_path):
+    """Entries expire after the TTL and the least recently used go first."""
+    cache = GenAICache(path=str(tmp_path / "cache.sqlite"), ttl=60, max_entries=2)
+    cache.set("a", {"v": 1})
+    time.sleep(0.01)
+    cache.set("b", {"v": 2})
+    time.sleep(0.01)
+    assert cache.get("a") == {"v": 1}  # "a" is now more recent than "b"
+    cache.set("c", {"v": 3})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"v": 1}
+    assert cache.get("c") == {"v": 3}
+
+    expiring = GenAICache(path=str(tmp_path / "cache.sqlite"), ttl=0.05)
+    time.sleep(0.06)
+    assert expiring.get("a") is None
+
+
+async def test_single_flight_in_process(tmp_path):
+    """Concurrent identical requests share one computation; later ones hit the cache."""
+    cache = GenAICache(path=str(tmp_path / "cache.sqlite"))
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"report": "ok"}
+
+    results = await asyncio.gather(*[cache.get_or_compute("k", compute) for _ in range(5)])
+    assert len(calls) == 1
+    assert all(value == {"report": "ok"} for value, _ in results)
+    assert await cache.get_or_compute("k", compute) == ({"report": "ok"}, True)
+
+
+async def test_single_flight_across_processes(tmp_path):
+    """Separate cache instances (as in separate workers) coordinate through the lease."""
+    path = str(tmp_path / "cache.sqlite")
+    worker_a, worker_b = GenAICache(path=path), GenAICache(path=path)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return {"report": "ok"}
+
+    (value_a, hit_a), (value_b, hit_b) = await asyncio.gather(
+        worker_a.get_or_compute("k", compute), worker_b.get_or_compute("k", compute)
+    )
+    assert len(calls) == 1
+    assert value_a == value_b == {"report": "ok"}
+    assert sorted([hit_a, hit_b]) == [False, True]
+
+
+async def test_errors_are_not_cached(tmp_path):
+    """Values rejected by ``cacheable`` are returned but not stored."""
+    cache = GenAICache(path=str(tmp_path / "cache.sqlite"))
+
+    async def compute():
+        return {"error": "OpenAI API error"}
+
+    value, hit = await cache.get_or_compute("k", compute, cacheable=lambda v: "error" not in v)
+    assert value == {"error": "OpenAI API error"} and not hit
+    assert cache.get("k") is None
@@ -0,0 +1,147 @@
+"""LLM client resilience tests (fake API, no network)."""
+
+import asyncio
+from types import SimpleNamespace
+import pytest
+from app.services.llm_client import LLMClient, CircuitBreaker, CircuitOpenError
+
+
+class FakeCompletions:
+    """Stands in for ``client.chat.completions`` with scripted outcomes."""
+
+    def __init__(self, outcomes=None, delay=0.0):
+        self.outcomes = list(outcomes or [])
+        self.delay = delay
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            outcome = self.outcomes.pop(0) if self.outcomes else "ok"
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+        finally:
+            self.in_flight -= 1
+
+
+class FakeClient:
+    def __init__(self, completions):
+        self.chat = type("Chat", (), {"completions": completions})()
+
+
+def make_client(completions, **kwargs):
+    kwargs.setdefault("retry_base_delay", 0.0)
+    return LLMClient(api_key="test", client=FakeClient(completions), **kwargs)
+
+
+async def test_retries_transient_failures():
+    """Timeouts are retried until a call succeeds."""
+    completions = FakeCompletions([asyncio.TimeoutError(), asyncio.TimeoutError(), "done"])
+    client = make_client(completions, max_retries=3)
+    assert await client.chat(messages=[]) == "done"
+    assert completions.calls == 3
+
+
+async def test_per_call_timeout_and_retry_limit():
+    """A hung call is cut off by the timeout and gives up after max_retries."""
+    completions = FakeCompletions(delay=1.0)
+    client = make_client(completions, timeout=0.05, max_retries=1)
+    with pytest.raises(asyncio.TimeoutError):
+        await client.chat(messages=[])
+    assert completions.calls == 2
+
+
+async def test_concurrency_is_bounded():
+    """No more than max_concurrency calls are in flight at once."""
+    completions = FakeCompletions(delay=0.02)
+    client = make_client(completions, max_concurrency=2)
+    await asyncio.gather(*[client.chat(messages=[]) for _ in range(8)])
+    assert completions.calls == 8
+    assert completions.max_in_flight == 2
+
+
+async def test_circuit_breaker_fails_fast():
+    """Once open, calls are rejected without reaching the API until the reset timeout."""
+    completions = FakeCompletions([asyncio.TimeoutError()] * 2)
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    client = make_client(completions, max_retries=0, breaker=breaker)
+    for _ in range(2):
+        with pytest.raises(asyncio.TimeoutError):
+            await client.chat(messages=[])
+    with pytest.raises(CircuitOpenError):
+        await client.chat(messages=[])
+    assert completions.calls == 2
+
+    await asyncio.sleep(0.06)
+    assert await client.chat(messages=[]) == "ok"
+    assert breaker.state == "closed"
+
+
+async def test_stream_chat_yields_deltas_and_frees_slot():
+    """Streamed deltas are yielded in order and the concurrency slot is released afterwards."""
+
+    async def chunks():
+        for text in ["Hel", "lo", None]:
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+    completions = FakeCompletions([asyncio.TimeoutError(), chunks()])
+    client = make_client(completions, max_concurrency=1)
+    assert [delta async for delta in client.stream_chat(messages=[])] == ["Hel", "lo"]
+    assert completions.calls == 2
+    assert await client.chat(messages=[]) == "ok"
+
+
+async def test_cancelled_half_open_stream_releases_trial():
+    """A half-open trial stream that is cancelled or closed early lets the next call be the trial."""
+    opened = asyncio.Event()
+
+    async def hanging_chunks():
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content="partial"))])
+        opened.set()
+        await asyncio.sleep(10)
+
+    async def two_chunks():
+        for text in ["a", "b"]:
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+    completions = FakeCompletions([asyncio.TimeoutError(), hanging_chunks(), two_chunks()])
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    client = make_client(completions, max_concurrency=1, max_retries=0, timeout=30, breaker=breaker)
+    with pytest.raises(asyncio.TimeoutError):
+        await client.chat(messages=[])
+    await asyncio.sleep(0.06)
+
+    # Cancelled mid-stream
+    async def consume():
+        return [delta async for delta in client.stream_chat(messages=[])]
+
+    task = asyncio.create_task(consume())
+    await opened.wait()
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert breaker.state == "half_open"
+
+    # Closed early by the consumer
+    stream = client.stream_chat(messages=[])
+    assert await stream.__anext__() == "a"
+    await stream.aclose()
+    assert breaker.state == "half_open"
+
+    # Cancelled while waiting for a concurrency slot
+    await client._semaphore.acquire()
+    task = asyncio.create_task(client.chat(messages=[]))
+    await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    client._semaphore.release()
+
+    assert await client.chat(messages=[]) == "ok"
+    assert breaker.state == "closed"
@@ -0,0 +1,65 @@
+"""Load generator tests."""
+
+import duckdb
+import httpx
+from app.core.config import settings
+from app.main import app
+from app.services.track_service import get_track_service
+from app.tools.loadgen import event_payloads, run_load
+
+
+async def test_in_process_batches_are_written_and_summarized(tmp_path, monkeypatch):
+    """Uniform arrivals against the ASGI app: every batch is stored and latency percentiles are reported."""
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path))
+    payloads = event_payloads(count=500)
+    assert payloads[0]["event_type"] and "timestamp" not in payloads[0]
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        result = await run_load(client, rate=100, duration=0.3, batch_size=5, arrival="uniform", payloads=payloads)
+
+    assert result["endpoint"] == "/api/v1/track/batch"
+    assert result["requests"] == 29 and result["error_rate"] == 0
+    assert result["events"] == result["persisted_events"] == 145
+    latency = result["latency_ms"]
+    assert latency["p50"] <= latency["p95"] <= latency["p99"] <= latency["p999"] <= latency["max"]
+    pattern = str(tmp_path / "events" / "project_poc-project-001" / "*" / "*" / "*.parquet")
+    assert duckdb.connect().execute(f"SELECT COUNT(*) FROM '{pattern}'").fetchone()[0] == 145
+
+
+async def test_single_events_count_only_once_persisted(tmp_path, monkeypatch):
+    """/track only buffers: without a flush nothing is persisted and events/s is 0; with one every event counts."""
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path))
+    payloads = event_payloads(count=50)
+    service = get_track_service()
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        await service.flush_all()
+        unflushed = await run_load(client, rate=50, duration=0.2, arrival="uniform", payloads=payloads, settle=0)
+        flushed = await run_load(
+            client, rate=50, duration=0.2, arrival="uniform", payloads=payloads, flush=service.flush_all, settle=0,
+        )
+
+    assert unflushed["events"] == 9 and unflushed["persisted_events"] == 0 and unflushed["throughput_eps"] == 0
+    # The flush before the second run also writes the first run's buffered events
+    assert flushed["events"] == 9 and flushed["persisted_events"] == 9 and flushed["throughput_eps"] > 0
+    pattern = str(tmp_path / "events" / "project_poc-project-001" / "*" / "*" / "*.parquet")
+    assert duckdb.connect().execute(f"SELECT COUNT(*) FROM '{pattern}'").fetchone()[0] == 18
+
+
+async def test_failures_are_counted_by_status_and_exception():
+    """Non-2xx responses and transport errors count as errors and are excluded from latency."""
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        if len(calls) % 2:
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(503)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://test") as client:
+        result = await run_load(client, rate=200, duration=0.1, arrival="uniform", payloads=[{"event_type": "x", "user_id": "u"}])
+
+    assert result["endpoint"] == "/api/v1/track"
+    assert result["error_rate"] == 1.0 and result["latency_ms"] == {}
+    assert result["persisted_events"] is None and result["throughput_eps"] is None
+    assert result["errors"]["exceptions"]["ConnectError"] + result["errors"]["status"]["503"] == result["requests"]
@@ -0,0 +1,72 @@
+"""Local rule-based insight tests."""
+
+import asyncio
+import json
+from types import SimpleNamespace
+from app.core.config import settings
+from app.services.genai_service import GenAIService
+
+
+def stage(name, users, conversion, drop_off):
+    return {"stage_name": name, "users": users, "conversion_rate": conversion, "drop_off_rate": drop_off}
+
+
+ANALYTICS = {
+    "funnel_name": "Pin to Purchase",
+    "date_range": {"start": "2024-01-01", "end": "2024-01-14"},
+    "segment_by": "surface",
+    "segments": {
+        "Home": {"total_users": 1000, "completed_users": 300, "overall_conversion_rate": 30.0},
+        "Search": {"total_users": 1000, "completed_users": 200, "overall_conversion_rate": 20.0},
+        "Boards": {"total_users": 40, "completed_users": 9, "overall_conversion_rate": 22.5},
+    },
+    "total": {
+        "stages": [stage("View", 2040, 100.0, 0.0), stage("Save", 1200, 58.82, 41.18), stage("Buy", 509, 24.95, 57.58)],
+        "total_users": 2040,
+        "completed_users": 509,
+        "overall_conversion_rate": 24.95,
+    },
+}
+
+
+class FakeLLM:
+    def __init__(self):
+        self.calls = 0
+
+    async def chat(self, messages, **kwargs):
+        self.calls += 1
+        content = json.dumps({"summary": "s", "insights": ["x"], "recommendations": [], "guardrails": []})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def test_local_insights_rank_drop_offs_and_flag_segments(tmp_path, monkeypatch):
+    """Drop-offs are ranked and only clear segment differences are flagged significant."""
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path))
+    result = GenAIService().generate_local_insights(ANALYTICS)
+
+    assert [d["stage_name"] for d in result["drop_offs"]] == ["Buy", "Save"]
+    assert result["drop_offs"][0]["users_lost"] == 691
+    assert [s["segment"] for s in result["segments"]] == ["Home", "Boards", "Search"]
+    flags = {s["segment"]: s["significant"] for s in result["segments"]}
+    assert flags == {"Home": True, "Boards": False, "Search": True}
+    assert {s["segment"] for s in result["segment_outliers"]} == {"Home", "Search"}
+    assert any(i.startswith("Buy has the highest drop-off: 57.6%") for i in result["insights"])
+    assert any(i.startswith("Home converts best at 30.00%") for i in result["insights"])
+
+
+async def test_local_fallback_and_background_narrative(tmp_path, monkeypatch):
+    """Without a key local insights replace the error; with one the narrative is prefetched into the cache."""
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path))
+    service = GenAIService()
+    service.client = None
+    local = await service.generate_recommendations("f", ANALYTICS, "2024-01-01", "2024-01-14", {})
+    assert "error" not in local and local["source"] == "local" and local["insights"]
+    assert service.prefetch_recommendations("f", ANALYTICS, "2024-01-01", "2024-01-14", {}) == "disabled"
+
+    service.client = FakeLLM()
+    assert service.prefetch_recommendations("f", ANALYTICS, "2024-01-01", "2024-01-14", {}) == "pending"
+    await asyncio.gather(*service._narrative_tasks)
+    result = await service.generate_recommendations("f", ANALYTICS, "2024-01-01", "2024-01-14", {})
+    assert result["cache_hit"] is True and result["summary"] == "s"
+    assert result["local_insights"]["drop_offs"][0]["stage_name"] == "Buy"
+    assert service.client.calls == 1
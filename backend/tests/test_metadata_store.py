@@ -0,0 +1,83 @@
+"""Metadata store tests (SQLite and JSON backends)."""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from app.core.config import settings
+from app.storage.metadata_handler import MetadataHandler
+
+
+def project(project_id, org_id="poc-org", api_key=None):
+    return {"id": project_id, "organization_id": org_id, "name": project_id, "api_key": api_key or f"key-{project_id}"}
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "json"])
+def test_indexed_lookups_and_write_through(tmp_path, monkeypatch, backend):
+    """Lookups use the indexes, returned records are copies, and saves are visible immediately."""
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "METADATA_BACKEND", backend)
+    handler = MetadataHandler()
+    handler.save_projects([project("a"), project("b", org_id="other")])
+
+    assert handler.get_project_by_api_key("key-b")["id"] == "b"
+    assert [p["id"] for p in handler.list_projects("poc-org")] == ["a"]
+    assert handler.get_project("missing") is None
+
+    # Editing a returned record (e.g. masking the key) does not touch the store
+    handler.get_project("a")["api_key"] = "masked"
+    projects = handler.load_projects()
+    projects[0]["api_key"] = "rotated"
+    assert handler.get_project("a")["api_key"] == "key-a"
+
+    handler.save_projects(projects)
+    projects[0]["name"] = "edited after save"
+    assert MetadataHandler().get_project_by_api_key("rotated")["name"] == "a"
+    assert handler.get_project_by_api_key("key-a") is None
+
+    assert handler.insert_project(project("c")) is True
+    assert handler.insert_project({**project("c"), "name": "dup"}) is False
+    assert handler.delete_project("b") is True and handler.delete_project("b") is False
+    assert [p["id"] for p in handler.load_projects()] == ["a", "c"]
+
+
+def test_json_backend_reloads_when_file_changes_on_disk(tmp_path, monkeypatch):
+    """Writes by another process (new inode or mtime) are picked up on the next lookup."""
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "METADATA_BACKEND", "json")
+    handler = MetadataHandler()
+    handler.save_funnels([{"id": "f1", "organization_id": "poc-org", "project_id": "p", "name": "Old"}])
+    assert handler.get_funnel("f1")["name"] == "Old"
+
+    path = tmp_path / "metadata" / "funnels.json"
+    temp = path.with_suffix(".other")
+    temp.write_text(json.dumps({"funnels": [
+        {"id": "f1", "organization_id": "poc-org", "project_id": "p", "name": "New"},
+        {"id": "f2", "organization_id": "poc-org", "project_id": "q", "name": "Second"},
+    ]}))
+    os.replace(temp, path)
+
+    assert handler.get_funnel("f1")["name"] == "New"
+    assert [f["id"] for f in handler.list_funnels("poc-org", project_id="q")] == ["f2"]
+
+
+def test_sqlite_migrates_json_and_keeps_concurrent_row_updates(tmp_path, monkeypatch):
+    """JSON files are imported once, and concurrent single-row writes do not overwrite each other."""
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path))
+    metadata_dir = tmp_path / "metadata"
+    metadata_dir.mkdir()
+    (metadata_dir / "projects.json").write_text(json.dumps({"projects": [project("legacy")]}))
+    monkeypatch.setattr(settings, "METADATA_BACKEND", "sqlite")
+
+    handler = MetadataHandler()
+    assert handler.get_project_by_api_key("key-legacy")["id"] == "legacy"
+    assert handler.store.migrate_from_json(metadata_dir) == {}
+
+    def create(i):
+        MetadataHandler().upsert_funnel({"id": f"f{i}", "organization_id": "poc-org", "project_id": "p", "name": str(i)})
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(create, range(40)))
+    # Rows written on the pool threads' connections are visible on this thread's reused one
+    assert handler.store._connect() is handler.store._connect()
+    assert len(handler.list_funnels("poc-org", project_id="p")) == 40
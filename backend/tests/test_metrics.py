@@ -0,0 +1,114 @@
+"""Metrics registry and /metrics endpoint tests."""
+
+import pytest
+from httpx import AsyncClient
+from app.core.config import settings
+from app.core.metrics import (
+    DUCKDB_FILES_OPENED,
+    DUCKDB_ROWS_SCANNED,
+    EVENT_BUFFER_DEPTH,
+    EVENTS_INGESTED,
+    PARQUET_BYTES_WRITTEN,
+    Registry,
+)
+from app.services.track_service import TrackService, get_track_service
+from app.storage.duckdb_query import DuckDBQuery
+from app.storage.parquet_handler import ParquetHandler
+from tests.conftest import SAMPLE_PROJECT_ID, SAMPLE_STAGES
+
+
+def test_registry_renders_prometheus_text():
+    """Counters, gauges and cumulative histogram buckets render in the exposition format."""
+    registry = Registry()
+    counter = registry.counter("demo_total", "Demo counter.", ["project"])
+    gauge = registry.gauge("demo_depth", "Demo gauge.")
+    histogram = registry.histogram("demo_seconds", "Demo histogram.", ["project"], buckets=(0.1, 1.0))
+    counter.inc(project='a"b')
+    counter.inc(2, project='a"b')
+    gauge.set(1.5)
+    histogram.observe(0.05, project="p")
+    histogram.observe(0.5, project="p")
+    histogram.observe(5, project="p")
+
+    text = registry.render()
+    assert '# TYPE demo_total counter\ndemo_total{project="a\\"b"} 3\n' in text
+    assert "demo_depth 1.5" in text
+    assert 'demo_seconds_bucket{project="p",le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{project="p",le="1"} 2' in text
+    assert 'demo_seconds_bucket{project="p",le="+Inf"} 3' in text
+    assert 'demo_seconds_count{project="p"} 3' in text
+    with pytest.raises(ValueError):
+        registry.counter("demo_total", "Duplicate.")
+
+
+async def test_tracking_and_queries_are_exported(client: AsyncClient, tmp_path, monkeypatch):
+    """Tracked events, bytes written and DuckDB scans show up on /metrics, labeled by project."""
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path))
+    before = EVENTS_INGESTED.value(project="poc-project-001")
+    bytes_before = PARQUET_BYTES_WRITTEN.value(project="poc-project-001")
+    events = [
+        {"event_type": "pin_view", "user_id": f"u{i}", "timestamp": "2024-01-02T10:00:00"} for i in range(5)
+    ]
+    response = await client.post("/api/v1/track/batch", json={"events": events})
+    assert response.status_code == 200
+
+    assert EVENTS_INGESTED.value(project="poc-project-001") == before + 5
+    assert EVENT_BUFFER_DEPTH.value(project="poc-project-001") == 0
+    assert PARQUET_BYTES_WRITTEN.value(project="poc-project-001") > bytes_before
+
+    rows_before = DUCKDB_ROWS_SCANNED.value(project=SAMPLE_PROJECT_ID, query="funnel_user")
+    files_before = DUCKDB_FILES_OPENED.value(project=SAMPLE_PROJECT_ID, query="funnel_user")
+    ParquetHandler()._write_events_sync(SAMPLE_PROJECT_ID, [
+        {"id": f"e{i}", "project_id": SAMPLE_PROJECT_ID, "event_type": "pin_view", "user_id": f"u{i}",
+         "properties": {}, "created_at": "2024-01-02T10:00:00"}
+        for i in range(7)
+    ])
+    DuckDBQuery().calculate_funnel_metrics("f", SAMPLE_PROJECT_ID, SAMPLE_STAGES, "2024-01-01", "2024-01-03")
+    assert DUCKDB_FILES_OPENED.value(project=SAMPLE_PROJECT_ID, query="funnel_user") == files_before + 1
+    assert DUCKDB_ROWS_SCANNED.value(project=SAMPLE_PROJECT_ID, query="funnel_user") >= rows_before + 7
+
+    text = (await client.get("/metrics")).text
+    assert 'iafa_events_ingested_total{project="poc-project-001"}' in text
+    assert f'iafa_duckdb_query_seconds_count{{project="{SAMPLE_PROJECT_ID}",query="funnel_user"}}' in text
+    assert "# TYPE iafa_cache_requests_total counter" in text
+
+
+async def test_events_tracked_during_a_flush_are_kept(tmp_path, monkeypatch):
+    """The flush writes the list it swapped out; events appended while it awaits stay buffered."""
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path))
+    service = TrackService()
+    written = []
+
+    async def slow_append(handler, project_id, events):
+        await service.track_event(project_id, "pin_view", "late")
+        written.append(list(events))
+
+    monkeypatch.setattr(ParquetHandler, "append_events", slow_append)
+    await service.track_event("flush-race", "pin_view", "u1")
+    await service._flush_buffer("flush-race")
+
+    assert [event["user_id"] for event in written[0]] == ["u1"]
+    assert [event["user_id"] for event in service.event_buffer["flush-race"]] == ["late"]
+    assert EVENT_BUFFER_DEPTH.value(project="flush-race") == 1
+
+
+async def test_buffered_single_events_are_counted_once_flushed(client: AsyncClient, tmp_path, monkeypatch):
+    """/track buffers into the shared service: depth rises per event, the flush drains it to 0 and counts them ingested."""
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path))
+    service = get_track_service()
+    await service.flush_all()
+    before = EVENTS_INGESTED.value(project="poc-project-001")
+    bytes_before = PARQUET_BYTES_WRITTEN.value(project="poc-project-001")
+
+    for i in range(5):
+        response = await client.post("/api/v1/track", json={"event_type": "pin_view", "user_id": f"u{i}"})
+        assert response.status_code == 200
+    assert EVENT_BUFFER_DEPTH.value(project="poc-project-001") == 5
+    assert EVENTS_INGESTED.value(project="poc-project-001") == before
+    assert PARQUET_BYTES_WRITTEN.value(project="poc-project-001") == bytes_before
+
+    await service.flush_all()
+    assert EVENT_BUFFER_DEPTH.value(project="poc-project-001") == 0
+    assert EVENTS_INGESTED.value(project="poc-project-001") == before + 5
+    assert PARQUET_BYTES_WRITTEN.value(project="poc-project-001") > bytes_before
+    assert list((tmp_path / "events" / "project_poc-project-001").rglob("*.parquet"))
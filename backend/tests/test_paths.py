@@ -0,0 +1,35 @@
+"""Path analysis tests."""
+
+import random
+from app.storage.duckdb_query import DuckDBQuery
+from app.utils.heavy_hitters import SpaceSaving
+from tests.conftest import SAMPLE_PROJECT_ID, SAMPLE_STAGES
+
+START_DATE = "2024-01-01"
+END_DATE = "2024-01-14"
+
+
+def test_space_saving_finds_heavy_hitters():
+    """Frequent items are exact-or-bounded and the total is exact despite a small capacity."""
+    rng = random.Random(7)
+    stream = [rng.choice("abc") if rng.random() < 0.5 else f"noise_{rng.randrange(5000)}" for _ in range(20000)]
+    counter = SpaceSaving(50)
+    for item in stream:
+        counter.update(item)
+    assert counter.total == len(stream)
+    assert len(counter.counts) <= 50
+    top = counter.top(3)
+    assert {item for item, _, _ in top} == {"a", "b", "c"}
+    for item, count, error in top:
+        assert count - error <= stream.count(item) <= count
+
+
+def test_paths_after_stage(event_data_dir):
+    """Every viewer gets one path; sample users follow the funnel order."""
+    query = DuckDBQuery()
+    funnel = query.calculate_funnel_metrics("", SAMPLE_PROJECT_ID, SAMPLE_STAGES, START_DATE, END_DATE)
+    reader = query.stream_event_paths(SAMPLE_PROJECT_ID, "pin_view", START_DATE, END_DATE, steps=2, batch_rows=50)
+    rows = [row for batch in reader for row in batch.to_pylist()]
+    assert len(rows) == funnel["View"]
+    assert sum(1 for row in rows if row["step_1"] == "save") == funnel["Save"]
+    assert all(row["step_2"] in (None, "click") for row in rows)
@@ -0,0 +1,26 @@
+"""Period-over-period comparison tests."""
+
+import pytest
+from app.storage.duckdb_query import DuckDBQuery
+from app.utils.date_utils import get_comparison_range
+from tests.conftest import SAMPLE_PROJECT_ID, SAMPLE_STAGES
+
+
+def test_comparison_ranges():
+    """Comparison ranges have the right length and position."""
+    assert get_comparison_range("2024-01-08", "2024-01-14", "previous_period") == ("2024-01-01", "2024-01-07")
+    assert get_comparison_range("2024-02-01", "2024-02-29", "previous_year") == ("2023-02-01", "2023-02-28")
+    with pytest.raises(ValueError):
+        get_comparison_range("2023-01-01", "2024-01-01", "previous_year")
+
+
+def test_single_pass_matches_separate_queries(event_data_dir):
+    """Tagging rows by period gives the same counts as two separate scans."""
+    periods = {"current": ("2024-01-08", "2024-01-14"), "previous": ("2024-01-01", "2024-01-07")}
+    query = DuckDBQuery()
+    results = query.calculate_period_comparison(SAMPLE_PROJECT_ID, SAMPLE_STAGES, periods, segment_by="surface")
+    for label, (start_date, end_date) in periods.items():
+        expected = query.calculate_funnel_metrics(
+            "", SAMPLE_PROJECT_ID, SAMPLE_STAGES, start_date, end_date, segment_by="surface"
+        )
+        assert results[label] == expected
@@ -0,0 +1,67 @@
+"""Query profiling tests."""
+
+from httpx import AsyncClient
+from app.storage.duckdb_query import DuckDBQuery
+from app.storage.metadata_handler import MetadataHandler
+from tests.conftest import SAMPLE_PROJECT_ID, SAMPLE_STAGES
+
+
+async def test_profile_flag_returns_phases_and_operators(event_data_dir, client: AsyncClient):
+    """profile=true adds phase timings and the DuckDB operator tree without changing the counts."""
+    MetadataHandler().upsert_funnel({
+        "id": "profiled", "organization_id": "poc-org", "project_id": SAMPLE_PROJECT_ID,
+        "name": "Profiled", "stages": SAMPLE_STAGES,
+    })
+    params = {"start_date": "2024-01-01", "end_date": "2024-01-14", "segment_by": "surface"}
+    plain = (await client.get("/api/v1/analytics/funnel/profiled", params=params)).json()
+    profiled = (await client.get("/api/v1/analytics/funnel/profiled", params={**params, "profile": "true"})).json()
+
+    assert "profile" not in plain
+    profile = profiled.pop("profile")
+    assert profiled == plain
+    assert set(profile["phases_ms"]) == {"file_discovery", "scan", "fetchdf", "stage_counting", "formatting"}
+    [query] = profile["queries"]
+    assert query["query"] == "funnel_user" and query["rows_scanned"] > 0
+    scans = [op for op in query["operators"] if op["operator"] == "READ_PARQUET"]
+    assert scans and scans[0]["rows_scanned"] > 0 and "Filters" in scans[0]["info"]
+
+    trend = (await client.get("/api/v1/analytics/funnel/profiled/trend", params={**params, "profile": "true"})).json()
+    assert [q["query"] for q in trend["profile"]["queries"]] == ["trend"]
+
+
+def test_queries_are_not_recorded_without_profiler(event_data_dir):
+    """Without a profiler the query handler keeps no per-query profile."""
+    query = DuckDBQuery()
+    query.calculate_funnel_metrics("f", SAMPLE_PROJECT_ID, SAMPLE_STAGES, "2024-01-01", "2024-01-14")
+    assert query.profiler is None
+
+
+async def test_profile_flag_on_experiment_paths_retention_and_batch(event_data_dir, client: AsyncClient):
+    """Every analytics endpoint accepts profile=true and reports its queries."""
+    MetadataHandler().upsert_funnel({
+        "id": "profiled", "organization_id": "poc-org", "project_id": SAMPLE_PROJECT_ID,
+        "name": "Profiled", "stages": SAMPLE_STAGES,
+    })
+    MetadataHandler().upsert_project({
+        "id": SAMPLE_PROJECT_ID, "organization_id": "poc-org", "name": "Sample", "api_key": "key",
+    })
+    dates = {"start_date": "2024-01-01", "end_date": "2024-01-14", "profile": "true"}
+    base = "/api/v1/analytics"
+    responses = {
+        "experiment": await client.get(f"{base}/funnel/profiled/experiment/exp_1", params=dates),
+        "paths": await client.get(f"{base}/funnel/profiled/paths", params={**dates, "stage": 1}),
+        "retention": await client.get(
+            f"{base}/retention",
+            params={**dates, "project_id": SAMPLE_PROJECT_ID, "cohort_event": "pin_view", "return_event": "save"},
+        ),
+        "funnel_batch": await client.post(f"{base}/funnels:batch", json={
+            "start_date": "2024-01-01", "end_date": "2024-01-14", "profile": True,
+            "funnels": [{"funnel_id": "profiled"}, {"funnel_id": "profiled", "segment_by": "surface"}],
+        }),
+    }
+    for name, response in responses.items():
+        assert response.status_code == 200, name
+        [query] = response.json()["profile"]["queries"]
+        assert query["query"] == name and query["rows_scanned"] > 0, name
+    assert "statistics" in responses["experiment"].json()["profile"]["phases_ms"]
+    assert "scan_and_count" in responses["paths"].json()["profile"]["phases_ms"]
@@ -0,0 +1,80 @@
+"""Compact prompt encoding and LLM usage tests."""
+
+import json
+from types import SimpleNamespace
+from app.core.config import settings
+from app.services.genai_service import GenAIService
+from app.utils.token_utils import estimate_tokens
+
+
+def segment_analytics(count, reverse=False):
+    names = [f"category_{i:02d}" for i in range(count)]
+    segments = {
+        name: {
+            "total_users": 1000 - i * 10,
+            "completed_users": 100 + i,
+            "overall_conversion_rate": (100 + i) / (1000 - i * 10) * 100,
+            "stages": [
+                {"stage_name": "View", "users": 1000 - i * 10, "drop_off_rate": 0},
+                {"stage_name": "Save", "users": 400, "drop_off_rate": 55.55},
+            ],
+        }
+        for i, name in enumerate(names)
+    }
+    if reverse:
+        segments = dict(reversed(list(segments.items())))
+    return {
+        "funnel_name": "Pin to Purchase",
+        "date_range": {"start": "2024-01-01", "end": "2024-01-31"},
+        "segment_by": "content_category",
+        "segments": segments,
+        "total": {"stages": [], "total_users": 30000, "completed_users": 4000, "overall_conversion_rate": 13.333},
+    }
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("Save|1200|58.8") == 8
+    assert estimate_tokens("conversion") == 3
+
+
+def test_encoding_is_compact_deterministic_and_budgeted(tmp_path, monkeypatch):
+    """Only the top segments are listed and the list shrinks to fit the token budget."""
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path))
+    service = GenAIService()
+    text = service._format_funnel_data(segment_analytics(40))
+    assert text == service._format_funnel_data(segment_analytics(40, reverse=True))
+    assert "overall: 30000 users, 4000 completed, 13.3% conversion" in text
+    assert "(top 8 of 40 by users)" in text
+    assert "category_00|1000|100|10|Save 55.5%" in text and "category_08" not in text
+    assert "other (32)|" in text
+
+    small = service._format_funnel_data(segment_analytics(40), token_budget=150)
+    assert estimate_tokens(small) <= 150 and "(top 2 of 40 by users)" in small
+
+
+async def test_usage_recorded_per_call(tmp_path, monkeypatch):
+    """Reported token counts are recorded as-is; missing ones are estimated locally."""
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path))
+
+    class FakeLLM:
+        def __init__(self, usage):
+            self.usage = usage
+
+        async def chat(self, messages, **kwargs):
+            message = SimpleNamespace(content=json.dumps({"summary": "s", "insights": []}))
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=self.usage)
+
+    service = GenAIService()
+    service.client = FakeLLM(SimpleNamespace(prompt_tokens=321, completion_tokens=45))
+    result = await service.generate_recommendations("f", segment_analytics(3), "2024-01-01", "2024-01-31", {})
+    assert result["usage"]["prompt_tokens"] == 321 and result["usage"]["estimated"] is False
+
+    service.client = FakeLLM(None)
+    result = await service.generate_recommendations("f", segment_analytics(4), "2024-01-01", "2024-01-31", {})
+    assert result["usage"]["estimated"] is True and result["usage"]["completion_tokens"] > 0
+
+    summary = service.usage_summary()
+    assert summary["calls"] == 2
+    assert summary["prompt_tokens"] == 321 + result["usage"]["prompt_tokens"]
+    assert summary["latency_ms_max"] >= 0
@@ -0,0 +1,171 @@
+"""Report generation tests (fake LLM, no network)."""
+
+import asyncio
+import json
+from types import SimpleNamespace
+from app.core.config import settings
+from app.services.genai_service import GenAIService
+from app.utils.json_stream import JSONObjectStream
+
+ANALYTICS = {
+    "funnel_name": "Pin to Purchase",
+    "date_range": {"start": "2024-01-01", "end": "2024-01-14"},
+    "stages": [{"stage_name": "View", "users": 400, "conversion_rate": 100.0, "drop_off_rate": 0.0}],
+    "total_users": 400,
+    "completed_users": 107,
+    "overall_conversion_rate": 26.75,
+}
+DOCUMENT = {
+    "summary": "Save drops 32% <fast>",
+    "insights": ["Click is 40% of views"],
+    "recommendations": [{"priority": "High", "title": "Shorten save flow", "action": "Drop a step", "impact": "+5% saves"}],
+    "experiment": {"hypothesis": "If fewer steps then more saves", "metric": "Save rate"},
+    "guardrails": [{"metric": "Purchases", "threshold": "Alert below 20%"}],
+}
+DOCUMENT_JSON = "```json\n" + json.dumps(DOCUMENT, indent=2) + "\n```"
+
+
+class FakeLLM:
+    """Answers ``chat`` with the document and streams the same JSON in small chunks."""
+
+    def __init__(self):
+        self.chat_calls = 0
+        self.stream_calls = 0
+
+    async def chat(self, messages, **kwargs):
+        self.chat_calls += 1
+        await asyncio.sleep(0.01)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=DOCUMENT_JSON))])
+
+    async def stream_chat(self, messages, **kwargs):
+        self.stream_calls += 1
+        for i in range(0, len(DOCUMENT_JSON), 7):
+            await asyncio.sleep(0)
+            yield DOCUMENT_JSON[i:i + 7]
+
+
+def make_service(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path))
+    service = GenAIService()
+    service.client = FakeLLM()
+    return service
+
+
+async def collect(service, audience="executive", format="html"):
+    return [
+        event async for event in service.stream_report(
+            "f", ANALYTICS, "2024-01-01", "2024-01-14", {}, audience=audience, format=format
+        )
+    ]
+
+
+def test_json_object_stream_emits_members_once_complete():
+    """Members are emitted as soon as they close, even when split across chunks."""
+    parser = JSONObjectStream()
+    text = 'noise {"a": "x, {y}\\"", "b": [1, {"c": 2}], "d": {}}'
+    members = []
+    for char in text:
+        members.extend(parser.feed(char))
+    assert members == [("a", 'x, {y}"'), ("b", [1, {"c": 2}]), ("d", {})]
+    assert parser.finished
+
+
+def test_json_object_stream_stops_at_a_malformed_member():
+    """A member that does not parse marks the stream failed instead of raising; later members are ignored."""
+    parser = JSONObjectStream()
+    assert parser.feed('{"a": 1, "b": tru, "c": 3}') == [("a", 1)]
+    assert parser.failed and parser.finished
+    assert parser.feed('"d": 4}') == []
+
+
+async def test_reports_render_locally_from_one_document(tmp_path, monkeypatch):
+    """Every audience and format is rendered from a single cached LLM call."""
+    service = make_service(tmp_path, monkeypatch)
+    html = await service.generate_report("f", ANALYTICS, "2024-01-01", "2024-01-14", {}, audience="executive")
+    assert html["cache_hit"] is False
+    assert "<!DOCTYPE html>" in html["report"] and "Pin to Purchase" in html["report"]
+    assert '<div class="summary">' in html["report"] and "&lt;fast&gt;" in html["report"]
+    assert "Guardrails" not in html["report"]
+
+    markdown = await service.generate_report(
+        "f", ANALYTICS, "2024-01-01", "2024-01-14", {}, audience="data_scientist", format="markdown"
+    )
+    assert markdown["cache_hit"] is True
+    assert markdown["report"].startswith("## Summary\nSave drops 32%")
+    assert "| View | 400 | 100.0% | 0.0% |" in markdown["report"]
+    assert "**Purchases:** Alert below 20%" in markdown["report"]
+
+    text = await service.generate_report(
+        "f", ANALYTICS, "2024-01-01", "2024-01-14", {}, audience="product_manager", format="text"
+    )
+    assert "**" not in text["report"] and "NEXT EXPERIMENT" in text["report"]
+    assert service.client.chat_calls == 1
+
+
+async def test_stream_report_sections_and_cache(tmp_path, monkeypatch):
+    """Sections stream in report order while the document arrives; the document is cached for both endpoints."""
+    service = make_service(tmp_path, monkeypatch)
+
+    events = await collect(service)
+    kinds = [event["event"] for event in events]
+    assert kinds[-1] == "done"
+    assert "".join(e["data"]["text"] for e in events if e["event"] == "token") == DOCUMENT_JSON
+    sections = [e["data"]["content"] for e in events if e["event"] == "section"]
+    assert [s.split("<h2>")[1].split("</h2>")[0] for s in sections] == ["Summary", "Key Metrics", "Recommendations"]
+    # Sections arrive before the stream finishes
+    assert kinds.index("section") < kinds.index("token") + 30
+    done = events[-1]["data"]
+    assert "<!DOCTYPE html>" in done["report"] and done["cache_hit"] is False
+
+    cached = await collect(service)
+    assert [e["event"] for e in cached] == ["section"] * 3 + ["done"] and cached[-1]["data"]["cache_hit"] is True
+    report = await service.generate_report("f", ANALYTICS, "2024-01-01", "2024-01-14", {}, audience="executive")
+    assert report["cache_hit"] is True
+    assert service.client.stream_calls == 1 and service.client.chat_calls == 0
+
+
+async def test_stream_markdown_sections(tmp_path, monkeypatch):
+    """Markdown sections are rendered from document members."""
+    service = make_service(tmp_path, monkeypatch)
+    events = await collect(service, audience="product_manager", format="markdown")
+    sections = [e["data"]["content"] for e in events if e["event"] == "section"]
+    assert [s.split("\n")[0] for s in sections] == ["## Summary", "## Key Insights", "## Recommendations", "## Next Experiment"]
+    assert events[-1]["data"]["report"] == "\n\n".join(sections)
+
+
+async def test_concurrent_reports_share_one_llm_call(tmp_path, monkeypatch):
+    """Streams and JSON reports requested while a document is being generated join that call."""
+    service = make_service(tmp_path, monkeypatch)
+    first, second, report = await asyncio.gather(
+        collect(service),
+        collect(service),
+        service.generate_report("f", ANALYTICS, "2024-01-01", "2024-01-14", {}, audience="executive"),
+    )
+    assert service.client.stream_calls + service.client.chat_calls == 1
+    # Whichever request joined renders every section from the finished document
+    streams = [first, second]
+    assert sum("token" in [e["event"] for e in events] for events in streams) <= 1
+    for events in streams:
+        assert events[-1]["event"] == "done" and events[-1]["data"]["cache_hit"] is False
+        assert [e["event"] for e in events].count("section") == 3
+    assert "Shorten save flow" in report["report"]
+
+
+async def test_stream_report_with_a_malformed_document_ends_with_an_error(tmp_path, monkeypatch):
+    """Malformed LLM JSON stops incremental sections and ends the stream with an error event, not an exception."""
+    service = make_service(tmp_path, monkeypatch)
+    broken = DOCUMENT_JSON.replace('"insights": [', '"insights": [oops', 1)
+
+    async def stream_chat(messages, **kwargs):
+        for i in range(0, len(broken), 7):
+            await asyncio.sleep(0)
+            yield broken[i:i + 7]
+
+    service.client.stream_chat = stream_chat
+    events = await collect(service, audience="data_scientist")
+    kinds = [event["event"] for event in events]
+    assert kinds[-1] == "error" and "done" not in kinds
+    assert "Failed to generate report" in events[-1]["data"]["error"]
+    # Only sections completed before the malformed member were rendered
+    sections = [e["data"]["content"] for e in events if e["event"] == "section"]
+    assert [s.split("<h2>")[1].split("</h2>")[0] for s in sections] == ["Summary", "Key Metrics"]
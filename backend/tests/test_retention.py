@@ -0,0 +1,81 @@
+"""Retention matrix tests."""
+
+from app.core.config import settings
+from app.services.query_planner import QueryPlanner
+from app.services.retention_service import RETENTION_ROLLUP_TIERS
+from app.storage.duckdb_query import DuckDBQuery
+from app.storage.parquet_handler import ParquetHandler
+from tests.conftest import SAMPLE_PROJECT_ID, SAMPLE_STAGES
+
+START_DATE = "2024-01-01"
+END_DATE = "2024-01-14"
+
+
+def test_cohort_sizes_match_first_stage(event_data_dir):
+    """Every user with a cohort event lands in exactly one cohort."""
+    query = DuckDBQuery()
+    funnel = query.calculate_funnel_metrics("", SAMPLE_PROJECT_ID, SAMPLE_STAGES, START_DATE, END_DATE)
+    cohorts = query.calculate_retention_matrix(
+        SAMPLE_PROJECT_ID, "pin_view", "pin_view", START_DATE, END_DATE, granularity="day", periods=13
+    )
+    assert sum(c["size"] for c in cohorts) == funnel["View"]
+    # The cohort event itself always falls in period 0
+    assert all(c["retained"][0] == c["size"] for c in cohorts)
+
+
+def test_return_events_spread_over_periods(event_data_dir):
+    """Each sample user saves at most once, after viewing, so periods sum to the save count."""
+    query = DuckDBQuery()
+    funnel = query.calculate_funnel_metrics("", SAMPLE_PROJECT_ID, SAMPLE_STAGES, START_DATE, END_DATE)
+    for granularity in ("day", "week"):
+        cohorts = query.calculate_retention_matrix(
+            SAMPLE_PROJECT_ID, "pin_view", "save", START_DATE, END_DATE, granularity=granularity, periods=13
+        )
+        assert sum(sum(c["retained"]) for c in cohorts) == funnel["Save"]
+
+
+def test_segment_filters_apply(event_data_dir):
+    """Segment filters narrow the cohorts."""
+    query = DuckDBQuery()
+    all_users = query.calculate_retention_matrix(SAMPLE_PROJECT_ID, "pin_view", "save", START_DATE, END_DATE)
+    home = query.calculate_retention_matrix(
+        SAMPLE_PROJECT_ID, "pin_view", "save", START_DATE, END_DATE, surface=["Home"]
+    )
+    assert 0 < sum(c["size"] for c in home) < sum(c["size"] for c in all_users)
+
+
+def test_rollup_planned_matrix_matches_raw(tmp_path, monkeypatch):
+    """Rollups keep one first time per period; matrices from planned rollups equal the raw matrices.
+
+    user_a returns before their cohort event in the same week; user_b returns on both sides of a
+    month boundary inside one ISO week (2024-01-29 .. 2024-02-04), which a weekly rollup would merge.
+    """
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path))
+    timeline = [
+        ("user_a", "save", "2024-01-03T10:00:00"),
+        ("user_a", "pin_view", "2024-01-04T10:00:00"),
+        ("user_a", "save", "2024-01-05T10:00:00"),
+        ("user_b", "pin_view", "2024-01-29T10:00:00"),
+        ("user_b", "save", "2024-01-30T10:00:00"),
+        ("user_b", "save", "2024-02-02T10:00:00"),
+        ("user_b", "save", "2024-03-06T10:00:00"),
+    ]
+    ParquetHandler()._write_events_sync("retention", [
+        {"id": f"e{i}", "project_id": "retention", "event_type": event_type, "user_id": user_id,
+         "properties": {}, "created_at": created_at}
+        for i, (user_id, event_type, created_at) in enumerate(timeline)
+    ])
+    query = DuckDBQuery()
+    start_date, end_date = "2024-01-01", "2024-03-31"
+    for granularity in ("week", "month"):
+        plan = QueryPlanner().plan_funnel_scan(
+            "retention", start_date, end_date, build_missing=True, tiers=RETENTION_ROLLUP_TIERS[granularity]
+        )
+        assert "raw" not in plan["tiers"]
+        raw = query.calculate_retention_matrix("retention", "pin_view", "save", start_date, end_date, granularity, periods=6)
+        planned = query.calculate_retention_matrix(
+            "retention", "pin_view", "save", start_date, end_date, granularity, periods=6, parquet_files=plan["files"]
+        )
+        assert planned == raw
+    # Month cohorts: user_a returns in January (period 0), user_b in January, February and March
+    assert raw == [{"cohort": "2024-01-01", "size": 2, "retained": [2, 1, 1, 0, 0, 0, 0]}]
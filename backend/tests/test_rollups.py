@@ -0,0 +1,52 @@
+"""Rollup tier and query planner tests."""
+
+import threading
+from app.core.config import settings
+from app.services.analytics_service import AnalyticsService
+from app.services.query_planner import QueryPlanner
+from app.storage.duckdb_query import DuckDBQuery
+from tests.conftest import SAMPLE_PROJECT_ID, SAMPLE_STAGES
+
+
+def test_planner_uses_weekly_tiers(event_data_dir):
+    """Two whole ISO weeks are served by two weekly rollups and no raw files."""
+    plan = QueryPlanner().plan_funnel_scan(SAMPLE_PROJECT_ID, "2024-01-01", "2024-01-14", build_missing=True)
+    assert plan["tiers"] == {"weekly": 2}
+
+
+def test_planner_without_rollups_falls_back_to_raw(event_data_dir):
+    """Without building, missing rollups are replaced by raw day files."""
+    plan = QueryPlanner().plan_funnel_scan(SAMPLE_PROJECT_ID, "2024-01-01", "2024-01-14")
+    assert set(plan["tiers"]) == {"raw"}
+
+
+def test_rollup_plan_matches_raw_scan(event_data_dir):
+    """A long range served from a monthly rollup gives the same counts as the raw scan."""
+    start_date, end_date = "2023-06-01", "2024-03-31"
+    plan = QueryPlanner().plan_funnel_scan(SAMPLE_PROJECT_ID, start_date, end_date, build_missing=True)
+    assert plan["tiers"] == {"monthly": 1}
+
+    query = DuckDBQuery()
+    raw = query.calculate_funnel_metrics("", SAMPLE_PROJECT_ID, SAMPLE_STAGES, start_date, end_date, segment_by="user_intent")
+    planned = query.calculate_funnel_metrics(
+        "", SAMPLE_PROJECT_ID, SAMPLE_STAGES, start_date, end_date, segment_by="user_intent", parquet_files=plan["files"]
+    )
+    assert planned == raw
+
+
+async def test_service_plans_rollups_off_the_event_loop(event_data_dir, monkeypatch):
+    """Rollup planning (which may build rollups) runs in an executor thread, not on the event loop."""
+    monkeypatch.setattr(settings, "ROLLUPS_ENABLED", True)
+    monkeypatch.setattr(settings, "RAW_SCAN_MAX_DAYS", 1)
+    service = AnalyticsService()
+    threads = []
+    plan_funnel_scan = service.query_planner.plan_funnel_scan
+
+    def recording_plan(*args, **kwargs):
+        threads.append(threading.current_thread())
+        return plan_funnel_scan(*args, **kwargs)
+
+    monkeypatch.setattr(service.query_planner, "plan_funnel_scan", recording_plan)
+    files = await service._plan_files(SAMPLE_PROJECT_ID, "2024-01-01", "2024-01-14")
+    assert threads and threads[0] is not threading.main_thread()
+    assert len(files) == 2 and all("weekly" in f for f in files)
@@ -0,0 +1,53 @@
+"""Session-scoped funnel tests."""
+
+from app.core.config import settings
+from app.storage.duckdb_query import DuckDBQuery
+from app.storage.parquet_handler import ParquetHandler
+from tests.conftest import SAMPLE_PROJECT_ID, SAMPLE_STAGES
+
+START_DATE = "2024-01-01"
+END_DATE = "2024-01-14"
+
+
+def test_one_session_per_user_matches_user_funnel(event_data_dir):
+    """Sample users have a single session_id, so both units agree."""
+    query = DuckDBQuery()
+    by_user = query.calculate_funnel_metrics("", SAMPLE_PROJECT_ID, SAMPLE_STAGES, START_DATE, END_DATE)
+    by_session = query.calculate_funnel_metrics(
+        "", SAMPLE_PROJECT_ID, SAMPLE_STAGES, START_DATE, END_DATE, unit="session"
+    )
+    assert by_session == by_user
+
+
+def test_sessions_split_on_id_and_inactivity(tmp_path, monkeypatch):
+    """Explicit session ids and inferred inactivity gaps both split conversions."""
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "SESSION_INACTIVITY_MINUTES", 30)
+    timeline = [
+        # Converts within one inferred session
+        ("a", "", "pin_view", "10:00"), ("a", "", "save", "10:20"),
+        # Gap longer than the inactivity timeout
+        ("b", "", "pin_view", "10:00"), ("b", "", "save", "11:00"),
+        # Explicit session ids win over timing
+        ("c", "s1", "pin_view", "10:00"), ("c", "s2", "save", "10:01"),
+    ]
+    events = [
+        {
+            "id": f"{user}_{event_type}",
+            "project_id": "p",
+            "event_type": event_type,
+            "user_id": user,
+            "session_id": session_id,
+            "properties": {},
+            "created_at": f"2024-01-01T{time}:00",
+        }
+        for user, session_id, event_type, time in timeline
+    ]
+    ParquetHandler()._write_events_sync("p", events)
+
+    query = DuckDBQuery()
+    stages = SAMPLE_STAGES[:2]
+    assert query.calculate_funnel_metrics("", "p", stages, START_DATE, START_DATE) == {"View": 3, "Save": 3}
+    assert query.calculate_funnel_metrics("", "p", stages, START_DATE, START_DATE, unit="session") == {
+        "View": 3, "Save": 1
+    }
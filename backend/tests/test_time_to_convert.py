@@ -0,0 +1,33 @@
+"""Time-to-convert distribution tests."""
+
+from app.storage.duckdb_query import DuckDBQuery
+from tests.conftest import SAMPLE_PROJECT_ID, SAMPLE_STAGES
+
+START_DATE = "2024-01-01"
+END_DATE = "2024-01-14"
+
+
+def test_timing_pass_counts_match_funnel(event_data_dir):
+    """The SQL pass produces the same stage counts as the regular funnel query."""
+    query = DuckDBQuery()
+    timed = query.calculate_funnel_metrics_with_timing(
+        SAMPLE_PROJECT_ID, SAMPLE_STAGES, START_DATE, END_DATE, segment_by="user_intent"
+    )
+    expected = query.calculate_funnel_metrics(
+        "", SAMPLE_PROJECT_ID, SAMPLE_STAGES, START_DATE, END_DATE, segment_by="user_intent"
+    )
+    assert timed["counts"] == expected
+
+
+def test_timing_quantiles_and_histogram(event_data_dir):
+    """Quantiles are ordered, within the generated gaps, and histograms cover every timed user."""
+    timed = DuckDBQuery().calculate_funnel_metrics_with_timing(
+        SAMPLE_PROJECT_ID, SAMPLE_STAGES, START_DATE, END_DATE
+    )
+    timing = timed["time_to_convert"]
+    assert set(timing) == {"Save", "Click", "Purchase"}
+    save = timing["Save"]
+    assert save["from_stage"] == "View"
+    assert save["users"] == timed["counts"]["Save"]
+    assert 60 <= save["p50_seconds"] <= save["p90_seconds"] <= save["p99_seconds"] <= 180 * 60
+    assert sum(bucket["users"] for bucket in save["histogram"]) == save["users"]
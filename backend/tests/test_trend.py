@@ -0,0 +1,20 @@
+"""Cohort trend tests."""
+
+from app.storage.duckdb_query import DuckDBQuery
+from tests.conftest import SAMPLE_PROJECT_ID, SAMPLE_STAGES
+
+START_DATE = "2024-01-01"
+END_DATE = "2024-01-14"
+
+
+def test_cohorts_add_up_to_funnel(event_data_dir):
+    """Summed over cohorts, stage counts equal the funnel over the whole range."""
+    query = DuckDBQuery()
+    expected = query.calculate_funnel_metrics("", SAMPLE_PROJECT_ID, SAMPLE_STAGES, START_DATE, END_DATE)
+    for granularity in ("day", "week"):
+        cohorts = query.calculate_funnel_trend(SAMPLE_PROJECT_ID, SAMPLE_STAGES, START_DATE, END_DATE, granularity)
+        totals = {stage["name"]: sum(c[stage["name"]] for c in cohorts.values()) for stage in SAMPLE_STAGES}
+        assert totals == expected
+    assert set(query.calculate_funnel_trend(SAMPLE_PROJECT_ID, SAMPLE_STAGES, START_DATE, END_DATE, "week")) == {
+        "2024-01-01", "2024-01-08"
+    }
@@ -123,6 +123,27 @@ export const analyticsApi = {
     
     return apiClient.get(`/analytics/funnel/${funnelId}`, { params });
   },
+  getBatchFunnelAnalytics: (
+    startDate: string,
+    endDate: string,
+    funnels: Array<{
+      funnel_id: string;
+      segment_filters?: {
+        user_intent?: string[];
+        content_category?: string[];
+        surface?: string[];
+        user_tenure?: string[];
+      };
+      segment_by?: string;
+    }>,
+    orgId: string = 'poc-org'
+  ) =>
+    apiClient.post('/analytics/funnels:batch', {
+      org_id: orgId,
+      start_date: startDate,
+      end_date: endDate,
+      funnels,
+    }),
   getFunnelRecommendations: (
     funnelId: string,
     startDate: string,